@@ -0,0 +1,117 @@
+import sys
+import time
+import types
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from zoo.analytics.models import Dependency, DependencyType, DependencyUsage
+from zoo.analytics.tasks import JSLibrary, PyLibrary
+from zoo.analytics.tasks import repo_analyzers as uut
+
+pytestmark = pytest.mark.django_db
+
+
+def make_analyzer(mocker, name, cpu_bound=False):
+    analyzer = types.ModuleType(name)
+    analyzer.CPU_BOUND = cpu_bound
+    analyzer.analyze = mocker.Mock(return_value=[])
+    mocker.patch.dict(sys.modules, {name: analyzer})
+    return analyzer
+
+
+@pytest.fixture
+def m_analyze(mocker):
+    analyzer = make_analyzer(mocker, "fake_analyzer")
+    mocker.patch.object(uut, "ANALYZERS", [analyzer])
+    return analyzer.analyze
+
+
+def test_run_all(m_analyze, repository, dependency_factory, fake_path):
+    yesterday = timezone.now() - timedelta(days=1)
+    kept, changed, removed = (
+        dependency_factory(name=name, type=DependencyType.PY_LIB.value)
+        for name in ["requests", "django", "flask"]
+    )
+    for dep, version in [(kept, "2.25.1"), (changed, "2.2.0"), (removed, "1.1.0")]:
+        DependencyUsage.objects.create(
+            dependency=dep,
+            repo=repository,
+            version=version,
+            for_production=True,
+            timestamp=yesterday,
+            **uut.unpack_version(version),
+        )
+    m_analyze.return_value = [
+        PyLibrary(name="requests", version="2.25.1", for_production=True),
+        PyLibrary(name="Django", version="3.2.0", for_production=True),
+        JSLibrary(name="react", version="17.0.2", for_production=None),
+        JSLibrary(name="react", version="17.0.2", for_production=False),
+        JSLibrary(name="React", version="17.0.2"),
+    ]
+
+    uut.run_all(repository, fake_path, files=[])
+
+    usages = {
+        usage.dependency.name: usage
+        for usage in DependencyUsage.objects.filter(repo=repository)
+    }
+    assert set(usages) == {"requests", "django", "react"}
+    assert usages["requests"].timestamp == yesterday
+    assert usages["django"].timestamp > yesterday
+    assert usages["django"].minor_version == 2
+    assert usages["react"].for_production is False
+    assert Dependency.objects.filter(name="react").count() == 1
+
+
+def test_run_all__unchanged(
+    m_analyze, repository, fake_path, django_assert_max_num_queries
+):
+    m_analyze.return_value = [
+        PyLibrary(name=f"lib{index}", version="1.0.0") for index in range(100)
+    ]
+    uut.run_all(repository, fake_path, files=[])
+
+    with django_assert_max_num_queries(5):
+        uut.run_all(repository, fake_path, files=[])
+
+    assert DependencyUsage.objects.filter(repo=repository).count() == 100
+
+
+@pytest.mark.parametrize("cpu_bound", [False, True])
+def test_collect_hits(mocker, repository, fake_path, cpu_bound):
+    slow = make_analyzer(mocker, "slow_analyzer", cpu_bound)
+    fast = make_analyzer(mocker, "fast_analyzer", cpu_bound)
+
+    def analyze_slowly(*args):
+        time.sleep(0.1)
+        return [PyLibrary(name="requests", version="1.0.0", for_production=True)]
+
+    slow.analyze.side_effect = analyze_slowly
+    fast.analyze.return_value = [PyLibrary(name="Requests", version="2.0.0")]
+    mocker.patch.object(uut, "ANALYZERS", [slow, fast])
+
+    hits, is_complete = uut.collect_hits(repository, fake_path, [])
+
+    # the later analyzer wins, however long the earlier one took
+    assert hits == {
+        ("requests", DependencyType.PY_LIB.value): PyLibrary(
+            name="Requests", version="2.0.0", for_production=True
+        )
+    }
+    assert is_complete
+
+
+def test_run_all__timeout(mocker, settings, repository, dependency_factory, fake_path):
+    settings.ANALYZER_TIMEOUT = 0.1
+    stuck = make_analyzer(mocker, "stuck_analyzer")
+    stuck.analyze.side_effect = lambda *args: time.sleep(1) or []
+    mocker.patch.object(uut, "ANALYZERS", [stuck])
+    usage = DependencyUsage.objects.create(
+        dependency=dependency_factory(), repo=repository
+    )
+
+    uut.run_all(repository, fake_path, files=[])
+
+    assert DependencyUsage.objects.filter(pk=usage.pk).exists()
@@ -0,0 +1,32 @@
+import arrow
+import pytest
+
+from zoo.analytics.models import DependencySnapshot, DependencyUsage
+from zoo.analytics.tasks import snapshots as uut
+
+pytestmark = pytest.mark.django_db
+
+
+def test_take_dependency_snapshots(
+    mocker, repository_factory, dependency_factory, django_assert_max_num_queries
+):
+    mocker.patch(
+        "zoo.utils.timezone.now",
+        return_value=arrow.get("2020-01-01T12:00:00").datetime,
+    )
+    used, unused = dependency_factory(), dependency_factory()
+    for repository in [repository_factory(), repository_factory()]:
+        DependencyUsage.objects.create(dependency=used, repo=repository)
+
+    with django_assert_max_num_queries(6):
+        uut.take_dependency_snapshots()
+    uut.take_dependency_snapshots()
+
+    assert set(
+        DependencySnapshot.objects.values_list(
+            "dependency", "timestamp", "dep_usages_num"
+        )
+    ) == {
+        (used.pk, arrow.get("2020-01-01").datetime, 2),
+        (unused.pk, arrow.get("2020-01-01").datetime, 0),
+    }
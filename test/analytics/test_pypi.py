@@ -0,0 +1,123 @@
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import arrow
+import fakeredis
+import pytest
+import requirements
+
+from zoo.analytics import pypi as uut
+from zoo.analytics.tasks.requirements_py import get_unhealthy_packages
+
+PROJECTS = {
+    "requests": {
+        "info": {
+            "classifiers": [
+                "Development Status :: 5 - Production/Stable",
+                "License :: OSI Approved :: Apache Software License",
+            ],
+            "version": "2.25.1",
+            "license": "Apache 2.0",
+        },
+        "releases": {"2.25.1": [{"upload_time": arrow.utcnow().isoformat()}]},
+    },
+    "zope-interface": {
+        "info": {
+            "classifiers": ["Development Status :: 1 - Planning"],
+            "version": "5.0",
+            "license": "ZPL",
+        },
+        "releases": {"5.0": [{"upload_time": "2020-01-01T00:00:00"}]},
+    },
+}
+
+
+@pytest.fixture
+def index():
+    """A stand-in for the PyPI JSON API, counting the requests per project."""
+    requested = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            name = self.path.strip("/").split("/")[1]  # /pypi/<name>/json
+            requested[name] += 1
+            if name not in PROJECTS:
+                self.send_error(404)
+                return
+            body = json.dumps(PROJECTS[name]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/pypi", requested
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def connection(mocker):
+    connection = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+    mocker.patch("zoo.base.redis.get_connection", return_value=connection)
+    return connection
+
+
+def test_get_many(index, connection):
+    url, requested = index
+    cache = uut.PyPIMetadataCache(url=url, ttl=60, workers=4)
+
+    first = cache.get_many(["Requests", "zope.interface", "missing"])
+    second = cache.get_many(["requests", "zope_interface", "missing"])
+
+    assert first == second
+    assert first["requests"] == {
+        "classifiers": PROJECTS["requests"]["info"]["classifiers"],
+        "version": "2.25.1",
+        "upload_time": PROJECTS["requests"]["releases"]["2.25.1"][0]["upload_time"],
+        "license": "Apache 2.0",
+    }
+    assert first["missing"] is None
+    assert requested == {"requests": 1, "zope-interface": 1, "missing": 1}
+    assert 0 < connection.ttl("zoo:pypi:requests") <= 60
+
+
+def test_get_many__singleflight(index, connection, mocker):
+    url, requested = index
+    mocker.patch.object(uut, "SINGLEFLIGHT_POLL_INTERVAL", 0.01)
+    cache = uut.PyPIMetadataCache(url=url, connection=connection)
+    connection.set("zoo:pypi:requests:lock", 1)
+    metadata = {"classifiers": [], "version": "1.0", "upload_time": None}
+
+    timer = threading.Timer(
+        0.05,
+        connection.set,
+        args=("zoo:pypi:requests", json.dumps({"metadata": metadata})),
+    )
+    timer.start()
+    assert cache.get("requests") == metadata
+    timer.join()
+
+    assert requested == {}
+
+
+def test_get_many__index_down(connection):
+    cache = uut.PyPIMetadataCache(url="http://127.0.0.1:1/pypi")
+
+    assert cache.get_many(["requests"]) == {}
+    assert connection.get("zoo:pypi:requests") is None
+
+
+def test_get_unhealthy_packages(index, connection, settings):
+    settings.PYPI_URL, requested = index
+    reqs = list(requirements.parse("requests==2.25.1\nzope.interface\nmissing\n"))
+
+    assert get_unhealthy_packages(reqs) == ["zope.interface"]
@@ -19,10 +19,16 @@ def test_check_discovery__correct_modules(settings):
     settings.ZOO_AUDITING_CHECKS = check_modules
 
     uut.discover_checks()
-    from zoo.auditing.check_discovery import CHECKS, KINDS, PATCHES
+    from zoo.auditing.check_discovery import CHECK_FILES, CHECKS, KINDS, PATCHES
 
     assert len(CHECKS) == 11
 
+    assert CHECK_FILES["correct_first_module.checks.check_stuff"] == [
+        "Dockerfile*",
+        "setup.py",
+    ]
+    assert CHECK_FILES["correct_first_module.checks.check_more_stuff"] is None
+
     assert {function.__name__ for function in CHECKS} == {
         "check_another_dummy_function",
         "check_dummy_function",
@@ -0,0 +1,90 @@
+import fakeredis
+import pytest
+from django.urls import reverse
+
+from zoo.auditing import metrics as uut
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def check_metrics(mocker):
+    check_metrics = uut.CheckMetrics(
+        connection=fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+    )
+    mocker.patch("zoo.auditing.views.CheckMetrics", return_value=check_metrics)
+    return check_metrics
+
+
+def stats(wall_time, **kwargs):
+    return uut.CheckStats(
+        wall_time=wall_time,
+        cpu_time=kwargs.pop("cpu_time", wall_time),
+        memory_delta=kwargs.pop("memory_delta", 0),
+        results=kwargs.pop("results", 1),
+        **kwargs,
+    )
+
+
+def test_measure():
+    def check_failing(context):
+        yield context
+        raise RuntimeError
+
+    results, check_stats, error = uut.measure(check_failing, "context")
+
+    assert results == ["context"]
+    assert check_stats.results == 1
+    assert check_stats.errors == 1
+    assert check_stats.wall_time >= 0
+    assert isinstance(error, RuntimeError)
+
+
+def test_get_all(check_metrics):
+    check_metrics.record("standards.checks.check_a.check_fast", stats(0.02))
+    check_metrics.record("standards.checks.check_a.check_fast", stats(0.2))
+    check_metrics.record("standards.checks.check_b.check_slow", stats(300, timeouts=1))
+    check_metrics.record_cache("standards.checks.check_a.check_fast", is_hit=True)
+
+    metrics = check_metrics.get_all()
+
+    fast = metrics["standards.checks.check_a.check_fast"]
+    assert fast["count"] == 2
+    assert fast["wall_time"]["counts"] == [0, 1, 1, 2, 2, 2, 2, 2, 2, 2, 2]
+    assert fast["wall_time"]["sum"] == pytest.approx(0.22)
+    assert fast["results"] == 2
+    assert (fast["cache_hits"], fast["cache_misses"]) == (1, 0)
+    assert metrics["standards.checks.check_b.check_slow"]["timeouts"] == 1
+
+    slowest = check_metrics.get_slowest()
+    assert [row["name"] for row in slowest] == ["check_slow", "check_fast"]
+    assert slowest[0]["package"] == "standards"
+    assert slowest[0]["wall_time_p95"] is None
+    assert slowest[1]["wall_time_p95"] == 0.5
+
+
+def test_check_metrics_view(client, settings, check_metrics):
+    settings.ZOO_METRICS_TOKEN = "s3cr3t"
+    check_metrics.record("standards.checks.check_a.check_fast", stats(0.02))
+
+    forbidden = client.get(reverse("check_metrics"))
+    response = client.get(reverse("check_metrics"), HTTP_AUTHORIZATION="Bearer s3cr3t")
+
+    assert forbidden.status_code == 403
+    assert response.status_code == 200
+    labels = 'package="standards",module="standards.checks.check_a",check="check_fast"'
+    assert (
+        f'zoo_check_wall_seconds_bucket{{{labels},le="0.05"}} 1'
+        in response.content.decode()
+    )
+    assert f"zoo_check_results_total{{{labels}}} 1" in response.content.decode()
+
+
+def test_slowest_checks_view(client, user_factory, check_metrics):
+    check_metrics.record("standards.checks.check_a.check_fast", stats(0.02))
+    client.force_login(user_factory(is_staff=True))
+
+    response = client.get(reverse("slowest_checks"))
+
+    assert response.status_code == 200
+    assert b"check_fast" in response.content
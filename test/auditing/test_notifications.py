@@ -0,0 +1,155 @@
+import fakeredis
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from slacker import Error as SlackError
+
+from zoo.auditing import notifications as uut
+
+
+@pytest.fixture
+def queue():
+    connection = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+    return uut.SlackDigestQueue(window=60, max_lines=3, connection=connection)
+
+
+@pytest.fixture
+def m_task(mocker):
+    return mocker.patch.object(uut.tasks, "send_slack_digest")
+
+
+@pytest.fixture
+def m_slack(mocker):
+    return mocker.patch.object(uut, "slack")
+
+
+def test_format_digest():
+    assert uut.format_digest(["New issue"]) == "New issue"
+    assert uut.format_digest(["New issue", "Reopened issue"]) == (
+        "2 issues changed status:\n• New issue\n• Reopened issue"
+    )
+
+
+def test_slack_digest_queue__push(queue, m_task):
+    queue.push("#zoo", ["one", "two"])
+    queue.push("#zoo", ["three"])
+    queue.push("#other", ["four"])
+
+    assert [call.kwargs for call in m_task.apply_async.call_args_list] == [
+        {"args": ("#zoo",), "countdown": 60},
+        {"args": ("#other",), "countdown": 60},
+    ]
+
+
+def test_slack_digest_queue__deliver(queue, m_task, m_slack):
+    queue.push("#zoo", ["one", "two"])
+    m_task.apply_async.reset_mock()
+
+    queue.deliver("#zoo")
+
+    m_slack.chat.post_message.assert_called_once_with(
+        "#zoo", "2 issues changed status:\n• one\n• two"
+    )
+    m_task.apply_async.assert_not_called()
+
+    # the delivery is done, the next message schedules another one
+    queue.push("#zoo", ["three"])
+    m_task.apply_async.assert_called_once_with(args=("#zoo",), countdown=60)
+
+
+def test_slack_digest_queue__deliver_in_parts(queue, m_task, m_slack):
+    queue.push("#zoo", ["one", "two", "three", "four"])
+    m_task.apply_async.reset_mock()
+
+    queue.deliver("#zoo")
+
+    m_slack.chat.post_message.assert_called_once_with(
+        "#zoo", "3 issues changed status:\n• one\n• two\n• three"
+    )
+    m_task.apply_async.assert_called_once_with(args=("#zoo",), countdown=0)
+
+    queue.deliver("#zoo")
+    m_slack.chat.post_message.assert_called_with("#zoo", "four")
+
+
+def test_slack_digest_queue__deliver_nothing(queue, m_slack):
+    queue.deliver("#zoo")
+
+    m_slack.chat.post_message.assert_not_called()
+
+
+def test_slack_digest_queue__slack_error(queue, m_task, m_slack, mocker):
+    m_log = mocker.patch.object(uut, "log")
+    m_slack.chat.post_message.side_effect = SlackError("channel_not_found")
+    queue.push("#zoo", ["one", "two", "three", "four"])
+    m_task.apply_async.reset_mock()
+
+    queue.deliver("#zoo")
+
+    m_log.exception.assert_called_once_with(
+        "auditing.slack_digest.slack_error",
+        channel="#zoo",
+        error="Error('channel_not_found')",
+    )
+    # the messages are back in their order, retried later and later
+    assert queue.pop("#zoo") == (["one", "two", "three"], 1)
+    queue.requeue("#zoo", ["one", "two", "three"])
+    assert [call.kwargs["countdown"] for call in m_task.apply_async.call_args_list] == [
+        60,
+        120,
+    ]
+
+    m_slack.chat.post_message.side_effect = None
+    queue.deliver("#zoo")
+    m_slack.chat.post_message.assert_called_with(
+        "#zoo", "3 issues changed status:\n• one\n• two\n• three"
+    )
+    assert queue.connection.get("zoo:slack-digest:#zoo:attempts") is None
+
+
+def test_slack_digest_queue__slack_error_dropped(queue, m_task, m_slack, mocker):
+    m_log = mocker.patch.object(uut, "log")
+    m_slack.chat.post_message.side_effect = SlackError("channel_not_found")
+    queue.push("#zoo", ["one"])
+
+    for _ in range(uut.MAX_DELIVERY_ATTEMPTS):
+        queue.deliver("#zoo")
+
+    assert m_slack.chat.post_message.call_count == uut.MAX_DELIVERY_ATTEMPTS
+    assert queue.pop("#zoo") == ([], 0)
+    m_log.warning.assert_called_once_with(
+        "auditing.slack_digest.dropped", channel="#zoo", messages=1
+    )
+
+
+def test_slack_digest_queue__rate_limit(queue, m_task, m_slack, mocker):
+    m_try_acquire = mocker.patch.object(
+        queue.limiter, "try_acquire", side_effect=[12.5, 0]
+    )
+    queue.push("#zoo", ["one", "two"])
+    m_task.apply_async.reset_mock()
+
+    queue.deliver("#zoo")
+
+    # no token, the worker isn't blocked and the digest waits in the queue
+    m_try_acquire.assert_called_once_with(uut.SLACK_BUCKET)
+    m_slack.chat.post_message.assert_not_called()
+    m_task.apply_async.assert_called_once_with(args=("#zoo",), countdown=13)
+
+    queue.deliver("#zoo")
+    m_slack.chat.post_message.assert_called_once_with(
+        "#zoo", "2 issues changed status:\n• one\n• two"
+    )
+
+
+def test_slack_digest_queue__redis_error(mocker, m_task):
+    m_log = mocker.patch.object(uut, "log")
+    connection = mocker.Mock()
+    connection.rpush.side_effect = RedisConnectionError("down")
+    queue = uut.SlackDigestQueue(window=60, max_lines=3, connection=connection)
+
+    queue.push("#zoo", ["one"])
+
+    m_task.apply_async.assert_not_called()
+    m_log.warning.assert_called_once_with(
+        "auditing.slack_digest.queue_error", error=repr(connection.rpush.side_effect)
+    )
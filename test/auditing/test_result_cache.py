@@ -0,0 +1,105 @@
+import fakeredis
+import pytest
+
+from zoo.auditing import result_cache as uut
+from zoo.auditing import runner
+
+pytestmark = pytest.mark.django_db
+
+
+def check_dockerfile(context):
+    found = bool(context.files.glob("**/Dockerfile"))
+    yield context.Result("docker:missing", not found, {"paths": []})
+
+
+@pytest.fixture
+def connection(mocker):
+    connection = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+    mocker.patch("zoo.base.redis.get_connection", return_value=connection)
+    return connection
+
+
+@pytest.fixture
+def check_files(mocker):
+    return mocker.patch.dict(
+        "zoo.auditing.result_cache.CHECK_FILES",
+        {check_dockerfile.__module__: ["Dockerfile"]},
+    )
+
+
+def check_dockerfile_again(context):
+    yield from check_dockerfile(context)
+
+
+def test_get_fingerprints(repository, fake_path, check_files):
+    def fingerprint():
+        [fingerprint] = uut.get_fingerprints(
+            [check_dockerfile], runner.CheckContext(repository, fake_path)
+        )
+        return fingerprint
+
+    (fake_path / "Dockerfile").write_text("FROM python")
+    first = fingerprint()
+    (fake_path / "README.md").write_text("# Unrelated")
+    assert fingerprint() == first
+
+    (fake_path / "Dockerfile").write_text("FROM node")
+    assert fingerprint() != first
+
+    check_files.clear()
+    assert fingerprint() is None
+
+
+def test_get_fingerprints__shared_patterns(repository, fake_path, check_files, mocker):
+    m_hash_files = mocker.spy(uut, "_hash_files")
+    (fake_path / "Dockerfile").write_text("FROM python")
+
+    first, again = uut.get_fingerprints(
+        [check_dockerfile, check_dockerfile_again],
+        runner.CheckContext(repository, fake_path),
+    )
+
+    # the checks share their module, the files are matched once for both
+    assert m_hash_files.call_count == 1
+    assert None not in {first, again} and first != again
+
+
+def test_get_code_version(mocker):
+    uut._get_code_version.cache_clear()
+    m_version = mocker.patch.object(uut.metadata, "version", return_value="1.0.0")
+    first = uut._get_code_version(check_dockerfile)
+
+    uut._get_code_version.cache_clear()
+    m_version.return_value = "1.1.0"
+    assert uut._get_code_version(check_dockerfile) != first
+    m_version.assert_called_with("test")
+
+    uut._get_code_version.cache_clear()
+    m_version.side_effect = uut.metadata.PackageNotFoundError
+    assert uut._get_code_version(check_dockerfile) != first
+    uut._get_code_version.cache_clear()
+
+
+def test_run_checks__cached(repository, fake_path, connection, check_files, mocker):
+    m_record_cache = mocker.patch.object(runner.CheckMetrics, "record_cache")
+    # checks run in processes of their own, the calls can only be counted here
+    m_run_in_processes = mocker.spy(runner, "run_in_processes")
+    (fake_path / "Dockerfile").write_text("FROM python")
+
+    first = list(runner.run_checks([check_dockerfile], repository, fake_path))
+    second = list(runner.run_checks([check_dockerfile], repository, fake_path))
+    (fake_path / "Dockerfile").unlink()
+    third = list(runner.run_checks([check_dockerfile], repository, fake_path))
+
+    assert first == second == [runner.Result("docker:missing", False, {"paths": []})]
+    assert third == [runner.Result("docker:missing", True, {"paths": []})]
+    assert [len(call.args[1]) for call in m_run_in_processes.call_args_list] == [
+        1,
+        0,
+        1,
+    ]
+    assert [call.kwargs["is_hit"] for call in m_record_cache.call_args_list] == [
+        False,
+        True,
+        False,
+    ]
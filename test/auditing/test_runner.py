@@ -1,6 +1,8 @@
+import time
+
 import arrow
 import pytest
-from slacker import Error as SlackError
+from django.core.exceptions import ImproperlyConfigured
 
 import zoo.auditing.runner as uut
 from zoo import auditing
@@ -17,6 +19,17 @@ def test_check_context__init(repository, fake_path):
     assert context.project_type == repository.project_type
 
 
+def test_check_context__files(repository, fake_path):
+    (fake_path / "Dockerfile").write_text("FROM python")
+    (fake_path / "vendor").mkdir()
+    (fake_path / "vendor" / "Dockerfile").write_text("FROM node")
+    repository.exclusions = "vendor"
+
+    context = uut.CheckContext(repository, fake_path)
+
+    assert [file.path for file in context.files.glob("**/Dockerfile")] == ["Dockerfile"]
+
+
 @pytest.mark.parametrize(
     "issue_key, is_found, result",
     (
@@ -37,8 +50,8 @@ def test_check_context__result_with_details(check_context):
     "is_found, status",
     ((True, Issue.Status.NEW.value), (False, Issue.Status.NOT_FOUND.value)),
 )
-def test_save_check_result__found_new_issue(is_found, status, repository, freezer):
-    uut.save_check_result(repository, "missing:coffee", is_found)
+def test_save_check_results__found_new_issue(is_found, status, repository, freezer):
+    uut.save_check_results(repository, [uut.Result("missing:coffee", is_found)])
 
     new_issue = Issue.objects.get()
     assert new_issue.repository == repository
@@ -47,6 +60,101 @@ def test_save_check_result__found_new_issue(is_found, status, repository, freeze
     assert new_issue.last_check == arrow.utcnow().datetime
 
 
+def check_slow(context):
+    time.sleep(0.2)
+    yield context.Result("check:slow", True)
+
+
+def check_hanging(context):
+    time.sleep(60)
+    yield context.Result("check:hanging", True)
+
+
+@pytest.mark.parametrize("pool", ["process", "thread"])
+def test_check_repository__order(repository, fake_path, settings, pool):
+    settings.ZOO_AUDITING_CHECK_POOL = pool
+    results = uut.check_repository([check_slow, check_passing], repository, fake_path)
+
+    assert [result.issue_key for result in results] == [
+        "check:slow",
+        "check:passing",
+    ]
+
+
+@pytest.mark.parametrize("pool", ["isolated", "threads", ""])
+def test_run_checks__unknown_pool(repository, fake_path, settings, pool):
+    settings.ZOO_AUDITING_CHECK_POOL = pool
+
+    with pytest.raises(ImproperlyConfigured):
+        list(uut.run_checks([check_passing], repository, fake_path))
+
+
+def test_run_checks_and_save_results__timeout(
+    repository, fake_path, mocker, settings, issue_factory
+):
+    settings.ZOO_AUDITING_CHECK_TIMEOUT = 1
+    settings.ZOO_AUDITING_CHECK_WORKERS = 1
+    checks = [check_hanging, check_slow, check_passing]
+    mocker.patch("zoo.auditing.runner.CHECKS", checks)
+    mocker.patch.dict(
+        "zoo.auditing.runner.CHECK_KINDS",
+        {check_hanging.__module__: ["check:hanging"]},
+    )
+    issue = issue_factory(
+        repository=repository,
+        kind_key="check:hanging",
+        status=Issue.Status.NEW.value,
+    )
+    started_at = time.monotonic()
+
+    uut.run_checks_and_save_results(checks, repository, fake_path)
+
+    # the hanging check is killed, the others run in its worker's replacement
+    assert time.monotonic() - started_at < 10
+    assert Issue.objects.get(kind_key="check:slow").status == Issue.Status.NEW.value
+
+    issue.refresh_from_db()
+    assert issue.status == Issue.Status.NEW.value
+    assert issue.deleted is False
+    assert Issue.objects.get(kind_key="check:passing").deleted is False
+
+
+def test_run_checks__thread_timeout(repository, fake_path, mocker, settings):
+    settings.ZOO_AUDITING_CHECK_POOL = "thread"
+    settings.ZOO_AUDITING_CHECK_TIMEOUT = 1
+    settings.ZOO_AUDITING_CHECK_WORKERS = 1
+    mocker.patch.dict(
+        "zoo.auditing.runner.CHECK_KINDS",
+        {check_hanging.__module__: ["check:hanging"]},
+    )
+    started_at = time.monotonic()
+
+    results = list(
+        uut.run_checks([check_hanging, check_passing], repository, fake_path)
+    )
+
+    # the hanging check is given up on, another thread runs the next one
+    assert time.monotonic() - started_at < 10
+    assert results == [
+        uut.Result("check:hanging", None),
+        uut.Result("check:passing", False),
+    ]
+
+
+def test_check_repository__metrics(repository, fake_path, mocker):
+    m_record = mocker.patch.object(uut.CheckMetrics, "record")
+
+    list(uut.check_repository([check_found, check_failing], repository, fake_path))
+
+    assert [call.args[0] for call in m_record.call_args_list] == [
+        "test.auditing.test_runner.check_found",
+        "test.auditing.test_runner.check_failing",
+    ]
+    found_stats, failing_stats = (call.args[1] for call in m_record.call_args_list)
+    assert (found_stats.results, found_stats.errors) == (1, 0)
+    assert (failing_stats.results, failing_stats.errors) == (0, 1)
+
+
 @pytest.mark.parametrize(
     "is_found, old_status, new_status",
     (
@@ -62,7 +170,7 @@ def test_save_check_result__found_new_issue(is_found, status, repository, freeze
         (False, Issue.Status.WONTFIX.value, Issue.Status.FIXED.value),
     ),
 )
-def test_save_check_result__existing_issue(
+def test_save_check_results__existing_issue(
     is_found, old_status, new_status, issue_factory, service_factory, freezer
 ):
     issue = issue_factory(
@@ -71,7 +179,7 @@ def test_save_check_result__existing_issue(
     repository = issue.repository
     service = service_factory(repository=repository)
 
-    uut.save_check_result(repository, issue.kind_key, is_found)
+    uut.save_check_results(repository, [uut.Result(issue.kind_key, is_found)])
 
     updated_issue = Issue.objects.get()
     assert updated_issue.repository == repository
@@ -89,10 +197,10 @@ def test_save_check_result__existing_issue(
         (False, {"x": 1}, {}),
     ),
 )
-def test_save_check_result__details_of_new_issue(
+def test_save_check_results__details_of_new_issue(
     is_found, details, expected_details, repository
 ):
-    uut.save_check_result(repository, "missing:beer", is_found, details)
+    uut.save_check_results(repository, [uut.Result("missing:beer", is_found, details)])
 
     new_issue = Issue.objects.get()
     assert new_issue.details == expected_details
@@ -111,13 +219,15 @@ def test_save_check_result__details_of_new_issue(
         (False, {"old": 1}, {"new": 3}, {}),
     ),
 )
-def test_save_check_result__details_of_existing_issue(
+def test_save_check_results__details_of_existing_issue(
     is_found, old_details, details, expected_details, issue_factory, service_factory
 ):
     issue = issue_factory(details=old_details)
     service = service_factory(repository=issue.repository)
 
-    uut.save_check_result(issue.repository, issue.kind_key, is_found, details)
+    uut.save_check_results(
+        issue.repository, [uut.Result(issue.kind_key, is_found, details)]
+    )
 
     new_issue = Issue.objects.get()
     assert new_issue.details == expected_details
@@ -232,6 +342,87 @@ def test_run_checks_and_save_results__failing_check(repository, fake_path, mocke
     )
 
 
+def test_run_checks_and_save_results__timings(repository, fake_path, mocker):
+    checks = [check_slow, check_passing]
+    mocker.patch("zoo.auditing.runner.CHECKS", checks)
+    repository.check_timings = {"removed.check": 1.0}
+    repository.save()
+
+    uut.run_checks_and_save_results(checks, repository, fake_path)
+
+    repository.refresh_from_db()
+    # the timings of checks that aren't discovered anymore are dropped
+    assert set(repository.check_timings) == {
+        uut.get_check_name(check) for check in checks
+    }
+    assert repository.check_timings[uut.get_check_name(check_slow)] >= 0.2
+
+
+def test_save_check_results(repository, issue_factory, mocker):
+    m_notify = mocker.patch.object(uut, "notify_status_changes")
+    last_check = arrow.utcnow().shift(years=-1).datetime
+    fixed = issue_factory(
+        repository=repository,
+        kind_key="check:fixed",
+        status=Issue.Status.FIXED.value,
+        last_check=last_check,
+    )
+    new = issue_factory(
+        repository=repository,
+        kind_key="check:new",
+        status=Issue.Status.NEW.value,
+        last_check=last_check,
+    )
+    gone = issue_factory(
+        repository=repository, kind_key="check:gone", status=Issue.Status.NEW.value
+    )
+    results = [
+        uut.Result("check:fixed", True, {"line": 1}),
+        uut.Result("check:new", True),
+        uut.Result("check:created", True, {"line": 2}),
+        uut.Result("check:created", False),
+    ]
+
+    uut.save_check_results(
+        repository,
+        results,
+        seen_keys={"check:fixed", "check:new", "check:created", "check:unknown"},
+    )
+
+    fixed.refresh_from_db()
+    assert fixed.status == Issue.Status.REOPENED.value
+    assert fixed.details == {"line": 1}
+    assert fixed.last_check > last_check
+    new.refresh_from_db()
+    assert new.status == Issue.Status.NEW.value
+    assert new.last_check > last_check
+    created = Issue.objects.get(kind_key="check:created")
+    assert created.status == Issue.Status.FIXED.value
+    assert created.details == {}
+    gone.refresh_from_db()
+    assert gone.deleted is True
+    # only the transitions are notified, not the issues still found
+    (notified,) = m_notify.call_args[0]
+    assert [issue.kind_key for issue in notified] == ["check:fixed"]
+
+
+def test_save_check_results__queries(
+    repository, issue_factory, mocker, django_assert_num_queries
+):
+    mocker.patch.object(uut, "notify_status_changes")
+    for index in range(20):
+        issue_factory(repository=repository, kind_key=f"check:{index}")
+    results = [uut.Result(f"check:{index}", index % 2 == 0) for index in range(40)]
+
+    # the issues: one select, one bulk create in a savepoint, bulk updates
+    with django_assert_num_queries(7):
+        uut.save_check_results(
+            repository, results, seen_keys={result.issue_key for result in results}
+        )
+
+    assert Issue.objects.filter(repository=repository).count() == 40
+
+
 @pytest.mark.parametrize(
     "is_found, old_status, new_status",
     (
@@ -251,16 +442,15 @@ def test_determine_issue_status(is_found, old_status, new_status):
     assert uut.determine_issue_status(is_found, old_status) == new_status
 
 
-def test_notify_status_change(mocker, issue_factory, service_factory):
+def test_notify_status_changes(mocker, issue_factory, service_factory):
     service = service_factory()
     issue = issue_factory(repository=service.repository)
-    log = mocker.patch("zoo.auditing.runner.log", mocker.Mock())
-    slack = mocker.patch("zoo.auditing.runner.slack", mocker.Mock())
+    m_queue = mocker.patch("zoo.auditing.runner.SlackDigestQueue")
     m_reverse = mocker.patch("zoo.auditing.runner.reverse", mocker.Mock())
 
-    uut.notify_status_change(issue)
-    slack.chat.post_message.assert_called_once()
-    channel, text = slack.chat.post_message.call_args[0]
+    uut.notify_status_changes([issue])
+    m_queue.return_value.push.assert_called_once()
+    channel, (text,) = m_queue.return_value.push.call_args[0]
     assert channel == service.slack_channel
     assert issue.kind.title in text
     assert issue.repository.name in text
@@ -268,36 +458,52 @@ def test_notify_status_change(mocker, issue_factory, service_factory):
         "audit_report", args=("services", service.owner_slug, service.name_slug)
     )
 
-    # Unhappy path
-    slack.chat.post_message.side_effect = SlackError("channel_not_found")
-    uut.notify_status_change(issue)
-    log.exception.assert_called_once_with(
-        "auditing.update_issue.slack_error", error="Error('channel_not_found')"
+
+def test_notify_status_changes__fixed(mocker, issue_factory, service_factory):
+    service = service_factory()
+    issue = issue_factory(
+        repository=service.repository, status=Issue.Status.FIXED.value
     )
+    m_queue = mocker.patch("zoo.auditing.runner.SlackDigestQueue")
+
+    uut.notify_status_changes([issue])
+    m_queue.return_value.push.assert_not_called()
 
 
-def test_notify_status_change_monorepo(mocker, issue_factory, service_factory):
+def test_notify_status_changes__monorepo(mocker, issue_factory, service_factory):
     service = service_factory()
     service_2 = service_factory(repository=service.repository)
     issue = issue_factory(repository=service.repository)
-    log = mocker.patch("zoo.auditing.runner.log", mocker.Mock())
-    slack = mocker.patch("zoo.auditing.runner.slack", mocker.Mock())
+    m_queue = mocker.patch("zoo.auditing.runner.SlackDigestQueue")
     m_reverse = mocker.patch("zoo.auditing.runner.reverse", mocker.Mock())
 
-    uut.notify_status_change(issue)
-    assert slack.chat.post_message.call_count == 2
+    uut.notify_status_changes([issue])
+    assert m_queue.return_value.push.call_count == 2
     channels = []
     texts = []
-    for args_list in slack.chat.post_message.call_args_list:
+    for args_list in m_queue.return_value.push.call_args_list:
         channels.append(args_list.args[0])
-        texts.append(args_list.args[1])
+        texts.extend(args_list.args[1])
     assert service.slack_channel in channels
     assert service_2.slack_channel in channels
     assert any(issue.kind.title in text for text in texts)
     assert any(issue.repository.name in text for text in texts)
     assert m_reverse.call_count == 2
 
-    # Unhappy path
-    slack.chat.post_message.side_effect = SlackError("channel_not_found")
-    uut.notify_status_change(issue)
-    assert log.exception.call_count == 2
+
+def test_notify_status_changes(
+    mocker, issue_factory, service_factory, django_assert_num_queries
+):
+    service = service_factory()
+    issues = [issue_factory(repository=service.repository) for _ in range(10)]
+    m_queue = mocker.patch("zoo.auditing.runner.SlackDigestQueue")
+
+    # the site and the services of the repositories
+    with django_assert_num_queries(2):
+        uut.notify_status_changes(issues)
+
+    # one push of all the messages for the channel
+    m_queue.return_value.push.assert_called_once()
+    channel, lines = m_queue.return_value.push.call_args[0]
+    assert channel == service.slack_channel
+    assert len(lines) == 10
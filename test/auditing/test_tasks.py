@@ -3,7 +3,11 @@ import pytest
 from factory import Faker
 
 from zoo.auditing import tasks as uut
-from zoo.auditing.models import Issue
+from zoo.auditing.models import (
+    Issue,
+    IssueCountByKindSnapshot,
+    IssueCountByRepositorySnapshot,
+)
 from zoo.repos.models import Provider
 
 pytestmark = pytest.mark.django_db
@@ -65,3 +69,26 @@ def test_cleanup_issues__status_unknown(
     assert Issue.objects.get(kind_key=kind_1.id).id == issue_1.id
     assert Issue.objects.get(kind_key=kind_2.id).id == issue_2.id
     assert not Issue.objects.filter(kind_key=kind_3.id).exists()
+
+
+def test_take_issue_table_snapshots(repository, issue_factory, mocker):
+    now = arrow.get("2020-01-01T12:00:00").datetime
+    m_now = mocker.patch("zoo.utils.timezone.now", return_value=now)
+    issue_factory(repository=repository, kind_key="check:a", status="new")
+    issue_factory(repository=repository, kind_key="check:a", status="fixed")
+    issue_factory(repository=repository, kind_key="check:b", status="new")
+
+    uut.take_issue_table_snapshots()
+    issue_factory(repository=repository, kind_key="check:b", status="new")
+    m_now.return_value = arrow.get("2020-01-01T18:00:00").datetime
+    uut.take_issue_table_snapshots()
+
+    midnight = arrow.get("2020-01-01").datetime
+    assert sorted(
+        IssueCountByRepositorySnapshot.objects.values_list(
+            "timestamp", "status", "count"
+        )
+    ) == [(midnight, "fixed", 1), (midnight, "new", 3)]
+    assert sorted(
+        IssueCountByKindSnapshot.objects.values_list("kind_key", "status", "count")
+    ) == [("check:a", "fixed", 1), ("check:a", "new", 1), ("check:b", "new", 2)]
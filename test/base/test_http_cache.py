@@ -0,0 +1,109 @@
+import fakeredis
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from zoo.base import http
+from zoo.base import http_cache as uut
+
+
+def make_response(status_code, headers=None, body=b""):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = body
+    return response
+
+
+@pytest.fixture(params=["redis", "disk"])
+def storage(request, tmp_path):
+    if request.param == "redis":
+        return uut.RedisCacheStorage(
+            1024, connection=fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+        )
+    return uut.DiskCacheStorage(tmp_path / "http-cache", 1024)
+
+
+@pytest.fixture
+def m_send(mocker):
+    return mocker.patch.object(HTTPAdapter, "send")
+
+
+def test_caching_adapter(storage, m_send):
+    session = http.requests_retry_session(session=requests.Session(), cache=storage)
+    m_send.side_effect = [
+        make_response(200, {"ETag": '"v1"', "Content-Type": "application/json"}, b"{}"),
+        make_response(304, {"X-RateLimit-Remaining": "42"}),
+    ]
+
+    first = session.get("https://api.github.com/repos/kiwicom/the-zoo")
+    second = session.get("https://api.github.com/repos/kiwicom/the-zoo")
+
+    assert first.json() == second.json() == {}
+    assert second.status_code == 200
+    assert second.headers["X-RateLimit-Remaining"] == "42"
+    assert second.headers["Content-Type"] == "application/json"
+
+    revalidation = m_send.call_args_list[1].args[0]
+    assert revalidation.headers["If-None-Match"] == '"v1"'
+    assert http.get_cache_stats(session) == {
+        "api.github.com": {"hits": 1, "misses": 1, "bytes_saved": 2}
+    }
+
+
+def test_caching_adapter__modified(storage, m_send):
+    session = http.requests_retry_session(session=requests.Session(), cache=storage)
+    last_modified = "Mon, 01 Apr 2019 10:00:00 GMT"
+    m_send.side_effect = [
+        make_response(200, {"Last-Modified": last_modified}, b"old"),
+        make_response(200, {"Last-Modified": last_modified}, b"new"),
+    ]
+
+    session.get("https://gitlab.com/api/v4/projects/1")
+    response = session.get("https://gitlab.com/api/v4/projects/1")
+
+    assert response.content == b"new"
+    revalidation = m_send.call_args_list[1].args[0]
+    assert revalidation.headers["If-Modified-Since"] == last_modified
+
+
+@pytest.mark.parametrize(
+    ("headers", "stream"),
+    [
+        ({}, False),
+        ({"ETag": '"v1"', "Cache-Control": "no-store"}, False),
+        ({"ETag": '"v1"'}, True),
+    ],
+)
+def test_caching_adapter__not_cached(storage, m_send, headers, stream):
+    session = http.requests_retry_session(session=requests.Session(), cache=storage)
+    m_send.side_effect = lambda *args, **kwargs: make_response(200, headers, b"{}")
+
+    session.get("https://sentry.io/api/0/", stream=stream)
+    session.get("https://sentry.io/api/0/", stream=stream)
+
+    assert "If-None-Match" not in m_send.call_args.args[0].headers
+
+
+def test_caching_adapter__per_token(storage, m_send):
+    session = http.requests_retry_session(session=requests.Session(), cache=storage)
+    m_send.side_effect = lambda *args, **kwargs: make_response(
+        200, {"ETag": '"v1"'}, b"{}"
+    )
+
+    session.get("https://gitlab.com/api/v4/projects", headers={"PRIVATE-TOKEN": "a"})
+    session.get("https://gitlab.com/api/v4/projects", headers={"PRIVATE-TOKEN": "b"})
+
+    assert "If-None-Match" not in m_send.call_args.args[0].headers
+
+
+def test_storage_eviction(storage):
+    storage.set("old", b"x" * 400)
+    storage.set("used", b"x" * 400)
+    storage.get("old")  # becomes the most recently used
+
+    storage.set("new", b"x" * 400)
+
+    assert storage.get("used") is None
+    assert storage.get("old") is not None
+    assert storage.get("new") is not None
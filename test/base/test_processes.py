@@ -0,0 +1,120 @@
+import os
+import time
+
+import billiard
+import pytest
+
+from zoo.base import processes as uut
+
+
+def test_run_in_processes__order():
+    outcomes = uut.run_in_processes(
+        lambda delay, value: time.sleep(delay) or value,
+        [(0.3, "slow"), (0, "fast"), (0.1, "medium")],
+        processes=3,
+        timeout=10,
+    )
+
+    assert list(outcomes) == [(None, "slow"), (None, "fast"), (None, "medium")]
+
+
+def test_run_in_processes__error():
+    def fail(message):
+        raise ValueError(message)
+
+    [(error, result)] = uut.run_in_processes(fail, [("boom",)], 1, 10)
+
+    assert repr(error) == "ValueError('boom')"
+    assert result is None
+
+
+def test_run_in_processes__lost():
+    [(error, result)] = uut.run_in_processes(os._exit, [(3,)], 1, 10)
+
+    assert isinstance(error, uut.ProcessLostError)
+    assert str(error) == "exit code 3"
+    assert result is None
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_run_in_processes__timeout(processes):
+    started_at = time.monotonic()
+
+    outcomes = list(
+        uut.run_in_processes(
+            lambda delay: time.sleep(delay) or delay,
+            [(60,), (0,), (60,), (0,)],
+            processes=processes,
+            timeout=0.5,
+        )
+    )
+
+    # the deadlines count from the start of every process
+    assert time.monotonic() - started_at < 5
+    assert [type(error) for error, _ in outcomes] == [
+        uut.TimeLimitExceeded,
+        type(None),
+        uut.TimeLimitExceeded,
+        type(None),
+    ]
+    assert [result for _, result in outcomes] == [None, 0, None, 0]
+
+
+def test_run_in_processes__close():
+    outcomes = uut.run_in_processes(
+        lambda delay: time.sleep(delay) or os.getpid(),
+        [(0,), (60,)],
+        processes=2,
+        timeout=120,
+    )
+    _, pid = next(outcomes)
+
+    outcomes.close()
+
+    assert pid != os.getpid()
+    assert not [process for process in billiard.active_children() if process.is_alive()]
+
+
+def test_run_in_threads__order():
+    outcomes = uut.run_in_threads(
+        lambda delay, value: time.sleep(delay) or value,
+        [(0.3, "slow"), (0, "fast"), (0.1, "medium")],
+        threads=3,
+        timeout=10,
+    )
+
+    assert list(outcomes) == [(None, "slow"), (None, "fast"), (None, "medium")]
+
+
+def test_run_in_threads__error():
+    def fail(message):
+        raise ValueError(message)
+
+    [(error, result)] = uut.run_in_threads(fail, [("boom",)], 1, 10)
+
+    assert repr(error) == "ValueError('boom')"
+    assert result is None
+
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_run_in_threads__timeout(threads):
+    started_at = time.monotonic()
+
+    outcomes = list(
+        uut.run_in_threads(
+            lambda delay: time.sleep(delay) or delay,
+            [(60,), (0,), (60,), (0,)],
+            threads=threads,
+            timeout=0.5,
+        )
+    )
+
+    # the deadlines count from the start of every thread, given up ones are replaced
+    assert time.monotonic() - started_at < 5
+    assert [type(error) for error, _ in outcomes] == [
+        uut.TimeLimitExceeded,
+        type(None),
+        uut.TimeLimitExceeded,
+        type(None),
+    ]
+    assert [result for _, result in outcomes] == [None, 0, None, 0]
@@ -0,0 +1,129 @@
+import io
+
+import fakeredis
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from zoo.base import http
+from zoo.base import ratelimit as uut
+
+
+def make_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response.raw = io.BytesIO()
+    return response
+
+
+@pytest.fixture
+def limiter():
+    return uut.RateLimiter(
+        {"api.github.com": 3600},
+        max_wait=60,
+        connection=fakeredis.FakeStrictRedis(server=fakeredis.FakeServer()),
+    )
+
+
+@pytest.fixture
+def m_sleep(mocker):
+    """Make sleeping move a fake clock forward."""
+    clock = [1000.0]
+
+    def sleep(seconds):
+        clock[0] += seconds
+
+    mocker.patch("zoo.base.ratelimit.time.time", side_effect=lambda: clock[0])
+    return mocker.patch("zoo.base.ratelimit.time.sleep", side_effect=sleep)
+
+
+def test_take(limiter):
+    # one request per second, with a burst of ten
+    waits = [limiter._take("api.github.com", 1000) for _ in range(11)]
+
+    assert waits == [0] * 10 + [1]
+    assert limiter._take("api.github.com", 1001) == 0
+    assert limiter._take("gitlab.com", 1000) == 0  # no limit known
+
+
+def test_update(limiter, mocker):
+    mocker.patch("zoo.base.ratelimit.time.time", return_value=1000)
+
+    limiter.update("gitlab.com", remaining=10, reset=1100)
+    assert limiter._take("gitlab.com", 1000) == 0
+    assert limiter._take("gitlab.com", 1000) == pytest.approx(10)
+
+    limiter.update("gitlab.com", remaining=0, reset=1200)
+    assert limiter._take("gitlab.com", 1000) == 200
+    assert limiter._take("gitlab.com", 1200) == 0
+
+
+def test_acquire(limiter, m_sleep):
+    for _ in range(10):
+        limiter.acquire("api.github.com")
+    m_sleep.assert_not_called()
+
+    limiter.acquire("api.github.com")
+    m_sleep.assert_called_once()
+
+
+def test_acquire__max_wait(limiter, m_sleep):
+    limiter.block("api.github.com", until=10**10)
+
+    limiter.acquire("api.github.com")
+
+    m_sleep.assert_not_called()
+
+
+def test_try_acquire(limiter, m_sleep):
+    waits = [limiter.try_acquire("api.github.com") for _ in range(11)]
+
+    assert waits == [0] * 10 + [1]
+    m_sleep.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ("status_code", "headers", "is_limited"),
+    [
+        (200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "30"}, False),
+        (403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "30"}, True),
+        (429, {"Retry-After": "30"}, True),
+        (403, {"X-RateLimit-Remaining": "100", "X-RateLimit-Reset": "30"}, False),
+    ],
+)
+def test_update_from_response(limiter, mocker, status_code, headers, is_limited):
+    mocker.patch("zoo.base.ratelimit.time.time", return_value=1000)
+
+    retry_at = limiter.update_from_response(
+        "gitlab.com", make_response(status_code, headers)
+    )
+
+    assert retry_at == (1030 if is_limited else None)
+
+
+def test_throttling_adapter(limiter, mocker, m_sleep):
+    session = http.requests_retry_session(session=requests.Session(), limiter=limiter)
+    m_send = mocker.patch.object(
+        HTTPAdapter,
+        "send",
+        side_effect=[
+            make_response(429, {"Retry-After": "5"}),
+            make_response(200, {"RateLimit-Remaining": "99", "RateLimit-Reset": "60"}),
+        ],
+    )
+
+    response = session.get("https://gitlab.com/api/v4/projects")
+
+    assert response.status_code == 200
+    assert m_send.call_count == 2
+    m_sleep.assert_called_once_with(5)
+
+
+def test_get_bucket_name():
+    assert uut.get_bucket_name("https://api.github.com/graphql") == (
+        "api.github.com/graphql"
+    )
+    assert uut.get_bucket_name("https://api.github.com/repos/a/b") == "api.github.com"
+    assert uut.get_bucket_name("https://api.github.com:443/repos") == "api.github.com"
+    assert uut.get_bucket_name("http://localhost:8080/") == "localhost:8080"
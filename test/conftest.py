@@ -11,6 +11,7 @@ from django.db import connections
 from environ import Env
 from faker import Faker
 from pytest_factoryboy import register
+from silk.collector import DataCollector
 
 from zoo.auditing.runner import CheckContext
 from zoo.factories import (
@@ -27,6 +28,7 @@ from zoo.factories import (
     TierFactory,
     UserFactory,
 )
+from zoo.repos import github
 
 from . import dummy
 
@@ -93,6 +95,19 @@ def repo_archive(tmpdir):
     archive_file_object.close()
 
 
+@pytest.fixture(autouse=True)
+def github_metadata_cache(mocker):
+    """Don't share GitHub metadata fetched in one test with the others."""
+    return mocker.patch.dict(github._metadata_cache, clear=True)
+
+
+@pytest.fixture(autouse=True)
+def silk_collector():
+    """Forget the request silk profiled, it would explain the queries of others."""
+    yield
+    DataCollector().clear()
+
+
 @pytest.fixture
 def check_context(repository, fake_path):
     return CheckContext(repository, fake_path)
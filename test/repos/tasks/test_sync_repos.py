@@ -1,9 +1,12 @@
+from datetime import timezone
 from unittest.mock import patch
 
+import arrow
 import pytest
+from django.db import DatabaseError
 from faker import Faker
 
-from zoo.repos.models import Provider, Repository, RepositoryEnvironment
+from zoo.repos.models import DiscoveryState, Provider, Repository, RepositoryEnvironment
 from zoo.repos.tasks import sync_repos
 
 pytestmark = pytest.mark.django_db
@@ -34,6 +37,7 @@ class FakeGitlabProject(FakeGitProject):
         }
         self.path = self.fake.word() if name is None else name
         self.web_url = self.fake.url() if url is None else url
+        self.last_activity_at = self.fake.iso8601(tzinfo=timezone.utc)
 
         if is_fork:
             self.forked_from_project = {"id": self.fake.pyint()}
@@ -54,6 +58,8 @@ class FakeGithubProject(FakeGitProject):
         self.name = self.fake.word() if name is None else name
         self.svn_url = self.fake.url() if url is None else url
         self.fork = is_fork
+        self.updated_at = self.fake.date_time()
+        self.pushed_at = self.fake.date_time()
 
 
 def generate_project_list(pid=None, owner=None, name=None, url=None, **kwargs):
@@ -191,3 +197,59 @@ def test_sync_skip_personal():
         Repository.objects.get(
             remote_id=github_project.id, provider=Provider.GITHUB.value
         )
+
+
+def test_sync_counts(repository_factory):
+    unchanged = repository_factory(provider=Provider.GITLAB.value)
+    renamed = repository_factory(provider=Provider.GITLAB.value)
+    disappeared = repository_factory(provider=Provider.GITHUB.value)
+
+    gitlab_projects = [
+        FakeGitlabProject(
+            unchanged.remote_id, unchanged.owner, unchanged.name, unchanged.url
+        ),
+        FakeGitlabProject(renamed.remote_id, renamed.owner, "renamed", renamed.url),
+        FakeGitlabProject(None, None, None, None),
+        FakeGitlabProject(None, None, None, "not an url"),
+    ]
+    unchanged.last_activity_at = arrow.get(gitlab_projects[0].last_activity_at).datetime
+    unchanged.save()
+
+    with patch(
+        "gitlab.v4.objects.ProjectManager.list", return_value=gitlab_projects
+    ), patch(
+        "github.AuthenticatedUser.AuthenticatedUser.get_repos", return_value=[]
+    ), patch(
+        "zoo.repos.tasks.get_project_enviroments", return_value=[]
+    ):
+        assert sync_repos() == {
+            "created": 1,
+            "updated": 1,
+            "unchanged": 1,
+            "disappeared": 1,
+            "invalid": 1,
+        }
+        assert sync_repos()["unchanged"] == 3
+
+    renamed.refresh_from_db()
+    assert renamed.name == "renamed"
+    assert Repository.objects.filter(pk=disappeared.pk).exists()
+    assert Repository.objects.filter(remote_id=gitlab_projects[2].id).exists()
+
+
+def test_sync_repos__failed_write():
+    gitlab_projects = [FakeGitlabProject(None, None, None, None)]
+
+    with patch(
+        "gitlab.v4.objects.ProjectManager.list", return_value=gitlab_projects
+    ), patch(
+        "github.AuthenticatedUser.AuthenticatedUser.get_repos", return_value=[]
+    ), patch.object(
+        Repository.objects, "bulk_create", side_effect=DatabaseError
+    ), pytest.raises(
+        DatabaseError
+    ):
+        sync_repos()
+
+    # the marks didn't move, the next sync lists the projects again
+    assert not DiscoveryState.objects.filter(high_water__isnull=False).exists()
@@ -109,8 +109,9 @@ def test_update_project_from_zoo_file(mocker):
     """
     data = parse(zoo_yml)
 
+    # providers return the content of files as bytes
     m_get_zoo_file_content = mocker.patch(
-        "zoo.repos.tasks.get_zoo_file_content", return_value=zoo_yml
+        "zoo.repos.tasks.get_zoo_file_content", return_value=zoo_yml.encode()
     )
     m_update_or_create_service = mocker.patch(
         "zoo.repos.tasks.update_or_create_service", return_value=None
@@ -155,3 +156,96 @@ def get_expected_env(name: str, envs: List) -> Union[Dict, None]:
         if env["name"] == name:
             return env
     return None
+
+
+def test_sync_zoo_file__github(mocker):
+    projects = [
+        {"id": 11, "provider": "github", "owner": "john_doe1", "name": "with_file"},
+        {"id": 12, "provider": "github", "owner": "john_doe1", "name": "without_file"},
+        {"id": 13, "provider": "github", "owner": "john_doe1", "name": "gone"},
+        {"id": 14, "provider": "gitlab", "owner": "john_doe1", "name": "on_gitlab"},
+    ]
+    for project in projects:
+        project["is_fork"] = False
+    m_discovery = mocker.patch("zoo.repos.tasks.ProjectDiscovery").return_value
+    m_discovery.__iter__.return_value = iter(projects)
+    m_get_metadata = mocker.patch(
+        "zoo.repos.github.get_repositories_metadata",
+        return_value={
+            "john_doe1/with_file": {"zoo_file": "type: service"},
+            "john_doe1/without_file": {"zoo_file": None},
+            "john_doe1/gone": None,
+        },
+    )
+    m_apply_async = mocker.patch.object(uut.update_project_from_zoo_file, "apply_async")
+
+    uut.sync_zoo_file()
+
+    m_get_metadata.assert_called_once()
+    assert m_apply_async.call_args_list == [
+        mocker.call(args=(projects[3],)),
+        mocker.call(args=(projects[0],), kwargs={"content": "type: service"}),
+        mocker.call(args=(projects[2],)),
+    ]
+    m_discovery.commit.assert_called_once_with()
+
+
+def test_reconcile_environments(service_factory, environment_factory):
+    service = service_factory()
+    unchanged = environment_factory(
+        service=service,
+        name="production",
+        service_urls=["https://production"],
+        dashboard_url=None,
+        health_check_url=None,
+    )
+    changed = environment_factory(service=service, name="staging")
+    environment_factory(service=service, name="sandbox")
+
+    uut.reconcile_environments(
+        service,
+        [
+            {
+                "name": "production",
+                "service_urls": ["https://production"],
+                "dashboard_url": None,
+                "health_check_url": None,
+            },
+            {
+                "name": "staging",
+                "service_urls": ["https://staging"],
+                "dashboard_url": None,
+                "health_check_url": "https://staging/health",
+            },
+            {
+                "name": "testing",
+                "service_urls": [],
+                "dashboard_url": None,
+                "health_check_url": None,
+            },
+        ],
+    )
+
+    envs = {env.name: env for env in Environment.objects.filter(service=service)}
+    assert set(envs) == {"production", "staging", "testing"}
+    assert envs["production"].pk == unchanged.pk
+    assert envs["staging"].pk == changed.pk
+    assert envs["staging"].health_check_url == "https://staging/health"
+
+
+def test_update_project_from_zoo_file__unchanged(generate_repositories, mocker):
+    zoo_yml = "type: service\nname: test_proj1\nowner: john_doe1\n"
+    mocker.patch("zoo.repos.tasks.update_or_create_service")
+    repository = Repository.objects.get(remote_id=11)
+    proj = {"id": 11, "provider": "github"}
+
+    uut.update_project_from_zoo_file(proj, content=zoo_yml)
+
+    repository.refresh_from_db()
+    assert repository.zoo_file_sha == "dc2c0d3f8a0d66f6702a660bc375509a46f305e8"
+
+    Service.objects.create(owner="john_doe1", name="test_proj1", repository=repository)
+    m_parse = mocker.patch("zoo.repos.tasks.parse")
+    uut.update_project_from_zoo_file(proj, content=zoo_yml)
+
+    m_parse.assert_not_called()
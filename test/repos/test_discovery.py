@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from zoo.repos import discovery as uut
+from zoo.repos.models import DiscoveryState
+
+pytestmark = pytest.mark.django_db
+
+NOW = datetime(2020, 5, 1, tzinfo=timezone.utc)
+
+
+def listing(*updates, completed=True):
+    def get_repositories(since=None):
+        for index, updated_at in enumerate(updates):
+            yield {"id": index, "updated_at": updated_at}
+        return completed
+
+    return get_repositories
+
+
+@pytest.fixture(autouse=True)
+def now(mocker):
+    mocker.patch.object(uut.timezone, "now", return_value=NOW)
+
+
+@pytest.fixture
+def listings(mocker):
+    calls = []
+
+    def patch(github, gitlab):
+        def track(provider, get_repositories):
+            def wrapper(since=None):
+                calls.append((provider, since))
+                return (yield from get_repositories(since))
+
+            return wrapper
+
+        mocker.patch.object(
+            uut,
+            "LISTINGS",
+            [("github", track("github", github)), ("gitlab", track("gitlab", gitlab))],
+        )
+        return calls
+
+    return patch
+
+
+def test_discovery__full_then_incremental(listings):
+    calls = listings(
+        listing(NOW - timedelta(days=2), NOW - timedelta(days=1)), listing()
+    )
+
+    discovery = uut.ProjectDiscovery("sync")
+    assert len(list(discovery)) == 2
+    assert discovery.full_providers == {"github", "gitlab"}
+    discovery.commit()
+
+    state = DiscoveryState.objects.get(task="sync", provider="github")
+    assert state.high_water == NOW - timedelta(days=1)
+    assert state.full_sync_at == NOW
+
+    discovery = uut.ProjectDiscovery("sync")
+    list(discovery)
+    discovery.commit()
+    assert discovery.full_providers == {"gitlab"}  # gitlab has no mark yet
+    assert calls[2] == ("github", NOW - timedelta(days=1) - uut.HIGH_WATER_OVERLAP)
+
+
+def test_discovery__full_interval(listings, settings):
+    settings.SYNC_REPOS_FULL_INTERVAL_HOURS = 24
+    DiscoveryState.objects.create(
+        task="sync",
+        provider="github",
+        high_water=NOW,
+        full_sync_at=NOW - timedelta(hours=25),
+    )
+    calls = listings(listing(), listing())
+
+    for full in [None, True]:
+        discovery = uut.ProjectDiscovery("sync", full=full)
+        list(discovery)
+        discovery.commit()
+
+    assert [since for provider, since in calls if provider == "github"] == [None, None]
+
+
+def test_discovery__incomplete(listings):
+    DiscoveryState.objects.create(
+        task="sync", provider="github", high_water=NOW - timedelta(days=3)
+    )
+    listings(listing(NOW - timedelta(days=1), completed=False), listing())
+
+    discovery = uut.ProjectDiscovery("sync")
+    assert len(list(discovery)) == 1
+    assert "github" not in discovery.full_providers
+    discovery.commit()
+
+    state = DiscoveryState.objects.get(task="sync", provider="github")
+    assert state.high_water == NOW - timedelta(days=3)
+    assert state.full_sync_at is None
+
+
+def test_discovery__not_committed(listings):
+    calls = listings(listing(NOW - timedelta(days=1)), listing())
+
+    list(uut.ProjectDiscovery("sync"))
+    list(uut.ProjectDiscovery("sync"))
+
+    # the projects weren't stored, the next run lists them all again
+    assert [since for provider, since in calls if provider == "github"] == [None, None]
+    assert DiscoveryState.objects.get(task="sync", provider="github").high_water is None
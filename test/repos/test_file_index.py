@@ -0,0 +1,97 @@
+import hashlib
+
+import pytest
+
+from zoo.repos import file_index as uut
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def tree(tmp_path):
+    files = {
+        "Dockerfile": "FROM python",
+        "requirements.txt": "django",
+        "docs/requirements.txt": "sphinx",
+        "docs/openapi.yaml": "openapi: 3.0.0",
+        "test/fixtures/openapi.json": "{}",
+        "vendor/lib/package.json": "{}",
+        "services/api/Dockerfile.prod": "FROM node",
+    }
+    for name, content in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    (tmp_path / "broken").symlink_to(tmp_path / "nonexistent")
+    return tmp_path
+
+
+def test_build(tree):
+    index = uut.FileIndex.build(tree)
+
+    assert len(index) == 7
+    assert "vendor/lib/package.json" in index
+
+    dockerfile = index.get("Dockerfile")
+    assert dockerfile.size == len("FROM python")
+    assert dockerfile.extension == ""
+    assert dockerfile.full_path == tree / "Dockerfile"
+    assert dockerfile.content_hash == hashlib.md5(b"FROM python").hexdigest()
+
+
+@pytest.mark.parametrize(
+    ("pattern", "expected"),
+    [
+        ("*requirements*.txt", ["requirements.txt"]),
+        ("**/requirements.txt", ["docs/requirements.txt", "requirements.txt"]),
+        ("**/Dockerfile*", ["Dockerfile", "services/api/Dockerfile.prod"]),
+        ("docs/*", ["docs/openapi.yaml", "docs/requirements.txt"]),
+        ("**/openapi.[jy]*", ["docs/openapi.yaml", "test/fixtures/openapi.json"]),
+        ("vendor/**/*.json", ["vendor/lib/package.json"]),
+    ],
+)
+def test_glob(tree, pattern, expected):
+    index = uut.FileIndex.build(tree)
+
+    assert [file.path for file in index.glob(pattern)] == expected
+    assert (
+        sorted(
+            path.relative_to(tree).as_posix()
+            for path in tree.glob(pattern)
+            if path.is_file()
+        )
+        == expected
+    )
+
+
+def test_with_extension(tree):
+    index = uut.FileIndex.build(tree)
+
+    assert [file.path for file in index.with_extension("json")] == [
+        "test/fixtures/openapi.json",
+        "vendor/lib/package.json",
+    ]
+    assert index.with_extension("yml") == []
+
+
+def test_exclude(tree):
+    index = uut.FileIndex.build(tree)
+    view = index.exclude(["vendor", "docs/*.yaml", "*test*"])
+
+    assert [file.path for file in view] == [
+        "Dockerfile",
+        "docs/requirements.txt",
+        "requirements.txt",
+        "services/api/Dockerfile.prod",
+    ]
+    assert view.get("Dockerfile") is index.get("Dockerfile")
+
+
+def test_for_repository(tree, repository_factory):
+    repository = repository_factory(exclusions="vendor/, test ,")
+
+    index = uut.FileIndex.for_repository(repository, tree)
+
+    assert "vendor/lib/package.json" not in index
+    assert "test/fixtures/openapi.json" not in index
+    assert "docs/openapi.yaml" in index
@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from collections import Counter
+
+import pytest
+from django.core.management.base import CommandError
+
+from zoo.auditing.management.commands.pull_fleet import parse_concurrency
+from zoo.repos import fleet as uut
+from zoo.repos.tasks import PullOutcome
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def repositories(repository_factory):
+    return [repository_factory(provider="gitlab") for _ in range(4)] + [
+        repository_factory(provider="github") for _ in range(2)
+    ]
+
+
+def test_select_repositories(repositories):
+    gitlab_repo, github_repo = repositories[0], repositories[-1]
+
+    assert uut.select_repositories().count() == 6
+    assert uut.select_repositories(provider="github").count() == 2
+    assert list(uut.select_repositories(owner=gitlab_repo.owner)) == [gitlab_repo]
+    assert list(uut.select_repositories(ids=[github_repo.pk])) == [github_repo]
+
+
+def test_fleet_pull(mocker, repositories):
+    m_pull = mocker.patch("zoo.repos.fleet._pull_repository")
+    m_progress = mocker.Mock()
+
+    summary = uut.FleetPull(
+        uut.select_repositories(), workers=3, use_threads=True, progress=m_progress
+    ).run()
+
+    assert summary == {"pulled": 6}
+    assert sorted(call.args[:3] for call in m_pull.call_args_list) == sorted(
+        (repo.remote_id, repo.provider, False) for repo in repositories
+    )
+    assert m_progress.call_count == 6
+    assert m_progress.call_args.args[2:] == (6, 6)
+
+
+def test_fleet_pull__concurrency(mocker, repositories):
+    lock = threading.Lock()
+    running, peak = Counter(), Counter()
+
+    def fake_pull(remote_id, provider, force, metadata):
+        with lock:
+            running[provider] += 1
+            peak[provider] = max(peak[provider], running[provider])
+        time.sleep(0.05)
+        with lock:
+            running[provider] -= 1
+
+    mocker.patch("zoo.repos.fleet._pull_repository", side_effect=fake_pull)
+
+    uut.FleetPull(
+        uut.select_repositories(),
+        workers=4,
+        concurrency={"gitlab": "1"},
+        use_threads=True,
+    ).run()
+
+    assert peak["gitlab"] == 1
+    assert peak["github"] == 2
+
+
+def test_fleet_pull__github_metadata(mocker, repository_factory):
+    mocker.patch("zoo.repos.github.GRAPHQL_BATCH_SIZE", 2)
+    repositories = [repository_factory(provider="github") for _ in range(3)]
+    m_metadata = mocker.patch(
+        "zoo.repos.github.get_repositories_metadata",
+        side_effect=lambda full_names: {name: {"name": name} for name in full_names},
+    )
+    m_pull = mocker.patch("zoo.repos.fleet._pull_repository")
+
+    uut.FleetPull(uut.select_repositories(), workers=1, use_threads=True).run()
+
+    # each batch is fetched right before its first pull
+    assert [call.args[0] for call in m_metadata.call_args_list] == [
+        [str(repo) for repo in repositories[:2]],
+        [str(repositories[2])],
+    ]
+    assert [call.args[3] for call in m_pull.call_args_list] == [
+        {str(repo): {"name": str(repo)}} for repo in repositories
+    ]
+
+
+def test_fleet_pull__checkpoint(mocker, repositories, tmp_path):
+    checkpoint = tmp_path / "fleet.json"
+    done, failing = repositories[0], repositories[1]
+    checkpoint.write_text(json.dumps({"done": [done.pk], "failed": []}))
+
+    def fake_pull(remote_id, provider, force, metadata):
+        if remote_id == failing.remote_id and provider == failing.provider:
+            raise RuntimeError
+
+    m_pull = mocker.patch("zoo.repos.fleet._pull_repository", side_effect=fake_pull)
+
+    summary = uut.FleetPull(
+        uut.select_repositories(),
+        workers=2,
+        checkpoint=checkpoint,
+        force=True,
+        use_threads=True,
+    ).run()
+
+    assert summary == {"pulled": 4, "failed": 1}
+    assert (done.remote_id, done.provider, True) not in (
+        call.args[:3] for call in m_pull.call_args_list
+    )
+
+    data = json.loads(checkpoint.read_text())
+    assert data["failed"] == [failing.pk]
+    assert set(data["done"]) == {
+        repo.pk for repo in repositories if repo is not failing
+    }
+
+
+def test_fleet_pull__outcomes(mocker, repositories, tmp_path):
+    checkpoint = tmp_path / "fleet.json"
+    failing, unchanged = repositories[0], repositories[1]
+
+    def fake_pull(remote_id, provider, force, metadata):
+        if remote_id == failing.remote_id and provider == failing.provider:
+            return PullOutcome.FAILED.value
+        if remote_id == unchanged.remote_id and provider == unchanged.provider:
+            return PullOutcome.UNCHANGED.value
+        return PullOutcome.PULLED.value
+
+    mocker.patch("zoo.repos.fleet._pull_repository", side_effect=fake_pull)
+
+    summary = uut.FleetPull(
+        uut.select_repositories(), workers=2, checkpoint=checkpoint, use_threads=True
+    ).run()
+
+    # pulls that handle their errors themselves are retried too
+    assert summary == {"pulled": 4, "unchanged": 1, "failed": 1}
+    data = json.loads(checkpoint.read_text())
+    assert data["failed"] == [failing.pk]
+    assert failing.pk not in data["done"]
+
+
+def test_parse_concurrency():
+    assert parse_concurrency("github=2") == ("github", 2)
+
+    for item in ["github", "github=abc", "github=0", "github=-1"]:
+        with pytest.raises(CommandError):
+            parse_concurrency(item)
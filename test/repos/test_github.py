@@ -1,3 +1,12 @@
+import io
+
+import arrow
+import fakeredis
+import pytest
+import requests
+from github.GithubException import GithubException, UnknownObjectException
+
+from zoo.base.http_cache import RedisCacheStorage
 from zoo.repos import github as uut
 
 
@@ -149,3 +158,285 @@ def test_github_create_merge_request(mocker):
         base="master",
         body="Description\n\n---\n\n*via The Zoo*",
     )
+
+
+def test_github_get_head_sha(mocker):
+    m_get_branch = mocker.Mock(return_value=mocker.Mock(commit=mocker.Mock(sha="4d5e")))
+    m_project = mocker.Mock(default_branch="main", get_branch=m_get_branch)
+    m_get_project = mocker.patch("zoo.repos.github.get_project", return_value=m_project)
+
+    assert uut.get_head_sha(111) == "4d5e"
+
+    m_get_project.assert_called_once_with(111)
+    m_get_branch.assert_called_once_with("main")
+
+
+@pytest.mark.parametrize(
+    ("error", "is_raised"),
+    [
+        (UnknownObjectException(404, {"message": "Branch not found"}, None), False),
+        (GithubException(409, {"message": "Git Repository is empty."}, None), False),
+        (GithubException(403, {"message": "API rate limit exceeded"}, None), True),
+        (GithubException(502, {"message": "Server Error"}, None), True),
+    ],
+)
+def test_github_get_head_sha__error(mocker, error, is_raised):
+    m_project = mocker.Mock(
+        default_branch="main", get_branch=mocker.Mock(side_effect=error)
+    )
+    mocker.patch("zoo.repos.github.get_project", return_value=m_project)
+
+    if is_raised:
+        with pytest.raises(GithubException):
+            uut.get_head_sha(111)
+    else:
+        assert uut.get_head_sha(111) is None
+
+
+GRAPHQL_RESPONSE = {
+    "data": {
+        "r0": {
+            "databaseId": 111,
+            "nameWithOwner": "kiwicom/the-zoo",
+            "description": "A service catalog",
+            "url": "https://github.com/kiwicom/the-zoo",
+            "stargazerCount": 42,
+            "forkCount": 7,
+            "updatedAt": "2019-04-01T10:00:00Z",
+            "defaultBranchRef": {"name": "main"},
+            "refs": {"totalCount": 3},
+            "assignableUsers": {"totalCount": 5},
+            "issues": {"totalCount": 2},
+            "pullRequests": {"totalCount": 1},
+            "languages": {
+                "edges": [
+                    {"size": 300, "node": {"name": "Python"}},
+                    {"size": 100, "node": {"name": "JavaScript"}},
+                ]
+            },
+            "zooFile": {"text": "type: service\n"},
+            "githubDir": None,
+            "rootDir": {
+                "entries": [
+                    {"name": "README", "type": "tree"},
+                    {"name": "README.md", "type": "blob"},
+                ]
+            },
+            "docsDir": {"entries": [{"name": "README.rst", "type": "blob"}]},
+        },
+        "r1": None,
+    },
+    "errors": [{"type": "NOT_FOUND", "path": ["r1"], "message": "Could not resolve"}],
+}
+
+
+def test_github_get_repositories_metadata(mocker):
+    m_post = mocker.patch.object(
+        uut.http.session,
+        "post",
+        return_value=mocker.Mock(**{"json.return_value": GRAPHQL_RESPONSE}),
+    )
+
+    metadata = uut.get_repositories_metadata(["kiwicom/the-zoo", "kiwicom/gone"])
+
+    assert metadata["kiwicom/gone"] is None
+    assert metadata["kiwicom/the-zoo"]["details"] == {
+        "id": 111,
+        "name": "kiwicom/the-zoo",
+        "description": "A service catalog",
+        "avatar": None,
+        "url": "https://github.com/kiwicom/the-zoo",
+        "readme": (
+            "https://api.github.com/repos/kiwicom/the-zoo/contents/README.md?ref=main"
+        ),
+        "stars": 42,
+        "forks": 7,
+        "branch_count": 3,
+        "member_count": 5,
+        "issue_count": 3,
+        "last_activity_at": arrow.get("2019-04-01T10:00:00Z").datetime,
+    }
+    assert metadata["kiwicom/the-zoo"]["languages"] == {
+        "Python": 300,
+        "JavaScript": 100,
+    }
+    assert metadata["kiwicom/the-zoo"]["zoo_file"] == "type: service\n"
+
+    query = m_post.call_args.kwargs["json"]["query"]
+    assert 'r0: repository(owner: "kiwicom", name: "the-zoo")' in query
+    assert 'r1: repository(owner: "kiwicom", name: "gone")' in query
+
+    # cached, including the missing repository
+    assert uut.get_repositories_metadata(["kiwicom/gone", "kiwicom/the-zoo"]) == (
+        metadata
+    )
+    m_post.assert_called_once()
+
+
+def test_github_get_project_details__same_as_metadata(mocker):
+    node = GRAPHQL_RESPONSE["data"]["r0"]
+    m_project = mocker.Mock(
+        id=111,
+        full_name="kiwicom/the-zoo",
+        description="A service catalog",
+        svn_url="https://github.com/kiwicom/the-zoo",
+        stargazers_count=42,
+        forks_count=7,
+        # PyGithub's datetimes are naive UTC
+        updated_at=arrow.get("2019-04-01T10:00:00Z").naive,
+        **{
+            "get_readme.return_value.url": (
+                "https://api.github.com/repos/kiwicom/the-zoo/contents/README.md"
+                "?ref=main"
+            ),
+            "get_branches.return_value.totalCount": 3,
+            "get_assignees.return_value.totalCount": 5,
+            "get_issues.return_value.totalCount": 3,
+        },
+    )
+    mocker.patch.object(uut, "get_project", return_value=m_project)
+
+    assert uut.get_project_details(111) == uut._parse_metadata(node)["details"]
+
+
+@pytest.mark.parametrize(
+    ("directories", "readme"),
+    [
+        ({}, None),
+        ({"docsDir": ["readme.txt"]}, "docs/readme.txt"),
+        ({"rootDir": ["README.md"], "docsDir": ["README.md"]}, "README.md"),
+        ({"githubDir": ["README"], "rootDir": ["README.md"]}, ".github/README"),
+        ({"rootDir": ["READMEs.md", "readme_old.md"]}, None),
+    ],
+)
+def test_github_get_metadata_readme_url(directories, readme):
+    node = {
+        "nameWithOwner": "kiwicom/the-zoo",
+        "defaultBranchRef": {"name": "main"},
+        "githubDir": None,
+        "rootDir": None,
+        "docsDir": None,
+    }
+    for key, names in directories.items():
+        node[key] = {"entries": [{"name": name, "type": "blob"} for name in names]}
+
+    assert uut._get_metadata_readme_url(node) == (
+        readme
+        and f"https://api.github.com/repos/kiwicom/the-zoo/contents/{readme}?ref=main"
+    )
+
+
+def test_github_graphql__error(mocker):
+    errors = [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]
+    mocker.patch.object(
+        uut.http.session,
+        "post",
+        return_value=mocker.Mock(**{"json.return_value": {"errors": errors}}),
+    )
+
+    with pytest.raises(uut.GraphQLError):
+        uut.get_repositories_metadata(["kiwicom/the-zoo"])
+
+    # the failure isn't cached as a missing repository
+    assert "kiwicom/the-zoo" not in uut._metadata_cache
+
+
+def test_github_get_repositories_metadata__batches(mocker):
+    mocker.patch.object(uut, "GRAPHQL_BATCH_SIZE", 1)
+    m_graphql = mocker.patch.object(
+        uut, "graphql", return_value={"r0": GRAPHQL_RESPONSE["data"]["r0"]}
+    )
+
+    metadata = uut.get_repositories_metadata(["kiwicom/a", "kiwicom/b"])
+
+    assert m_graphql.call_count == 2
+    assert list(metadata) == ["kiwicom/a", "kiwicom/b"]
+
+
+def test_github_get_repositories_metadata__cache_bounds(mocker):
+    mocker.patch.object(uut, "GRAPHQL_CACHE_SIZE", 2)
+    m_monotonic = mocker.patch("zoo.repos.github.time.monotonic", return_value=0)
+    mocker.patch.object(
+        uut, "graphql", return_value={"r0": GRAPHQL_RESPONSE["data"]["r0"]}
+    )
+
+    for full_name in ["kiwicom/a", "kiwicom/b", "kiwicom/c"]:
+        uut.get_repositories_metadata([full_name])
+    assert list(uut._metadata_cache) == ["kiwicom/b", "kiwicom/c"]
+
+    m_monotonic.return_value = uut.GRAPHQL_CACHE_TTL
+    uut.get_repositories_metadata(["kiwicom/d"])
+    assert list(uut._metadata_cache) == ["kiwicom/d"]
+
+
+def test_github_cached_metadata(mocker):
+    m_graphql = mocker.patch.object(uut, "graphql")
+    mocker.patch.object(uut, "GRAPHQL_CACHE_TTL", 0)
+    metadata = {"kiwicom/the-zoo": {"zoo_file": None}}
+
+    with uut.cached_metadata(metadata):
+        # served whatever the TTL, as long as the block runs
+        assert uut.get_repositories_metadata(["kiwicom/the-zoo"]) == metadata
+
+    m_graphql.assert_not_called()
+    assert "kiwicom/the-zoo" not in uut._metadata_cache
+
+
+def test_github_get_languages_percent():
+    assert uut.get_languages_percent({"Python": 300, "JavaScript": 100}) == {
+        "Python": 75.0,
+        "JavaScript": 25.0,
+    }
+
+
+def test_github_throttled_connection(mocker):
+    m_limiter = mocker.patch("zoo.base.http.limiter")
+    m_limiter.update_from_response.return_value = None
+    mocker.patch.object(uut.ThrottledConnection, "_session", None)
+    mocker.patch.object(uut.http, "get_cache_storage", return_value=None)
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(b"{}")
+    m_send = mocker.patch("requests.adapters.HTTPAdapter.send", return_value=response)
+
+    connection = uut.ThrottledConnection("api.github.com", retry=None)
+    connection.request("GET", "/repos/kiwicom/the-zoo", None, {})
+    connection.getresponse()
+
+    # one token for every request, whatever calls it
+    m_limiter.acquire.assert_called_once_with("api.github.com")
+    assert m_send.call_args.args[0].url == (
+        "https://api.github.com:443/repos/kiwicom/the-zoo"
+    )
+    assert uut.ThrottledConnection("api.github.com").session is connection.session
+
+
+def test_github_throttled_connection__cache(mocker):
+    mocker.patch("zoo.base.http.limiter", None)
+    mocker.patch.object(uut.ThrottledConnection, "_session", None)
+    mocker.patch.object(
+        uut.http,
+        "get_cache_storage",
+        return_value=RedisCacheStorage(
+            1024, connection=fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+        ),
+    )
+    responses = []
+    for status_code, body in [(200, b'{"id": 111}'), (304, b"")]:
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers["ETag"] = '"v1"'
+        response._content = body
+        responses.append(response)
+    m_send = mocker.patch("requests.adapters.HTTPAdapter.send", side_effect=responses)
+
+    results = []
+    for _ in range(2):
+        connection = uut.ThrottledConnection("api.github.com", retry=None)
+        connection.request("GET", "/repos/kiwicom/the-zoo", None, {})
+        results.append(connection.getresponse())
+
+    # the repeated request is revalidated, the cached body is replayed
+    assert m_send.call_args_list[1].args[0].headers["If-None-Match"] == '"v1"'
+    assert [result.status for result in results] == [200, 200]
+    assert results[1].read() == '{"id": 111}'
@@ -1,3 +1,6 @@
+import pytest
+from gitlab import GitlabGetError
+
 from zoo.repos import gitlab as uut
 
 
@@ -49,3 +52,41 @@ def test_gitlab_create_merge_request(mocker):
             "description": "Description\n\n---\n\n*via The Zoo*",
         }
     )
+
+
+def test_gitlab_get_head_sha(mocker):
+    m_branches_get = mocker.Mock(
+        return_value=mocker.Mock(commit={"id": "1a2b3c"}),
+    )
+    m_project = mocker.Mock(
+        default_branch="main", branches=mocker.Mock(get=m_branches_get)
+    )
+    m_get_project = mocker.patch("zoo.repos.gitlab.get_project", return_value=m_project)
+
+    assert uut.get_head_sha(111) == "1a2b3c"
+
+    m_get_project.assert_called_once_with(111)
+    m_branches_get.assert_called_once_with("main")
+
+
+def test_gitlab_get_head_sha__empty_repository(mocker):
+    m_project = mocker.Mock(default_branch=None)
+    mocker.patch("zoo.repos.gitlab.get_project", return_value=m_project)
+
+    assert uut.get_head_sha(111) is None
+
+
+@pytest.mark.parametrize(("response_code", "is_raised"), [(404, False), (502, True)])
+def test_gitlab_get_head_sha__error(mocker, response_code, is_raised):
+    error = GitlabGetError("error", response_code=response_code)
+    m_project = mocker.Mock(
+        default_branch="main",
+        branches=mocker.Mock(get=mocker.Mock(side_effect=error)),
+    )
+    mocker.patch("zoo.repos.gitlab.get_project", return_value=m_project)
+
+    if is_raised:
+        with pytest.raises(GitlabGetError):
+            uut.get_head_sha(111)
+    else:
+        assert uut.get_head_sha(111) is None
@@ -0,0 +1,221 @@
+import subprocess
+
+import pytest
+
+from zoo.repos import mirrors as uut
+from zoo.repos.exceptions import MissingFilesError
+from zoo.repos.utils import ExtractRule, download_repository, get_scm_module
+
+pytestmark = pytest.mark.django_db
+
+
+def git(path, *args):
+    return subprocess.run(
+        ["git", "-C", str(path), "-c", "user.name=zoo", "-c", "user.email=zoo@zoo"]
+        + list(args),
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def commit(path, files):
+    for name, content in files.items():
+        (path / name).write_text(content)
+    git(path, "add", "--all")
+    git(path, "commit", "--quiet", "--message", "update")
+    return git(path, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def remote(tmp_path):
+    path = tmp_path / "remote"
+    path.mkdir()
+    git(path, "init", "--quiet")
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return uut.GitMirrorCache(tmp_path / "mirrors", max_size=10 * 1024 * 1024)
+
+
+def test_fetch(cache, remote, repository):
+    first_sha = commit(remote, {"readme.md": "Hello world!"})
+
+    assert cache.fetch(repository, remote.as_uri()) == first_sha
+
+    mirror = cache.mirror_path(repository)
+    assert (mirror / "shallow").read_text().strip() == first_sha
+
+    second_sha = commit(remote, {"package.json": "{}"})
+
+    assert cache.fetch(repository, remote.as_uri(), second_sha) == second_sha
+    assert git(mirror, "rev-parse", uut.HEAD_REF) == second_sha
+
+
+def test_fetch__cached(cache, remote, repository, mocker):
+    sha = commit(remote, {"readme.md": "Hello world!"})
+    cache.fetch(repository, remote.as_uri())
+
+    m_git = mocker.spy(cache, "_git")
+    assert cache.fetch(repository, "file:///nonexistent", sha) == sha
+
+    assert "fetch" not in [call.args[1] for call in m_git.call_args_list]
+
+
+def test_fetch__empty_repository(cache, remote, repository):
+    with pytest.raises(MissingFilesError):
+        cache.fetch(repository, remote.as_uri())
+
+    assert not cache.mirror_path(repository).exists()
+
+
+def test_fetch__timeout(cache, remote, repository, mocker):
+    commit(remote, {"readme.md": "Hello world!"})
+    mocker.patch.object(
+        cache, "_git", side_effect=subprocess.TimeoutExpired(["git", "fetch"], 1)
+    )
+
+    with pytest.raises(MissingFilesError):
+        cache.fetch(repository, remote.as_uri())
+
+    assert not cache.mirror_path(repository).exists()
+    with cache.lock(repository):
+        pass
+
+
+def test_archive(cache, remote, repository):
+    sha = commit(remote, {"readme.md": "Hello world!"})
+    cache.fetch(repository, remote.as_uri())
+
+    process = cache.archive(repository, sha, prefix="repo")
+    listing = subprocess.run(
+        ["tar", "-t"], stdin=process.stdout, capture_output=True, text=True
+    ).stdout.split()
+    process.wait()
+
+    assert listing == ["repo/", "repo/readme.md"]
+
+
+def test_evict(tmp_path, remote, repository_factory):
+    cache = uut.GitMirrorCache(tmp_path / "mirrors", max_size=0)
+    commit(remote, {"readme.md": "Hello world!"})
+    old, used, current = [repository_factory() for _ in range(3)]
+
+    for repository in (old, used, current):
+        cache.fetch(repository, remote.as_uri())
+    cache.fetch(used, remote.as_uri())  # becomes the most recently used
+
+    cache.max_size = uut._dir_size(cache.mirror_path(current)) * 5 // 2
+    cache.evict(keep=current)
+
+    assert not cache.mirror_path(old).exists()
+    assert cache.mirror_path(old).with_suffix(".lock").exists()
+    assert cache.mirror_path(used).exists()
+    assert cache.mirror_path(current).exists()
+
+
+def test_evict__stored_sizes(cache, remote, repository, mocker):
+    commit(remote, {"readme.md": "Hello world!"})
+    cache.fetch(repository, remote.as_uri())
+
+    mirror = cache.mirror_path(repository)
+    assert int(mirror.with_suffix(".size").read_text()) == uut._dir_size(mirror)
+
+    m_dir_size = mocker.spy(uut, "_dir_size")
+    cache.max_size = 0
+    cache.evict()
+
+    m_dir_size.assert_not_called()
+    assert not mirror.exists()
+    assert not mirror.with_suffix(".size").exists()
+
+
+def test_evict__locked(cache, remote, repository):
+    commit(remote, {"readme.md": "Hello world!"})
+    cache.fetch(repository, remote.as_uri())
+    cache.max_size = 0
+
+    with cache.lock(repository):
+        cache.evict()
+
+    assert cache.mirror_path(repository).exists()
+
+
+def test_evict__unreadable(cache, remote, repository_factory):
+    commit(remote, {"readme.md": "Hello world!"})
+    broken, evicted = repository_factory(), repository_factory()
+    for repository in (broken, evicted):
+        cache.fetch(repository, remote.as_uri())
+    cache.mirror_path(broken).with_suffix(".size").write_text("?")
+    cache.max_size = 0
+
+    cache.evict()
+
+    assert cache.mirror_path(broken).exists()
+    assert not cache.mirror_path(evicted).exists()
+
+
+def test_download_repository(fake_dir, remote, repository, settings, tmp_path, mocker):
+    settings.FETCH_BACKEND = "git"
+    settings.GIT_MIRROR_ROOT = str(tmp_path / "mirrors")
+    sha = commit(remote, {"readme.md": "Hello world!", "package.json": "{}"})
+
+    scm_module = get_scm_module(repository.provider)
+    mocker.patch.object(scm_module, "get_project", return_value=mocker.sentinel.project)
+    m_get_clone_url = mocker.patch.object(
+        scm_module, "get_clone_url", return_value=remote.as_uri()
+    )
+    mocker.patch.object(scm_module, "get_clone_credentials", return_value=None)
+
+    repo_path = download_repository(
+        repository, fake_dir, sha, manifest=[ExtractRule("*.md")]
+    )
+
+    assert repo_path.name == f"{repository.name}-{sha}"
+    assert [path.name for path in repo_path.iterdir()] == ["readme.md"]
+    assert (repo_path / "readme.md").read_text() == "Hello world!"
+    m_get_clone_url.assert_called_once_with(mocker.sentinel.project)
+
+
+def test_download_repository__evict_error(
+    fake_dir, remote, repository, settings, tmp_path, mocker
+):
+    settings.FETCH_BACKEND = "git"
+    settings.GIT_MIRROR_ROOT = str(tmp_path / "mirrors")
+    commit(remote, {"readme.md": "Hello world!"})
+
+    scm_module = get_scm_module(repository.provider)
+    mocker.patch.object(scm_module, "get_project", return_value=mocker.sentinel.project)
+    mocker.patch.object(scm_module, "get_clone_url", return_value=remote.as_uri())
+    mocker.patch.object(scm_module, "get_clone_credentials", return_value=None)
+    mocker.patch.object(uut.GitMirrorCache, "evict", side_effect=FileNotFoundError)
+
+    repo_path = download_repository(repository, fake_dir)
+
+    assert (repo_path / "readme.md").read_text() == "Hello world!"
+
+
+def test_download_repository__archive_timeout(
+    fake_dir, remote, repository, settings, tmp_path, mocker
+):
+    settings.FETCH_BACKEND = "git"
+    settings.GIT_MIRROR_ROOT = str(tmp_path / "mirrors")
+    settings.GIT_MIRROR_TIMEOUT = 0.1
+    commit(remote, {"readme.md": "Hello world!"})
+
+    scm_module = get_scm_module(repository.provider)
+    mocker.patch.object(scm_module, "get_project", return_value=mocker.sentinel.project)
+    mocker.patch.object(scm_module, "get_clone_url", return_value=remote.as_uri())
+    mocker.patch.object(scm_module, "get_clone_credentials", return_value=None)
+    mocker.patch.object(
+        uut.GitMirrorCache,
+        "archive",
+        side_effect=lambda *args, **kwargs: subprocess.Popen(
+            ["sleep", "10"], stdout=subprocess.PIPE
+        ),
+    )
+
+    with pytest.raises(MissingFilesError):
+        download_repository(repository, fake_dir)
@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from zoo.auditing.check_discovery import Kind, Severity
+from zoo.repos import scheduling as uut
+from zoo.repos import tasks
+
+pytestmark = pytest.mark.django_db
+
+NOW = timezone.now()
+
+
+@pytest.fixture
+def hot(repository_factory):
+    return repository_factory(
+        last_activity_at=NOW - timedelta(hours=1), pulled_at=NOW - timedelta(minutes=20)
+    )
+
+
+@pytest.fixture
+def cold(repository_factory):
+    return repository_factory(
+        last_activity_at=NOW - timedelta(days=365), pulled_at=NOW - timedelta(hours=1)
+    )
+
+
+@pytest.fixture
+def new(repository_factory):
+    return repository_factory(last_activity_at=None, pulled_at=None)
+
+
+def test_get_interval(hot, cold, new):
+    def interval(repository, issues_score=0):
+        return uut.get_interval(uut.get_score(repository, issues_score, NOW))
+
+    assert interval(hot) == timedelta(minutes=15)
+    assert interval(cold) == timedelta(days=1)
+    assert interval(cold, issues_score=2) == timedelta(hours=6)
+    assert interval(new) == timedelta(hours=1)
+
+
+def test_get_interval__unchanged(repository_factory):
+    # pulls of unchanged repositories leave pulled_at as it is
+    unchanged = repository_factory(
+        last_activity_at=NOW - timedelta(days=365),
+        pulled_at=NOW - timedelta(days=30),
+        pull_scheduled_at=NOW - timedelta(hours=2),
+    )
+
+    assert uut.get_interval(uut.get_score(unchanged, 0, NOW)) == timedelta(days=1)
+
+
+def test_get_issues_scores(repository, issue_factory, mocker):
+    kind = Kind(
+        namespace="check",
+        id="critical",
+        severity=Severity.CRITICAL,
+        category="Check",
+        title="Critical",
+    )
+    mocker.patch.dict("zoo.repos.scheduling.KINDS", {kind.key: kind})
+    issue_factory(repository=repository, kind_key=kind.key, status="new")
+    issue_factory(repository=repository, kind_key=kind.key, status="fixed")
+    issue_factory(repository=repository, kind_key="removed:check", status="new")
+
+    assert uut.get_issues_scores() == {repository.pk: 2}
+
+
+def test_plan(hot, cold, new):
+    planned = dict(uut.PullSchedule(budget=1000, now=NOW).plan())
+
+    assert set(planned) == {hot, new}
+    assert planned[hot] == max(
+        NOW - timedelta(minutes=20) + timedelta(minutes=15), NOW + uut._spread(hot)
+    )
+    assert NOW <= planned[new] < NOW + uut.SCHEDULE_PERIOD
+
+
+def test_plan__budget(hot, cold, new):
+    # four pulls an hour leave one for the period, the hot repo scores more
+    assert uut.PullSchedule(budget=4, now=NOW).plan() == [
+        (hot, max(NOW - timedelta(minutes=5), NOW + uut._spread(hot)))
+    ]
+
+
+def test_plan__scheduled(hot):
+    hot.pull_scheduled_at = NOW
+    hot.save()
+
+    assert uut.PullSchedule(budget=1000, now=NOW).plan() == []
+
+
+def test_schedule_pulls(hot, cold, mocker):
+    mocker.patch("zoo.repos.tasks.timezone.now", return_value=NOW)
+    m_apply_async = mocker.patch.object(tasks.pull, "apply_async")
+
+    tasks.schedule_pulls()
+
+    m_apply_async.assert_called_once()
+    assert m_apply_async.call_args.kwargs["args"] == (hot.remote_id, hot.provider)
+    hot.refresh_from_db()
+    cold.refresh_from_db()
+    assert hot.pull_scheduled_at is not None
+    assert cold.pull_scheduled_at is None
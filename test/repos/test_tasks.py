@@ -4,13 +4,42 @@ import pytest
 from zoo.analytics.models import Dependency, DependencyType, DependencyUsage
 from zoo.auditing.models import Issue
 from zoo.repos import tasks as uut
-from zoo.repos.models import Endpoint
-from zoo.repos.utils import get_scm_module
+from zoo.repos.exceptions import MissingFilesError
+from zoo.repos.models import Endpoint, Repository
+from zoo.repos.utils import (
+    EXTRACT_ALL,
+    OPENAPI_MAX_FILE_SIZE,
+    ExtractRule,
+    get_scm_module,
+)
 
 from .. import dummy
 
 pytestmark = pytest.mark.django_db
 
+GRAPHQL_NODE = {
+    "databaseId": 1,
+    "nameWithOwner": "kiwicom/the-zoo",
+    "description": None,
+    "url": "https://github.com/kiwicom/the-zoo",
+    "stargazerCount": 0,
+    "forkCount": 0,
+    "updatedAt": "2019-01-01T00:00:00Z",
+    "defaultBranchRef": {"name": "master"},
+    "refs": {"totalCount": 1},
+    "assignableUsers": {"totalCount": 1},
+    "issues": {"totalCount": 0},
+    "pullRequests": {"totalCount": 0},
+    "zooFile": None,
+    "githubDir": None,
+    "rootDir": None,
+    "docsDir": None,
+}
+
+
+def languages(python_value):
+    return {"edges": [{"size": python_value, "node": {"name": "Python"}}]}
+
 
 @pytest.mark.parametrize(
     ("repository__provider", "languages_method", "python_value"),
@@ -27,8 +56,15 @@ def test_pull(mocker, repository, languages_method, python_value, repo_archive):
     m_get_project = mocker.patch.object(
         scm_module, "get_project", return_value=m_project
     )
-    m_download_archive = mocker.patch.object(
-        scm_module, "download_archive", return_value=repo_archive
+    m_stream_archive = mocker.patch.object(
+        scm_module,
+        "stream_archive",
+        side_effect=lambda project, sha: open(repo_archive.name, "rb"),
+    )
+    mocker.patch.object(scm_module, "get_head_sha", return_value="idkfa")
+    m_graphql = mocker.patch(
+        "zoo.repos.github.graphql",
+        return_value={"r0": dict(GRAPHQL_NODE, languages=languages(python_value))},
     )
 
     def redis(**kwargs):
@@ -36,17 +72,29 @@ def test_pull(mocker, repository, languages_method, python_value, repo_archive):
 
     mocker.patch("zoo.base.redis.get_connection", redis)
 
+    repository.exclusions = "openapi.json"
+    repository.save()
+
     # test
-    uut.pull(repository.remote_id, repository.provider)
+    outcome = uut.pull(repository.remote_id, repository.provider)
 
     # assert mocks
-    getattr(m_project, languages_method).assert_called_once()
+    if repository.provider == "github":
+        m_graphql.assert_called_once()
+        assert m_get_project.call_args_list == [mocker.call(repository.remote_id)]
+    else:
+        getattr(m_project, languages_method).assert_called_once()
+        assert m_get_project.call_args_list == [
+            mocker.call(repository.remote_id),
+            mocker.call(repository.remote_id),
+        ]
+    m_stream_archive.assert_called_once_with(m_project, "idkfa")
 
-    assert m_get_project.call_args_list == [
-        mocker.call(repository.remote_id),
-        mocker.call(repository.remote_id),
-    ]
-    m_download_archive.assert_called_once_with(m_project, mocker.ANY, None)
+    assert outcome == uut.PullOutcome.PULLED.value
+    repository.refresh_from_db()
+    assert repository.pulled_sha == "idkfa"
+    assert repository.pulled_version == uut.get_pull_version(dummy.CHECKS)
+    assert repository.pulled_at is not None
 
     # assert checks / issues
     assert Issue.objects.count() == 2
@@ -90,10 +138,10 @@ def test_pull(mocker, repository, languages_method, python_value, repo_archive):
     assert dep_usage_3.version is None
 
     # assert openapi
-    assert Endpoint.objects.count() == 0  # the test folder is excluded by default
+    assert Endpoint.objects.count() == 0  # excluded on the repository
 
-    mocker.patch("zoo.repos.utils.OPENAPI_SCAN_EXCLUDE", [])
-    uut.pull(repository.remote_id, repository.provider)
+    Repository.objects.filter(pk=repository.pk).update(exclusions="")
+    uut.pull(repository.remote_id, repository.provider, force=True)
 
     assert Endpoint.objects.count() == 3
     assert Endpoint.objects.filter(path="/pets").count() == 2
@@ -105,3 +153,121 @@ def test_pull(mocker, repository, languages_method, python_value, repo_archive):
     assert endpoint.method == "get"
     assert endpoint.operation == "showPetById"
     assert endpoint.summary == "Info for a specific pet"
+
+
+@pytest.mark.parametrize(
+    ("pulled_sha", "pulled_version", "force", "is_skipped"),
+    [
+        ("idkfa", "current", False, True),
+        ("idkfa", "current", True, False),
+        ("iddqd", "current", False, False),
+        ("idkfa", "outdated", False, False),
+        (None, None, False, False),
+    ],
+)
+def test_pull__unchanged(
+    mocker, repository, pulled_sha, pulled_version, force, is_skipped
+):
+    mocker.patch("zoo.repos.tasks.get_pull_version", return_value="current")
+    mocker.patch.object(
+        get_scm_module(repository.provider), "get_head_sha", return_value="idkfa"
+    )
+    m_download_repository = mocker.patch(
+        "zoo.repos.tasks.download_repository", side_effect=MissingFilesError
+    )
+    repository.pulled_sha = pulled_sha
+    repository.pulled_version = pulled_version
+    repository.save()
+
+    outcome = uut.pull(repository.remote_id, repository.provider, force=force)
+
+    assert m_download_repository.called is not is_skipped
+    # the download fails when it's not skipped
+    assert outcome == (
+        uut.PullOutcome.UNCHANGED.value if is_skipped else uut.PullOutcome.FAILED.value
+    )
+
+
+def test_get_pull_version(check_factory):
+    checks = [check_factory("check:found", True)]
+
+    assert uut.get_pull_version(checks) == uut.get_pull_version(list(checks))
+    assert uut.get_pull_version(checks) != uut.get_pull_version([])
+
+
+def test_get_extraction_manifest(mocker, check_factory):
+    check = check_factory("check:found", True)
+    mocker.patch.dict(
+        "zoo.repos.tasks.CHECK_FILES", {check.__module__: ["Dockerfile*", "setup.py"]}
+    )
+
+    manifest = uut.get_extraction_manifest([check])
+
+    assert ExtractRule("setup.py") in manifest
+    assert ExtractRule("package.json") in manifest
+    assert ExtractRule("*.yaml", OPENAPI_MAX_FILE_SIZE) in manifest
+    assert EXTRACT_ALL not in manifest
+
+
+def test_get_extraction_manifest__undeclared_files(mocker, check_factory):
+    check = check_factory("check:found", True)
+    mocker.patch.dict("zoo.repos.tasks.CHECK_FILES", {check.__module__: None})
+
+    assert uut.get_extraction_manifest([check]) == [EXTRACT_ALL]
+
+
+def test_index_api(mocker, repository, django_assert_num_queries):
+    Endpoint.objects.bulk_create(
+        [
+            Endpoint(repository=repository, path="/pets", method="get", summary="List"),
+            Endpoint(repository=repository, path="/pets", method="post", summary="Old"),
+            Endpoint(repository=repository, path="/gone", method="get"),
+        ]
+    )
+    spec = {
+        "paths": {
+            "/pets": {
+                "get": {"summary": "List"},
+                "post": {"summary": "Create", "operationId": "createPet"},
+                "parameters": [],
+            },
+            "/pets/{petId}": {"get": {"operationId": "showPetById"}},
+        }
+    }
+    mocker.patch("zoo.repos.tasks.scan_openapi", return_value=([spec], True))
+
+    # savepoint, select, insert, update, delete and release
+    with django_assert_num_queries(6):
+        counts = uut.index_api(repository, mocker.sentinel.repo_path)
+
+    assert counts == {"created": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+    assert sorted(
+        repository.endpoints.values_list("path", "method", "summary", "operation")
+    ) == [
+        ("/pets", "get", "List", None),
+        ("/pets", "post", "Create", "createPet"),
+        ("/pets/{petId}", "get", None, "showPetById"),
+    ]
+
+
+def test_index_api__incomplete_scan(mocker, repository):
+    Endpoint.objects.create(repository=repository, path="/pets", method="get")
+    Endpoint.objects.create(repository=repository, path="/owners", method="get")
+    spec = {"paths": {"/pets": {"get": {"summary": "List"}}}}
+    m_scan_openapi = mocker.patch(
+        "zoo.repos.tasks.scan_openapi", return_value=([spec], False)
+    )
+
+    counts = uut.index_api(
+        repository, mocker.sentinel.repo_path, oversized=["api/openapi.yml"]
+    )
+
+    # the endpoints of the specs left out are kept
+    assert counts == {"created": 0, "updated": 1, "deleted": 0, "unchanged": 0}
+    assert sorted(repository.endpoints.values_list("path", flat=True)) == [
+        "/owners",
+        "/pets",
+    ]
+    m_scan_openapi.assert_called_once_with(
+        repository, mocker.sentinel.repo_path, None, ["api/openapi.yml"]
+    )
@@ -1,4 +1,6 @@
+import json
 import tempfile
+import time
 from pathlib import Path
 
 import fakeredis
@@ -6,9 +8,12 @@ import pytest
 
 import zoo.repos.utils as uut
 from zoo.repos.exceptions import MissingFilesError, RepositoryNotFoundError
+from zoo.repos.file_index import FileIndex
 from zoo.repos.models import Provider
 from zoo.repos.utils import get_scm_module
 
+from .. import dummy
+
 pytestmark = pytest.mark.django_db
 
 
@@ -106,7 +111,6 @@ def test_openapi_definition(fake_path, repo_archive, repository, mocker):
 
     fake_path.mkdir(parents=True, exist_ok=True)
     mocker.patch("tempfile.mkdtemp", return_value=str(fake_path))
-    mocker.patch("zoo.repos.utils.OPENAPI_SCAN_EXCLUDE", [])
 
     def redis(**kwargs):
         return fakeredis.FakeStrictRedis(**kwargs)
@@ -124,3 +128,180 @@ def test_openapi_definition(fake_path, repo_archive, repository, mocker):
     assert specs[0]["info"]["title"] == "Petstore"
     assert specs[0]["info"]["version"] == "1.0.0"
     assert not fake_path.exists()  # cleaned up
+
+
+@pytest.mark.parametrize("repository__provider", [item.value for item in Provider])
+def test_download_repository__manifest(fake_dir, repo_archive, repository, mocker):
+    scm_module = get_scm_module(repository.provider)
+    mocker.patch.object(scm_module, "get_project", return_value=mocker.sentinel.project)
+    m_stream_archive = mocker.patch.object(
+        scm_module, "stream_archive", return_value=repo_archive
+    )
+    m_log = mocker.patch.object(uut, "log")
+
+    manifest = [uut.ExtractRule("*.txt"), uut.ExtractRule("*.json", max_size=100)]
+    oversized = []
+    repo_path = uut.download_repository(
+        repository, fake_dir, "iddqd", manifest, oversized=oversized
+    )
+
+    assert {f.name for f in repo_path.iterdir()} == {"requirements.txt", "package.json"}
+    assert oversized == ["openapi.json"]
+    assert (repo_path / "requirements.txt").read_text() == "django==2.3.4"
+
+    m_stream_archive.assert_called_once_with(mocker.sentinel.project, "iddqd")
+    m_log.info.assert_called_once_with(
+        "repos.utils.download.extracted",
+        repo=repository,
+        extracted=2,
+        extracted_bytes=mocker.ANY,
+        skipped=2,
+        skipped_bytes=mocker.ANY,
+    )
+
+
+@pytest.mark.parametrize("repository__provider", [item.value for item in Provider])
+def test_download_repository__manifest_missing_files(fake_dir, repository, mocker):
+    scm_module = get_scm_module(repository.provider)
+    mocker.patch.object(scm_module, "get_project", return_value=mocker.sentinel.project)
+    mocker.patch.object(scm_module, "stream_archive", side_effect=MissingFilesError)
+
+    with pytest.raises(uut.MissingFilesError):
+        uut.download_repository(repository, fake_dir, manifest=[uut.EXTRACT_ALL])
+
+
+@pytest.mark.parametrize(
+    ("path", "size", "expected"),
+    [
+        ("Dockerfile", 10, True),
+        ("docker/Dockerfile.prod", 10, True),
+        ("api/openapi.yml", 10, True),
+        ("api/openapi.yml", 1000, False),
+        ("node_modules/lib/index.js", 10, False),
+    ],
+)
+def test_is_extracted(path, size, expected):
+    manifest = [uut.ExtractRule("Dockerfile*"), uut.ExtractRule("*.yml", 100)]
+
+    assert uut.is_extracted(manifest, path, size) is expected
+
+
+@pytest.mark.parametrize(
+    ("content", "expected"),
+    [
+        ('{"openapi": "3.0.0", "info": {}}', True),
+        ('{\n  "info": {"title": "Petstore"},\n  "swagger": "2.0"\n}', True),
+        ("openapi: 3.0.0\ninfo:\n  title: Petstore\n", True),
+        ("# API\n'swagger': '2.0'\n", True),
+        ('{"name": "zoo", "dependencies": {}}', False),
+        ("stages:\n  - test\nopenapi-lint:\n  script: lint\n", False),
+        (" " * uut.OPENAPI_SNIFF_SIZE + "openapi: 3.0.0", False),
+    ],
+)
+def test_sniff_openapi(tmp_path, content, expected):
+    (tmp_path / "api.yml").write_text(content)
+
+    file = FileIndex.build(tmp_path).get("api.yml")
+
+    assert uut._sniff_openapi(file) is expected
+
+
+@pytest.mark.parametrize(
+    ("content", "expected"),
+    [
+        ('{"components": {}, "info": {}, "openapi": "3.0.0", "paths": {}}', True),
+        (
+            '{"paths": {}, "x": "' + " " * uut.OPENAPI_SNIFF_SIZE + '", "swagger": 2}',
+            True,
+        ),
+        (
+            '{"name": "zoo", "x": "'
+            + " " * uut.OPENAPI_SNIFF_SIZE
+            + '", "openapi": 3}',
+            False,
+        ),
+        ('{"paths": {}, "x": "' + " " * uut.OPENAPI_SNIFF_SIZE + '"}', False),
+    ],
+)
+def test_sniff_openapi__json(tmp_path, content, expected):
+    (tmp_path / "api.json").write_text(content)
+
+    file = FileIndex.build(tmp_path).get("api.json")
+
+    assert uut._sniff_openapi(file) is expected
+
+
+def test_scan_openapi__sorted_keys(fake_path, repository, mocker):
+    fake_path.mkdir(parents=True, exist_ok=True)
+    schemas = {
+        f"Pet{i}": {"type": "string", "description": "x" * 100} for i in range(50)
+    }
+    spec = {**dummy.openapi_spec, "components": {"schemas": schemas}}
+    content = json.dumps(spec, sort_keys=True)
+    assert content.index('"openapi"') > uut.OPENAPI_SNIFF_SIZE
+    (fake_path / "openapi.json").write_text(content)
+
+    redis_conn = fakeredis.FakeStrictRedis(decode_responses=True)
+    mocker.patch("zoo.base.redis.get_connection", return_value=redis_conn)
+
+    assert uut.scan_openapi(repository, fake_path) == ([spec], True)
+
+
+def test_openapi_definition__cache(fake_path, repository, mocker):
+    fake_path.mkdir(parents=True, exist_ok=True)
+    (fake_path / "openapi.json").write_text(json.dumps(dummy.openapi_spec))
+    (fake_path / "package.json").write_text(dummy.repo_files["package.json"])
+    (fake_path / "broken.yaml").write_text("openapi: [")
+
+    redis_conn = fakeredis.FakeStrictRedis(decode_responses=True)
+    mocker.patch("zoo.base.redis.get_connection", return_value=redis_conn)
+    m_parse_files = mocker.spy(uut, "_parse_files")
+
+    specs = uut.openapi_definition(repository, repo_path=fake_path)
+
+    assert [spec["info"]["title"] for spec in specs] == ["Petstore"]
+    assert {path.name for path in m_parse_files.call_args.args[0]} == {
+        "openapi.json",
+        "broken.yaml",
+    }
+    assert sorted(redis_conn.mget(redis_conn.keys())) == sorted(
+        [json.dumps(dummy.openapi_spec), uut.OPENAPI_INVALID_MARKER]
+    )
+
+    m_parse_files.reset_mock()
+    assert uut.openapi_definition(repository, repo_path=fake_path) == specs
+    m_parse_files.assert_called_once_with([], fake_path)
+
+
+def test_openapi_definition__timeout(fake_path, repository, mocker, settings):
+    settings.OPENAPI_PARSE_TIMEOUT = 0.1
+    fake_path.mkdir(parents=True, exist_ok=True)
+    (fake_path / "openapi.yml").write_text("openapi: 3.0.0")
+
+    redis_conn = fakeredis.FakeStrictRedis(decode_responses=True)
+    mocker.patch("zoo.base.redis.get_connection", return_value=redis_conn)
+    mocker.patch.object(uut, "_parse_file", side_effect=lambda *_: time.sleep(60))
+    started_at = time.monotonic()
+
+    assert uut.openapi_definition(repository, repo_path=fake_path) == []
+    assert time.monotonic() - started_at < 10  # the stuck parser is killed
+    assert redis_conn.keys() == []  # a timeout may be transient, it isn't cached
+    assert uut.scan_openapi(repository, fake_path) == ([], False)
+
+
+def test_scan_openapi__oversized(fake_path, repository, mocker):
+    fake_path.mkdir(parents=True, exist_ok=True)
+    redis_conn = fakeredis.FakeStrictRedis(decode_responses=True)
+    mocker.patch("zoo.base.redis.get_connection", return_value=redis_conn)
+
+    assert uut.scan_openapi(repository, fake_path, oversized=["big.bin"]) == (
+        [],
+        True,
+    )
+    assert uut.scan_openapi(
+        repository, fake_path, oversized=["test/fixtures/openapi.json"]
+    ) == ([], True)
+    assert uut.scan_openapi(repository, fake_path, oversized=["api/openapi.yml"]) == (
+        [],
+        False,
+    )
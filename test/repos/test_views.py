@@ -0,0 +1,288 @@
+import hashlib
+import hmac
+import json
+from datetime import datetime, timezone
+
+import fakeredis
+import pytest
+import requests
+from django.urls import reverse
+
+from zoo.repos import github, tasks
+from zoo.repos.exceptions import RepositoryNotFoundError
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def fake_redis(mocker):
+    server = fakeredis.FakeServer()
+    mocker.patch(
+        "zoo.base.redis.get_connection",
+        lambda **kwargs: fakeredis.FakeStrictRedis(server=server, **kwargs),
+    )
+
+
+@pytest.fixture
+def m_pull(fake_redis, mocker):
+    return mocker.patch.object(tasks.pull, "apply_async")
+
+
+@pytest.fixture
+def m_get_project_details(fake_redis, mocker):
+    m_scm_module = mocker.patch("zoo.repos.details.get_scm_module").return_value
+    m_scm_module.get_project_details.return_value = {
+        "id": 42,
+        "stars": 3,
+        "last_activity_at": datetime(2020, 1, 1, tzinfo=timezone.utc),
+    }
+    return m_scm_module.get_project_details
+
+
+def test_repo_details(client, user, m_get_project_details):
+    client.force_login(user)
+    url = reverse("repo_details", args=("gitlab", 42))
+
+    first = client.get(url)
+    second = client.get(url)
+
+    assert (
+        first.json()
+        == second.json()
+        == {
+            "id": 42,
+            "stars": 3,
+            "last_activity_at": "2020-01-01T00:00:00Z",
+        }
+    )
+    m_get_project_details.assert_called_once_with(42)
+
+
+def test_repo_details__stale(client, user, mocker, m_get_project_details):
+    client.force_login(user)
+    m_delay = mocker.patch.object(tasks.refresh_repo_details, "delay")
+    m_time = mocker.patch("zoo.repos.details.time.time", return_value=1000)
+    url = reverse("repo_details", args=("gitlab", 42))
+    client.get(url)
+
+    m_time.return_value = 1000 + 10 * 60
+    first = client.get(url)
+    second = client.get(url)
+
+    assert first.json()["stars"] == second.json()["stars"] == 3
+    m_get_project_details.assert_called_once()
+    m_delay.assert_called_once_with("gitlab", 42)
+
+    m_get_project_details.return_value = {"id": 42, "stars": 4}
+    tasks.refresh_repo_details("gitlab", 42)
+    assert client.get(url).json()["stars"] == 4
+
+
+def test_repo_details__not_found(client, user, m_get_project_details):
+    client.force_login(user)
+    m_get_project_details.side_effect = RepositoryNotFoundError
+
+    response = client.get(reverse("repo_details", args=("gitlab", 42)))
+
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("repository__provider", ["github"])
+def test_repo_details__graphql_error(
+    client, user, mocker, repository, m_get_project_details
+):
+    client.force_login(user)
+    mocker.patch(
+        "zoo.repos.github.get_repositories_metadata",
+        side_effect=github.GraphQLError([{"type": "RATE_LIMITED"}]),
+    )
+
+    response = client.get(
+        reverse("repo_details", args=("github", repository.remote_id))
+    )
+
+    assert response.json()["stars"] == 3
+    m_get_project_details.assert_called_once_with(repository.remote_id)
+
+
+def test_repo_details__refresh_error(client, user, mocker, m_get_project_details):
+    client.force_login(user)
+    url = reverse("repo_details", args=("gitlab", 42))
+    client.get(url)
+
+    m_get_project_details.side_effect = requests.ConnectionError("down")
+    tasks.refresh_repo_details("gitlab", 42)
+
+    assert client.get(url).json()["stars"] == 3
+
+
+@pytest.fixture
+def github_webhook(client, settings):
+    settings.GITHUB_WEBHOOK_SECRET = "s3cr3t"
+
+    def post(event, payload, secret="s3cr3t"):
+        body = json.dumps(payload).encode()
+        signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return client.post(
+            reverse("github_webhook"),
+            body,
+            content_type="application/json",
+            HTTP_X_GITHUB_EVENT=event,
+            HTTP_X_HUB_SIGNATURE_256=f"sha256={signature}",
+        )
+
+    return post
+
+
+def github_push(repository, ref="refs/heads/main"):
+    return {
+        "ref": ref,
+        "repository": {"id": repository.remote_id, "default_branch": "main"},
+    }
+
+
+def test_github_webhook(github_webhook, m_pull, repository_factory):
+    repository = repository_factory(provider="github", last_activity_at=None)
+
+    first = github_webhook("push", github_push(repository))
+    second = github_webhook("push", github_push(repository))
+
+    assert first.status_code == second.status_code == 202
+    assert first.json() == {"status": "queued"}
+    assert second.json() == {"status": "debounced"}
+    m_pull.assert_called_once_with(
+        args=(repository.remote_id, "github"), countdown=60, expires=3660
+    )
+    repository.refresh_from_db()
+    assert repository.last_activity_at is not None
+
+
+@pytest.mark.parametrize(
+    ("event", "ref", "secret", "status_code"),
+    [
+        ("push", "refs/heads/feature", "s3cr3t", 200),
+        ("issues", "refs/heads/main", "s3cr3t", 200),
+        ("push", "refs/heads/main", "wrong", 403),
+    ],
+)
+def test_github_webhook__ignored(
+    github_webhook, m_pull, repository_factory, event, ref, secret, status_code
+):
+    repository = repository_factory(provider="github")
+
+    response = github_webhook(event, github_push(repository, ref), secret=secret)
+
+    assert response.status_code == status_code
+    m_pull.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ("base", "merged", "is_queued"),
+    [("main", True, True), ("feature", True, False), ("main", False, False)],
+)
+def test_github_webhook__pull_request(
+    github_webhook, m_pull, repository_factory, base, merged, is_queued
+):
+    repository = repository_factory(provider="github")
+    payload = {
+        "action": "closed",
+        "pull_request": {"merged": merged, "base": {"ref": base}},
+        "repository": {"id": repository.remote_id, "default_branch": "main"},
+    }
+
+    response = github_webhook("pull_request", payload)
+
+    assert response.status_code == (202 if is_queued else 200)
+    assert m_pull.called is is_queued
+
+
+def test_github_webhook__unknown_repository(github_webhook, m_pull, repository):
+    payload = github_push(repository)
+    payload["repository"]["id"] = 0
+
+    assert github_webhook("push", payload).status_code == 404
+
+
+@pytest.mark.parametrize(
+    ("event", "payload"),
+    [
+        ("push", {"ref": "refs/heads/main"}),
+        ("push", {"ref": "refs/heads/main", "repository": {"id": 1}}),
+        ("pull_request", {"action": "closed"}),
+        ("push", ["refs/heads/main"]),
+    ],
+)
+def test_github_webhook__invalid_payload(github_webhook, m_pull, event, payload):
+    response = github_webhook(event, payload)
+
+    assert response.status_code == 400
+    assert response.json() == {"status": "invalid payload"}
+    m_pull.assert_not_called()
+
+
+def test_github_webhook__ping(github_webhook, m_pull):
+    response = github_webhook("ping", {"zen": "Keep it logically awesome."})
+
+    assert response.status_code == 200
+    m_pull.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ("token", "action", "target", "status_code", "is_queued"),
+    [
+        ("s3cr3t", "merge", "main", 202, True),
+        ("s3cr3t", "merge", "feature", 200, False),
+        ("s3cr3t", "open", "main", 200, False),
+        ("wrong", "merge", "main", 403, False),
+    ],
+)
+def test_gitlab_webhook(
+    client,
+    settings,
+    m_pull,
+    repository_factory,
+    token,
+    action,
+    target,
+    status_code,
+    is_queued,
+):
+    settings.GITLAB_WEBHOOK_SECRET = "s3cr3t"
+    repository = repository_factory(provider="gitlab")
+
+    response = client.post(
+        reverse("gitlab_webhook"),
+        {
+            "project": {"id": repository.remote_id, "default_branch": "main"},
+            "object_attributes": {"action": action, "target_branch": target},
+        },
+        content_type="application/json",
+        HTTP_X_GITLAB_EVENT="Merge Request Hook",
+        HTTP_X_GITLAB_TOKEN=token,
+    )
+
+    assert response.status_code == status_code
+    assert m_pull.called is is_queued
+
+
+@pytest.mark.parametrize(
+    ("event", "payload"),
+    [
+        ("Push Hook", {"ref": "refs/heads/main"}),
+        ("Merge Request Hook", {"project": {"id": 1}}),
+        ("Merge Request Hook", {"object_attributes": {"action": "merge"}}),
+    ],
+)
+def test_gitlab_webhook__invalid_payload(client, settings, m_pull, event, payload):
+    settings.GITLAB_WEBHOOK_SECRET = "s3cr3t"
+
+    response = client.post(
+        reverse("gitlab_webhook"),
+        payload,
+        content_type="application/json",
+        HTTP_X_GITLAB_EVENT=event,
+        HTTP_X_GITLAB_TOKEN="s3cr3t",
+    )
+
+    assert response.status_code == 400
+    m_pull.assert_not_called()
@@ -90,5 +90,23 @@ links:
 """
     service_1 = Service.objects.get(pk=1)
     content = uut.generate(service_1)
-    assert uut.validate(content)
+    assert uut.validate(uut.parse(content))
     assert expected.strip() == content.strip()
+
+
+def test_validate():
+    assert uut.validate({"type": "service", "name": "martinez", "owner": "jasckson"})
+    assert not uut.validate({"type": "service", "name": "martinez"})
+    assert not uut.validate(None)
+    assert uut.get_validator() is uut.get_validator()
+
+
+def test_get_blob_sha():
+    # git hash-object of a file containing "type: service\n"
+    assert uut.get_blob_sha("type: service\n") == (
+        "32eb7971cc1df3afd42a4586ab25ad413accc049"
+    )
+    # providers' REST APIs return the content undecoded
+    assert uut.get_blob_sha(b"type: service\n") == (
+        "32eb7971cc1df3afd42a4586ab25ad413accc049"
+    )
@@ -0,0 +1,145 @@
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import structlog
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from ..base import http, redis
+
+log = structlog.get_logger()
+
+# how often a worker waiting for another one's fetch checks the cache
+SINGLEFLIGHT_POLL_INTERVAL = 0.1
+
+
+def normalize_name(name):
+    """Canonical project name, as in PEP 503."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _parse_metadata(data):
+    info = data["info"]
+    files = data.get("releases", {}).get(info["version"]) or data.get("urls") or []
+    return {
+        "classifiers": info.get("classifiers") or [],
+        "version": info["version"],
+        "upload_time": files[0]["upload_time"] if files else None,
+        "license": info.get("license"),
+    }
+
+
+class PyPIMetadataCache:
+    """The parts of PyPI project metadata we use, shared by all workers.
+
+    Only the classifiers, latest version, its upload time and the license are
+    kept, for ``ttl`` seconds, in Redis. Projects missing from the index are
+    remembered as ``None``. A worker missing a project takes a lock for it, the
+    others wait for its result instead of asking the index too, for up to
+    ``lock_timeout`` seconds. Without Redis the index is asked directly.
+    """
+
+    prefix = "zoo:pypi"
+
+    def __init__(
+        self, url=None, ttl=None, workers=None, lock_timeout=30, connection=None
+    ):
+        self.url = (url or settings.PYPI_URL).rstrip("/")
+        self.ttl = ttl if ttl is not None else settings.PYPI_CACHE_TTL
+        self.workers = workers or settings.PYPI_FETCH_WORKERS
+        self.lock_timeout = lock_timeout
+        self._connection = connection
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = redis.get_connection()
+        return self._connection
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def fetch(self, name):
+        """Ask the index, ``None`` if it doesn't know the project."""
+        response = http.session.get(f"{self.url}/{name}/json")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return _parse_metadata(response.json())
+
+    def _read(self, names):
+        if not names:
+            return {}
+        try:
+            values = self.connection.mget([self._key(name) for name in names])
+        except RedisError as err:
+            log.warning("pypi.cache_error", error=repr(err))
+            return {}
+        return {
+            name: json.loads(value)["metadata"]
+            for name, value in zip(names, values)
+            if value is not None
+        }
+
+    def _load(self, name):
+        """Fetch and store ``name``, or wait for the worker already fetching it."""
+        lock = f"{self._key(name)}:lock"
+        try:
+            is_owner = self.connection.set(lock, 1, nx=True, ex=self.lock_timeout)
+        except RedisError as err:
+            log.warning("pypi.cache_error", error=repr(err))
+            return self.fetch(name)
+
+        if not is_owner:
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+                cached = self._read([name])
+                if name in cached:
+                    return cached[name]
+            log.info("pypi.singleflight_timeout", package=name)
+
+        try:
+            metadata = self.fetch(name)
+            self.connection.set(
+                self._key(name), json.dumps({"metadata": metadata}), ex=self.ttl
+            )
+        except RedisError as err:
+            log.warning("pypi.cache_error", error=repr(err))
+        finally:
+            if is_owner:
+                self._release(lock)
+        return metadata
+
+    def _release(self, lock):
+        try:
+            self.connection.delete(lock)
+        except RedisError as err:
+            log.warning("pypi.cache_error", error=repr(err))
+
+    def get_many(self, names):
+        """Metadata of projects by normalized name, missing ones fetched at once.
+
+        Projects the index couldn't be asked about are left out.
+        """
+        names = list(dict.fromkeys(normalize_name(name) for name in names))
+        results = self._read(names)
+        missing = [name for name in names if name not in results]
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {name: executor.submit(self._load, name) for name in missing}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except (requests.RequestException, ValueError) as err:
+                    log.warning("pypi.fetch_error", package=name, error=repr(err))
+
+        log.info("pypi.metadata", packages=len(names), fetched=len(missing))
+        return results
+
+    def get(self, name):
+        return self.get_many([name]).get(normalize_name(name))
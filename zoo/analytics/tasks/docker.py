@@ -4,6 +4,9 @@ from ..models import DependencyType
 from . import OS, DockerImage
 from .utils import DockerImageId
 
+FILES = ["Dockerfile*"]
+CPU_BOUND = True
+
 KNOWN_DEPS = {
     DependencyType.LANG: {"python", "node"},
     DependencyType.OS: {"alpine", "debian"},
@@ -11,10 +14,10 @@ KNOWN_DEPS = {
 KNOWN_DEBIAN_IMAGES = {"python", "node"}
 
 
-def analyze(repository, path: Path):
+def analyze(repository, path: Path, files):
     """Parse dockerfiles for image information."""
-    for dockerfile in path.rglob("Dockerfile*"):
-        with open(dockerfile.as_posix()) as f:
+    for dockerfile in files.glob("**/Dockerfile*"):
+        with open(dockerfile.full_path) as f:
             for line in f:
                 cmd, _, val = line.partition(" ")
 
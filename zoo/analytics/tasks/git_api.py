@@ -1,20 +1,39 @@
 import structlog
+from requests import RequestException
 
+from ...repos import github
 from ...repos.exceptions import RepositoryNotFoundError
+from ...repos.models import Provider
 from ...repos.utils import get_scm_module
 from . import Language
 
 log = structlog.get_logger()
 
+FILES = []
+CPU_BOUND = False
 
-def analyze(repository, _):
+
+def analyze(repository, *_):
     """Search languages used in repo using git APIs."""
-    scm_module = get_scm_module(repository.provider)
-    try:
-        langs = scm_module.get_languages(repository.remote_id)
-    except RepositoryNotFoundError:
-        log.exception("analytics.git_api.analyze.error")
-        return
+    if repository.provider == Provider.GITHUB.value:
+        # served from the cache when the metadata was prefetched for many repos
+        try:
+            metadata = github.get_repositories_metadata([str(repository)])
+        except RequestException:
+            log.exception("analytics.git_api.analyze.error")
+            return
+        metadata = metadata[str(repository)]
+        if metadata is None:
+            log.error("analytics.git_api.analyze.error", repo=repository)
+            return
+        langs = github.get_languages_percent(metadata["languages"])
+    else:
+        scm_module = get_scm_module(repository.provider)
+        try:
+            langs = scm_module.get_languages(repository.remote_id)
+        except RepositoryNotFoundError:
+            log.exception("analytics.git_api.analyze.error")
+            return
     for lang_name, usage in langs.items():
         if float(usage) > 5:
             yield Language(lang_name)
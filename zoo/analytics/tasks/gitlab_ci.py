@@ -4,6 +4,9 @@ import yaml
 
 from . import CiTemplate, DockerImage
 
+FILES = [".gitlab-ci.yml"]
+CPU_BOUND = True
+
 
 def parse_gitlab_ci_template(parsed_yaml):
     """Parse gitlab-ci.yml file for names of templates."""
@@ -76,11 +79,11 @@ def parse_docker_images(parsed_yaml):
     yield from {image for image in images if image is not None}
 
 
-def analyze(repository, path):
+def analyze(repository, path, files):
     """Parse gitlab-ci.yml to get the templates and the images."""
-    gitlab_ci_file = path / ".gitlab-ci.yml"
+    gitlab_ci_file = files.get(".gitlab-ci.yml")
 
-    if not gitlab_ci_file.is_file():
+    if gitlab_ci_file is None:
         return
 
     parsed_yaml = yaml.safe_load(gitlab_ci_file.read_text())
@@ -1,35 +1,29 @@
-import requests
-import sentry_sdk
 from celery import shared_task
 
-from ...base.http import session
 from ..models import Dependency, DependencyType
+from ..pypi import PyPIMetadataCache, normalize_name
 
 
 @shared_task
 def check_python_lib_licenses():
-    for dependency in Dependency.objects.filter(
-        type=DependencyType.PY_LIB.value, license=None
-    ).only("name"):
-        try:
-            response = session.get(f"https://pypi.org/pypi/{dependency.name}/json")
-            response.raise_for_status()
-            try:
-                licenses = {
-                    classifier.replace("License :: ", "")
-                    .replace("OSI Approved", "")
-                    .strip(" :")
-                    for classifier in response.json()["info"]["classifiers"]
-                    if classifier.startswith("License :: ")
-                }
-                dependency.license = ", ".join(
-                    license for license in licenses if license
-                )
-            except StopIteration:
-                dependency.license = "No license"  # choosealicense.com/no-permission
-            dependency.save()
-        except requests.RequestException as ex:
-            if ex.response.status_code == 404:
-                continue
+    dependencies = list(
+        Dependency.objects.filter(type=DependencyType.PY_LIB.value, license=None).only(
+            "name"
+        )
+    )
+    metadata = PyPIMetadataCache().get_many(dep.name for dep in dependencies)
 
-            sentry_sdk.capture_exception()
+    for dependency in dependencies:
+        package_metadata = metadata.get(normalize_name(dependency.name))
+        if package_metadata is None:
+            continue  # unknown to PyPI, or it couldn't be asked
+
+        licenses = {
+            classifier.replace("License :: ", "")
+            .replace("OSI Approved", "")
+            .strip(" :")
+            for classifier in package_metadata["classifiers"]
+            if classifier.startswith("License :: ")
+        }
+        dependency.license = ", ".join(license for license in licenses if license)
+        dependency.save(update_fields=["license"])
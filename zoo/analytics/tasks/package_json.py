@@ -7,14 +7,17 @@ from .utils import parse_version
 
 log = structlog.get_logger()
 
+FILES = ["package.json"]
+CPU_BOUND = True
 
-def analyze(repository, path):
+
+def analyze(repository, path, files):
     """Parse package.json for javascript packages."""
-    package_json_path = path / "package.json"
-    if not package_json_path.is_file():
+    package_json_file = files.get("package.json")
+    if package_json_file is None:
         return
     try:
-        package_json = json.loads(package_json_path.read_text())
+        package_json = json.loads(package_json_file.read_text())
     except json.decoder.JSONDecodeError:
         log.exception("analytics.package_json.analyze.error")
         return
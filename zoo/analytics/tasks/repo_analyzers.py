@@ -1,13 +1,36 @@
+import importlib
+import itertools
+import multiprocessing
+import time
+from multiprocessing.pool import ThreadPool
+
 import structlog
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils import timezone
 
+from ...repos.file_index import FileIndex
 from ..models import Dependency, DependencyUsage
 from . import docker, git_api, gitlab_ci, package_json, requirements_py
 
 log = structlog.get_logger()
 
+# Every analyzer module provides ``analyze(repository, path, files)``, ``files``
+# being the FileIndex of ``path``, ``FILES``, the patterns of the files it
+# reads, so that pulls extract only the files needed, and ``CPU_BOUND``,
+# whether it parses heavily rather than waits for the network.
 ANALYZERS = [docker, git_api, gitlab_ci, package_json, requirements_py]
 
+BATCH_SIZE = 500
+USAGE_FIELDS = [
+    "major_version",
+    "minor_version",
+    "patch_version",
+    "version",
+    "for_production",
+]
+
 
 def unpack_version(version: str) -> dict:
     version = version.split(".") if version else None
@@ -24,29 +47,199 @@ def unpack_version(version: str) -> dict:
     }
 
 
-def run_all(repository, path):
-    DependencyUsage.objects.filter(repo=repository).delete()
+def _get_pool(processes, cpu_bound):
+    # daemonic processes, e.g. Celery's prefork workers, can't have children
+    if not cpu_bound or multiprocessing.current_process().daemon:
+        return ThreadPool(processes)
+    return multiprocessing.get_context("fork").Pool(processes)
 
-    for module in ANALYZERS:
-        analyzer = getattr(module, "analyze")
-        log.info("repo.analyzer", repo=repository, check=module.__name__)
-        for hit in analyzer(repository, path):
-            dep, _ = Dependency.objects.update_or_create(
-                name=hit.name, type=hit.type.value
-            )
-            dep.health_status = hit.health_status
-            dep.save()
-            dep.full_clean()
 
-            dep_usage_defaults = unpack_version(hit.version)
-            dep_usage_defaults["version"] = hit.version
-            if hit.for_production is not None:
-                dep_usage_defaults["for_production"] = hit.for_production
+def _analyze(module_name, repository, path, files):
+    """Run an analyzer to completion, return its hits and how long it took."""
+    module = importlib.import_module(module_name)
+    started_at = time.monotonic()
+    hits = list(module.analyze(repository, path, files))
+    return hits, time.monotonic() - started_at
+
 
-            if dep_usage_defaults:
-                dep_usage_defaults["timestamp"] = timezone.now
+def run_analyzers(repository, path, files):
+    """Run the analyzers concurrently, return their hits in ``ANALYZERS`` order.
 
-            dep_usage, _ = DependencyUsage.objects.update_or_create(
-                dependency=dep, repo=repository, defaults=dep_usage_defaults
+    I/O bound analyzers run in threads, the ``CPU_BOUND`` ones in processes. An
+    analyzer still running after ``ANALYZER_TIMEOUT`` seconds is given up on,
+    its hits are ``None``.
+    """
+    modules = {module.__name__: module for module in ANALYZERS}
+    pools = {}
+    pending = {}
+    results = {}
+    started_at = time.monotonic()
+    try:
+        for cpu_bound in (False, True):
+            names = [
+                name
+                for name, module in modules.items()
+                if getattr(module, "CPU_BOUND", False) == cpu_bound
+            ]
+            if not names:
+                continue
+            pools[cpu_bound] = pool = _get_pool(len(names), cpu_bound)
+            for name in names:
+                pending[name] = pool.apply_async(
+                    _analyze, (name, repository, path, files)
+                )
+
+        for name in modules:
+            timeout = max(started_at + settings.ANALYZER_TIMEOUT - time.monotonic(), 0)
+            try:
+                hits, duration = pending[name].get(timeout)
+            except multiprocessing.TimeoutError:
+                log.warning("repo.analyzer.timeout", repo=repository, check=name)
+                results[name] = None
+                continue
+            log.info(
+                "repo.analyzer",
+                repo=repository,
+                check=name,
+                hits=len(hits),
+                duration=round(duration, 3),
             )
-            dep_usage.full_clean()
+            results[name] = hits
+    finally:
+        for pool in pools.values():
+            pool.terminate()
+
+    return [results[name] for name in modules]
+
+
+def collect_hits(repository, path, files):
+    """Run the analyzers, deduplicating their hits by dependency.
+
+    Names are stored lowercased, so hits differing only in case are one
+    dependency. A later hit overrides an earlier one, except for an unknown
+    ``for_production``. Returns the hits and whether every analyzer finished.
+    """
+    hits = {}
+    analyzer_hits = run_analyzers(repository, path, files)
+    for hit in itertools.chain.from_iterable(filter(None, analyzer_hits)):
+        key = (str(hit.name).lower(), hit.type.value)
+        previous = hits.get(key)
+        if previous is not None and hit.for_production is None:
+            hit = hit._replace(for_production=previous.for_production)
+        hits[key] = hit
+    return hits, None not in analyzer_hits
+
+
+def resolve_dependencies(hits):
+    """Get or create the dependencies of ``hits``, keyed like them."""
+    names = {name for name, _ in hits}
+    types = {type_ for _, type_ in hits}
+
+    def fetch():
+        return {
+            (dep.name, dep.type): dep
+            for dep in Dependency.objects.filter(name__in=names, type__in=types)
+            if (dep.name, dep.type) in hits
+        }
+
+    dependencies = fetch()
+    missing = []
+    for key, hit in hits.items():
+        if key in dependencies:
+            continue
+        dep = Dependency(name=key[0], type=key[1], health_status=hit.health_status)
+        try:
+            dep.full_clean(validate_unique=False)
+        except ValidationError as err:
+            log.info("repo.analyzer.invalid", dependency=key, error=err)
+            continue
+        missing.append(dep)
+
+    if missing:
+        # concurrent pulls may create the same dependencies, fetch them all again
+        Dependency.objects.bulk_create(
+            missing, batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+        dependencies = fetch()
+
+    outdated = []
+    for key, dep in dependencies.items():
+        if dep.health_status != hits[key].health_status:
+            dep.health_status = hits[key].health_status
+            outdated.append(dep)
+    Dependency.objects.bulk_update(outdated, ["health_status"], batch_size=BATCH_SIZE)
+
+    return dependencies
+
+
+def _usage_fields(hit):
+    versions = unpack_version(hit.version)
+    return {
+        "major_version": _to_int(versions.get("major_version")),
+        "minor_version": _to_int(versions.get("minor_version")),
+        "patch_version": _to_int(versions.get("patch_version")),
+        "version": hit.version,
+        "for_production": hit.for_production,
+    }
+
+
+def _to_int(value):
+    return int(value) if value is not None else None
+
+
+def run_all(repository, path, files=None):
+    """Analyze the repo and store its dependency usages.
+
+    Only new, changed and removed usages are written, unchanged usages keep
+    their timestamps. Usages are only removed when every analyzer finished,
+    those of an analyzer that timed out aren't known.
+    """
+    if files is None:
+        files = FileIndex.for_repository(repository, path)
+
+    hits, is_complete = collect_hits(repository, path, files)
+    now = timezone.now()
+
+    with transaction.atomic():
+        dependencies = resolve_dependencies(hits)
+        existing = {
+            usage.dependency_id: usage
+            for usage in DependencyUsage.objects.filter(repo=repository)
+        }
+
+        to_create, to_update = [], []
+        for key, dep in dependencies.items():
+            fields = _usage_fields(hits[key])
+            usage = existing.pop(dep.pk, None)
+            if usage is None:
+                usage = DependencyUsage(dependency=dep, repo=repository, **fields)
+            elif all(getattr(usage, name) == value for name, value in fields.items()):
+                continue
+            else:
+                for name, value in fields.items():
+                    setattr(usage, name, value)
+
+            usage.timestamp = now
+            try:
+                usage.full_clean(exclude=["dependency", "repo"], validate_unique=False)
+            except ValidationError as err:
+                log.info("repo.analyzer.invalid", usage=usage, error=err)
+                continue
+            (to_update if usage.pk else to_create).append(usage)
+
+        DependencyUsage.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        DependencyUsage.objects.bulk_update(
+            to_update, [*USAGE_FIELDS, "timestamp"], batch_size=BATCH_SIZE
+        )
+        if is_complete:
+            DependencyUsage.objects.filter(
+                pk__in=[usage.pk for usage in existing.values()]
+            ).delete()
+
+    log.info(
+        "repo.analyzer.usages",
+        repo=repository,
+        created=len(to_create),
+        updated=len(to_update),
+        deleted=len(existing) if is_complete else 0,
+    )
@@ -5,16 +5,19 @@ import requirements
 import structlog
 from pkg_resources import RequirementParseError
 
-from ...base.http import session
+from ..pypi import PyPIMetadataCache, normalize_name
 from . import PyLibrary
 
 log = structlog.get_logger()
 
+FILES = ["*requirements*.txt"]
+CPU_BOUND = False
 
-def analyze(repository, path):
+
+def analyze(repository, path, files):
     """Parse requirements files for python packages."""
-    req_file_paths = path.glob("*requirements*.txt")
-    for req_file_path in req_file_paths:
+    for req_file in files.glob("*requirements*.txt"):
+        req_file_path = req_file.full_path
         if req_file_path.name == "requirements.txt":
             for_production = True
         elif req_file_path.name in {
@@ -91,36 +94,30 @@ def is_package_unhealthy(status: int, last_release_date: str) -> bool:
     return False
 
 
-def get_pypi_metadata(package_name: str):
-    r = session.get(f"https://pypi.org/pypi/{package_name}/json")
-    return None if r.status_code == 404 else r.json()
-
-
 def get_unhealthy_packages(reqs: list) -> list:
+    names = [req.name for req in reqs if req.name is not None]
+    metadata = PyPIMetadataCache().get_many(names)
     unhealthy_packages = []
 
-    for req in reqs:
-        if req.name is None:
-            continue
-
-        package_metadata = get_pypi_metadata(req.name)
+    for name in names:
+        package_metadata = metadata.get(normalize_name(name))
         if package_metadata is None:
             continue
 
         status_classifiers = get_development_status_classifiers(
-            package_metadata["info"]["classifiers"]
+            package_metadata["classifiers"]
         )
 
         if len(status_classifiers) != 1:
-            unhealthy_packages.append(req.name)
+            unhealthy_packages.append(name)
             continue
 
-        status = status_classifiers[0]
-        current_version = package_metadata["info"]["version"]
+        if package_metadata["upload_time"] is None:
+            continue  # the latest version has no files
 
         if is_package_unhealthy(
-            int(status), package_metadata["releases"][current_version][0]["upload_time"]
+            int(status_classifiers[0]), package_metadata["upload_time"]
         ):
-            unhealthy_packages.append(req.name)
+            unhealthy_packages.append(name)
 
     return unhealthy_packages
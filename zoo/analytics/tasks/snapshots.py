@@ -1,13 +1,30 @@
 from celery import shared_task
+from django.db import transaction
+from django.db.models import Count
 
+from ...utils import get_snapshot_timestamp
 from .. import models
 
+BATCH_SIZE = 1000
+
 
 @shared_task
 def take_dependency_snapshots():
-    for dependency in models.Dependency.objects.all():
-        snapshot = models.DependencySnapshot(
-            dependency=dependency, dep_usages_num=dependency.depusage.count()
+    timestamp = get_snapshot_timestamp()
+    counts = models.Dependency.objects.annotate(
+        dep_usages_num=Count("depusage")
+    ).values_list("pk", "dep_usages_num")
+
+    with transaction.atomic():
+        models.DependencySnapshot.objects.filter(timestamp=timestamp).delete()
+        models.DependencySnapshot.objects.bulk_create(
+            (
+                models.DependencySnapshot(
+                    dependency_id=dependency_id,
+                    timestamp=timestamp,
+                    dep_usages_num=dep_usages_num,
+                )
+                for dependency_id, dep_usages_num in counts.iterator()
+            ),
+            batch_size=BATCH_SIZE,
         )
-        snapshot.full_clean()
-        snapshot.save()
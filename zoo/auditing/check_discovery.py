@@ -5,7 +5,7 @@ import site
 from collections import defaultdict
 from enum import Enum
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Tuple
 
 import attr
 import structlog
@@ -82,22 +82,31 @@ KINDS = defaultdict(
 )
 CHECKS = []
 PATCHES = {}
+# file patterns read by the checks of a module, ``None`` if not declared
+CHECK_FILES = {}
+# keys of the kinds of issues the checks of a module report
+CHECK_KINDS = {}
 
 
 class IncorrectCheckMetadataError(Exception):
     pass
 
 
-def _parse_metadata_file(package_path: Path, module_name: str) -> Dict:
+def _parse_metadata_file(package_path: Path, module_name: str) -> Tuple[Dict, List]:
     with (package_path / "metadata" / f"{module_name}.yml").open() as metadata_file:
         try:
             header, details = yaml.safe_load_all(metadata_file)
-            return {
+            files = header.pop("files", None)
+            kinds = {
                 kind.key: kind for kind in [Kind(**header, **data) for data in details]
             }
         except (ValueError, KeyError) as exc:
             raise IncorrectCheckMetadataError("File format not correct") from exc
 
+    if files is not None and not isinstance(files, list):
+        raise IncorrectCheckMetadataError("Files must be a list of patterns")
+    return kinds, files
+
 
 def log_error(name):
     log.info("auditing.check_discovery.scan.fail", name=name)
@@ -107,6 +116,8 @@ def clear_discovered_checks():
     KINDS.clear()
     CHECKS.clear()
     PATCHES.clear()
+    CHECK_FILES.clear()
+    CHECK_KINDS.clear()
 
 
 def _discover_kinds(package_name):
@@ -117,9 +128,12 @@ def _discover_kinds(package_name):
         CHECKS.extend(
             [member for _, member in _get_module_members(module, CHECK_REGEX)]
         )
-        package_kinds.update(
-            _parse_metadata_file(settings.ZOO_AUDITING_ROOT / package_name, module_name)
+        kinds, files = _parse_metadata_file(
+            settings.ZOO_AUDITING_ROOT / package_name, module_name
         )
+        package_kinds.update(kinds)
+        CHECK_FILES[module.__name__] = files
+        CHECK_KINDS[module.__name__] = list(kinds)
     return package_kinds
 
 
@@ -9,8 +9,13 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("repo_id")
         parser.add_argument("provider")
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Pull even if the repository didn't change since the last pull",
+        )
 
     def handle(self, *args, **options):
         repo_id = options["repo_id"]
         provider = options["provider"]
-        pull(repo_id, provider)
+        pull(repo_id, provider, force=options["force"])
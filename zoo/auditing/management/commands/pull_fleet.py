@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ....repos.fleet import FleetPull, select_repositories
+from ....repos.models import Provider
+
+
+def parse_concurrency(item):
+    """Parse a ``PROVIDER=LIMIT`` option, the limit is a positive integer."""
+    try:
+        provider, limit = item.split("=", 1)
+        limit = int(limit)
+    except ValueError as err:
+        raise CommandError(
+            f"--concurrency must be in PROVIDER=LIMIT format, not {item!r}"
+        ) from err
+    if limit < 1:
+        raise CommandError(f"--concurrency limit must be positive, not {item!r}")
+    return provider, limit
+
+
+class Command(BaseCommand):
+    help = "Pulls many repos in parallel and performs the checks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--provider", choices=[item.value for item in Provider], default=None
+        )
+        parser.add_argument("--owner", default=None)
+        parser.add_argument(
+            "--id",
+            dest="ids",
+            action="append",
+            type=int,
+            help="Repository ID to pull, can be repeated",
+        )
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument(
+            "--concurrency",
+            action="append",
+            default=[],
+            metavar="PROVIDER=LIMIT",
+            help="Maximum of concurrent pulls from one provider, can be repeated",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="File to record progress in, an interrupted run resumes from it",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Pull even the repositories that didn't change since the last pull",
+        )
+        parser.add_argument(
+            "--threads",
+            action="store_true",
+            help="Use a thread pool instead of a process pool",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = None
+        if options["concurrency"]:
+            concurrency = dict(
+                parse_concurrency(item) for item in options["concurrency"]
+            )
+
+        fleet = FleetPull(
+            select_repositories(options["provider"], options["owner"], options["ids"]),
+            workers=options["workers"],
+            concurrency=concurrency,
+            checkpoint=options["checkpoint"],
+            force=options["force"],
+            use_threads=options["threads"],
+            progress=self.report_progress,
+        )
+        summary = fleet.run()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{summary.get('pulled', 0)} repos pulled, "
+                f"{summary.get('unchanged', 0)} unchanged, "
+                f"{summary.get('failed', 0)} failed."
+            )
+        )
+
+    def report_progress(self, repository, success, done, total):
+        status = "ok" if success else self.style.ERROR("failed")
+        self.stdout.write(f"[{done}/{total}] {repository}: {status}")
@@ -0,0 +1,225 @@
+import bisect
+import resource
+import time
+from collections import namedtuple
+
+import structlog
+from redis.exceptions import RedisError
+
+from ..base import redis
+
+log = structlog.get_logger()
+
+CheckStats = namedtuple(
+    "CheckStats",
+    ["wall_time", "cpu_time", "memory_delta", "results", "errors", "timeouts"],
+    defaults=(0, 0),
+)
+
+# upper bounds of the histogram buckets, the last bucket has none
+HISTOGRAMS = {
+    "wall_time": (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120),
+    "cpu_time": (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120),
+    "memory_delta": tuple(size * 1024 * 1024 for size in (1, 10, 50, 100, 500)),
+}
+COUNTERS = ("results", "errors", "timeouts")
+# runs of checks with fingerprinted inputs, see zoo.auditing.result_cache
+CACHE_COUNTERS = ("cache_hits", "cache_misses")
+METRIC_NAMES = {
+    "wall_time": "zoo_check_wall_seconds",
+    "cpu_time": "zoo_check_cpu_seconds",
+    "memory_delta": "zoo_check_memory_delta_bytes",
+    "results": "zoo_check_results_total",
+    "errors": "zoo_check_errors_total",
+    "timeouts": "zoo_check_timeouts_total",
+    "cache_hits": "zoo_check_cache_hits_total",
+    "cache_misses": "zoo_check_cache_misses_total",
+}
+
+
+def _get_max_rss():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(function, *args):
+    """Call ``function``, return its results, :class:`CheckStats` and exception.
+
+    The CPU time is the calling thread's. The memory delta is the growth of the
+    peak memory of the process, it's only the check's own when the check runs in
+    a process of its own, unlike in threads, see ``ZOO_AUDITING_CHECK_POOL``.
+    """
+    started_at = time.perf_counter()
+    cpu_started_at = time.thread_time()
+    max_rss = _get_max_rss()
+    results = []
+    error = None
+    try:
+        results.extend(function(*args))
+    except Exception as err:  # pylint: disable=broad-except
+        error = err
+
+    stats = CheckStats(
+        wall_time=time.perf_counter() - started_at,
+        cpu_time=time.thread_time() - cpu_started_at,
+        memory_delta=max(_get_max_rss() - max_rss, 0),
+        results=len(results),
+        errors=int(error is not None),
+    )
+    return results, stats, error
+
+
+def get_check_name(check):
+    return f"{check.__module__}.{check.__name__}"
+
+
+class CheckMetrics:
+    """Histograms of the checks' costs, aggregated over all pulls in Redis.
+
+    Every check has a hash counting its invocations per bucket of
+    :data:`HISTOGRAMS`, the sums of the measured values and the
+    :data:`COUNTERS`.
+    """
+
+    prefix = "zoo:check-metrics"
+
+    def __init__(self, connection=None):
+        self._connection = connection
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = redis.get_connection()
+        return self._connection
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def record(self, name, stats):
+        pipeline = self.connection.pipeline(transaction=False)
+        key = self._key(name)
+        pipeline.sadd(f"{self.prefix}:checks", name)
+        pipeline.hincrby(key, "count", 1)
+        for metric, buckets in HISTOGRAMS.items():
+            value = getattr(stats, metric)
+            bucket = bisect.bisect_left(buckets, value)
+            pipeline.hincrby(key, f"{metric}:{bucket}", 1)
+            pipeline.hincrbyfloat(key, f"{metric}:sum", value)
+        for counter in COUNTERS:
+            pipeline.hincrby(key, counter, getattr(stats, counter))
+        try:
+            pipeline.execute()
+        except RedisError as err:
+            log.warning("auditing.metrics.error", error=repr(err))
+
+    def record_cache(self, name, is_hit):
+        pipeline = self.connection.pipeline(transaction=False)
+        pipeline.sadd(f"{self.prefix}:checks", name)
+        pipeline.hincrby(self._key(name), "cache_hits" if is_hit else "cache_misses")
+        try:
+            pipeline.execute()
+        except RedisError as err:
+            log.warning("auditing.metrics.error", error=repr(err))
+
+    def get_all(self):
+        """Return the histograms of every check, by check name.
+
+        A histogram has the cumulative ``counts`` of its buckets, the last one
+        counts every invocation, and the ``sum`` of the values.
+        """
+        names = sorted(
+            name.decode() for name in self.connection.smembers(f"{self.prefix}:checks")
+        )
+        pipeline = self.connection.pipeline(transaction=False)
+        for name in names:
+            pipeline.hgetall(self._key(name))
+
+        metrics = {}
+        for name, raw in zip(names, pipeline.execute()):
+            fields = {field.decode(): float(value) for field, value in raw.items()}
+            check = {"count": int(fields.get("count", 0))}
+            for metric, buckets in HISTOGRAMS.items():
+                counts = []
+                for bucket in range(len(buckets) + 1):
+                    previous = counts[-1] if counts else 0
+                    counts.append(previous + int(fields.get(f"{metric}:{bucket}", 0)))
+                check[metric] = {
+                    "counts": counts,
+                    "sum": fields.get(f"{metric}:sum", 0.0),
+                }
+            for counter in COUNTERS + CACHE_COUNTERS:
+                check[counter] = int(fields.get(counter, 0))
+            metrics[name] = check
+        return metrics
+
+    def get_slowest(self, limit=50):
+        """Return the checks by their mean wall time, slowest first."""
+        rows = []
+        for name, check in self.get_all().items():
+            count = check["count"] or 1
+            module, _, function = name.rpartition(".")
+            rows.append(
+                {
+                    "name": function,
+                    "module": module,
+                    "package": module.split(".")[0],
+                    "count": check["count"],
+                    "wall_time": check["wall_time"]["sum"] / count,
+                    "wall_time_p95": estimate_quantile(
+                        HISTOGRAMS["wall_time"], check["wall_time"]["counts"], 0.95
+                    ),
+                    "cpu_time": check["cpu_time"]["sum"] / count,
+                    "memory_delta": check["memory_delta"]["sum"] / count,
+                    "results": check["results"],
+                    "errors": check["errors"],
+                    "timeouts": check["timeouts"],
+                    "cache_hits": check["cache_hits"],
+                    "cache_misses": check["cache_misses"],
+                }
+            )
+        rows.sort(key=lambda row: row["wall_time"], reverse=True)
+        return rows[:limit]
+
+
+def estimate_quantile(buckets, counts, quantile):
+    """Upper bound of the bucket holding ``quantile``, ``None`` if it has none."""
+    if not counts or not counts[-1]:
+        return None
+    rank = quantile * counts[-1]
+    index = bisect.bisect_left(counts, rank)
+    return buckets[index] if index < len(buckets) else None
+
+
+def _format_labels(name, **extra):
+    module, _, function = name.rpartition(".")
+    labels = {
+        "package": module.split(".")[0],
+        "module": module,
+        "check": function,
+        **extra,
+    }
+    return ",".join(f'{label}="{value}"' for label, value in labels.items())
+
+
+def render_prometheus(metrics):
+    """Format the output of :meth:`CheckMetrics.get_all` for Prometheus."""
+    lines = []
+    for metric, buckets in HISTOGRAMS.items():
+        metric_name = METRIC_NAMES[metric]
+        lines.append(f"# TYPE {metric_name} histogram")
+        for name, check in metrics.items():
+            histogram = check[metric]
+            for bound, count in zip([*buckets, "+Inf"], histogram["counts"]):
+                labels = _format_labels(name, le=bound)
+                lines.append(f"{metric_name}_bucket{{{labels}}} {count}")
+            labels = _format_labels(name)
+            lines.append(f"{metric_name}_sum{{{labels}}} {histogram['sum']}")
+            lines.append(f"{metric_name}_count{{{labels}}} {check['count']}")
+
+    for counter in COUNTERS + CACHE_COUNTERS:
+        metric_name = METRIC_NAMES[counter]
+        lines.append(f"# TYPE {metric_name} counter")
+        for name, check in metrics.items():
+            lines.append(f"{metric_name}{{{_format_labels(name)}}} {check[counter]}")
+
+    return "\n".join(lines) + "\n"
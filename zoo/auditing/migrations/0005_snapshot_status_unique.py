@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-18 12:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repos", "0012_repository_zoo_file_sha"),
+        ("auditing", "0004_issue_merge_request_id"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="issuecountbykindsnapshot",
+            unique_together={("kind_key", "status", "timestamp")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="issuecountbyrepositorysnapshot",
+            unique_together={("repository", "status", "timestamp")},
+        ),
+    ]
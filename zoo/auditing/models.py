@@ -69,7 +69,7 @@ class Issue(models.Model):
 
 class IssueCountByRepositorySnapshot(models.Model):
     class Meta:
-        unique_together = ("repository", "timestamp")
+        unique_together = ("repository", "status", "timestamp")
 
     repository = models.ForeignKey(
         Repository, on_delete=models.CASCADE, related_name="issue_count_snapshots"
@@ -83,7 +83,7 @@ class IssueCountByRepositorySnapshot(models.Model):
 
 class IssueCountByKindSnapshot(models.Model):
     class Meta:
-        unique_together = ("kind_key", "timestamp")
+        unique_together = ("kind_key", "status", "timestamp")
 
     kind_key = models.CharField(max_length=500)
     status = models.CharField(
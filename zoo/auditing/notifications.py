@@ -0,0 +1,166 @@
+import math
+
+import structlog
+from django.conf import settings
+from redis.exceptions import RedisError
+from requests import RequestException
+from slacker import Error as SlackError
+from slacker import Slacker
+
+from ..base import redis
+from ..base.ratelimit import RateLimiter
+from . import tasks
+
+log = structlog.get_logger()
+slack = Slacker(settings.SLACK_TOKEN)
+
+# how long a scheduled digest may wait in the queue before it's scheduled again
+SCHEDULE_GRACE = 15 * 60
+# the rate limiter bucket of the digests
+SLACK_BUCKET = "slack.com"
+# failed deliveries of a digest before its messages are dropped
+MAX_DELIVERY_ATTEMPTS = 5
+
+
+def format_digest(lines):
+    if len(lines) == 1:
+        return lines[0]
+    return "\n".join(
+        [f"{len(lines)} issues changed status:", *(f"• {line}" for line in lines)]
+    )
+
+
+class SlackDigestQueue:
+    """Slack messages queued in Redis, sent to their channels as digests.
+
+    The first message pushed to a channel schedules the delivery of a digest in
+    ``window`` seconds, the messages pushed meanwhile join it. A digest has up
+    to ``max_lines`` messages, the rest are sent in the next ones. Deliveries
+    run in :func:`~zoo.auditing.tasks.send_slack_digest`, so pushing messages
+    never waits for Slack.
+
+    All the workers together send up to ``SLACK_DIGEST_RATE_LIMIT`` digests per
+    hour, paced by a :class:`~zoo.base.ratelimit.RateLimiter`. A digest over the
+    limit isn't waited for, it's queued again and scheduled once the limiter
+    allows it. A digest Slack
+    fails to take is queued again and retried later, backing off, up to
+    ``MAX_DELIVERY_ATTEMPTS`` times.
+    """
+
+    prefix = "zoo:slack-digest"
+
+    def __init__(self, window=None, max_lines=None, connection=None, limiter=None):
+        self.window = window if window is not None else settings.SLACK_DIGEST_WINDOW
+        self.max_lines = max_lines or settings.SLACK_DIGEST_MAX_LINES
+        self._connection = connection
+        self._limiter = limiter
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = redis.get_connection()
+        return self._connection
+
+    @property
+    def limiter(self):
+        if self._limiter is None:
+            self._limiter = RateLimiter(
+                {SLACK_BUCKET: settings.SLACK_DIGEST_RATE_LIMIT},
+                max_wait=settings.RATE_LIMIT_MAX_WAIT,
+                connection=self.connection,
+            )
+        return self._limiter
+
+    def _key(self, channel):
+        return f"{self.prefix}:{channel}"
+
+    def _schedule(self, channel, countdown):
+        """Schedule a delivery to the channel unless one already is."""
+        key = f"{self._key(channel)}:scheduled"
+        if self.connection.set(key, 1, nx=True, ex=countdown + SCHEDULE_GRACE):
+            tasks.send_slack_digest.apply_async(args=(channel,), countdown=countdown)
+
+    def push(self, channel, lines):
+        try:
+            self.connection.rpush(self._key(channel), *lines)
+            self._schedule(channel, self.window)
+        except RedisError as err:
+            log.warning("auditing.slack_digest.queue_error", error=repr(err))
+
+    def pop(self, channel):
+        """Take the oldest messages of the channel, return them and how many are left.
+
+        The delivery is unscheduled first, messages pushed from then on schedule
+        another one.
+        """
+        key = self._key(channel)
+        pipeline = self.connection.pipeline()
+        pipeline.delete(f"{key}:scheduled")
+        pipeline.lrange(key, 0, self.max_lines - 1)
+        pipeline.ltrim(key, self.max_lines, -1)
+        pipeline.llen(key)
+        _, lines, _, left = pipeline.execute()
+        return [line.decode() for line in lines], left
+
+    def requeue(self, channel, lines):
+        """Put the messages back at the head of the queue, retry them later.
+
+        Every failed attempt doubles the delay, the messages are dropped after
+        ``MAX_DELIVERY_ATTEMPTS`` of them.
+        """
+        key = self._key(channel)
+        attempts = self.connection.incr(f"{key}:attempts")
+        self.connection.expire(f"{key}:attempts", self.window * 2**attempts)
+        if attempts >= MAX_DELIVERY_ATTEMPTS:
+            self.connection.delete(f"{key}:attempts")
+            log.warning(
+                "auditing.slack_digest.dropped", channel=channel, messages=len(lines)
+            )
+            return
+
+        self.connection.lpush(key, *reversed(lines))
+        self._schedule(channel, self.window * 2 ** (attempts - 1))
+
+    def postpone(self, channel, lines, countdown):
+        """Put the messages back at the head of the queue, deliver them later."""
+        self.connection.lpush(self._key(channel), *reversed(lines))
+        self._schedule(channel, countdown)
+
+    def deliver(self, channel):
+        try:
+            lines, left = self.pop(channel)
+        except RedisError as err:
+            log.warning("auditing.slack_digest.queue_error", error=repr(err))
+            return
+
+        if not lines:
+            return
+
+        wait = self.limiter.try_acquire(SLACK_BUCKET)
+        if wait > 0:
+            log.info("auditing.slack_digest.rate_limited", channel=channel, wait=wait)
+            try:
+                self.postpone(channel, lines, math.ceil(wait))
+            except RedisError as err:
+                log.warning("auditing.slack_digest.queue_error", error=repr(err))
+            return
+
+        try:
+            slack.chat.post_message(channel, format_digest(lines))
+        except (SlackError, RequestException) as error:
+            log.exception(
+                "auditing.slack_digest.slack_error", channel=channel, error=repr(error)
+            )
+            try:
+                self.requeue(channel, lines)
+            except RedisError as err:
+                log.warning("auditing.slack_digest.queue_error", error=repr(err))
+            return
+
+        log.info("auditing.slack_digest.sent", channel=channel, messages=len(lines))
+        try:
+            self.connection.delete(f"{self._key(channel)}:attempts")
+            if left:
+                self._schedule(channel, 0)
+        except RedisError as err:
+            log.warning("auditing.slack_digest.queue_error", error=repr(err))
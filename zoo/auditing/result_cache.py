@@ -0,0 +1,140 @@
+import functools
+import hashlib
+import inspect
+import json
+from importlib import metadata
+from pathlib import PurePosixPath
+
+import structlog
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from ..base import redis
+from ..utils import _get_app_version
+from .check_discovery import CHECK_FILES
+
+log = structlog.get_logger()
+
+# what checks see of the repository besides its files
+CONTEXT_ATTRIBUTES = (
+    "owner",
+    "name",
+    "repo_url",
+    "remote_id",
+    "provider",
+    "languages",
+    "project_type",
+    "exclude_files",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_code_version(check):
+    """Hash the module of the check, helpers next to it may change its results.
+
+    The version of the distribution the check comes from is included too, as its
+    other modules may change its results as well.
+    """
+    version = hashlib.sha256(str(_get_app_version()).encode())
+    version.update(f"{check.__module__}.{check.__qualname__}".encode())
+    try:
+        version.update(metadata.version(check.__module__.split(".")[0]).encode())
+    except metadata.PackageNotFoundError:
+        pass
+    try:
+        version.update(inspect.getsource(inspect.getmodule(check)).encode())
+    except (OSError, TypeError):
+        pass
+    return version.hexdigest()
+
+
+def _hash_files(files, patterns):
+    """Hash the paths and contents of the files matching one of the patterns."""
+    digest = hashlib.sha256()
+    for file in files:
+        path = PurePosixPath(file.path)
+        if any(path.match(pattern) for pattern in patterns):
+            digest.update(f"{file.path}\0{file.content_hash}\0".encode())
+    return digest.hexdigest()
+
+
+def get_fingerprints(checks, context):
+    """Fingerprint the inputs of the checks, ``None`` if they aren't declared.
+
+    Checks declare the files they read in the ``files`` of their metadata. The
+    fingerprint covers the code of the check, what the context tells about the
+    repository and the content of the declared files, hashed by the file index.
+    The files are matched once per distinct set of patterns, checks of the same
+    module share it.
+    """
+    context_digest = json.dumps(
+        {name: getattr(context, name) for name in CONTEXT_ATTRIBUTES},
+        sort_keys=True,
+        default=str,
+    ).encode()
+    files_digests = {}
+    fingerprints = []
+
+    for check in checks:
+        patterns = CHECK_FILES.get(check.__module__)
+        if patterns is None:
+            fingerprints.append(None)
+            continue
+
+        patterns = tuple(patterns)
+        if patterns not in files_digests:
+            files_digests[patterns] = _hash_files(context.files, patterns)
+
+        fingerprint = hashlib.sha256(_get_code_version(check).encode())
+        fingerprint.update(context_digest)
+        fingerprint.update(files_digests[patterns].encode())
+        fingerprints.append(fingerprint.hexdigest())
+
+    return fingerprints
+
+
+class CheckResultCache:
+    """Results of checks by the fingerprint of their inputs, kept in Redis."""
+
+    prefix = "zoo:check-results"
+
+    def __init__(self, ttl=None, connection=None):
+        self.ttl = ttl if ttl is not None else settings.ZOO_AUDITING_RESULT_CACHE_TTL
+        self._connection = connection
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = redis.get_connection()
+        return self._connection
+
+    def _key(self, fingerprint):
+        return f"{self.prefix}:{fingerprint}"
+
+    def get_many(self, fingerprints):
+        """Return the cached results as lists of ``(issue_key, is_found, details)``."""
+        fingerprints = list(fingerprints)
+        if not fingerprints:
+            return {}
+        try:
+            values = self.connection.mget(
+                [self._key(fingerprint) for fingerprint in fingerprints]
+            )
+        except RedisError as err:
+            log.warning("auditing.result_cache.error", error=repr(err))
+            return {}
+        return {
+            fingerprint: json.loads(value)
+            for fingerprint, value in zip(fingerprints, values)
+            if value is not None
+        }
+
+    def set(self, fingerprint, results):
+        try:
+            self.connection.set(
+                self._key(fingerprint),
+                json.dumps([list(result) for result in results]),
+                ex=self.ttl,
+            )
+        except (RedisError, TypeError) as err:
+            log.warning("auditing.result_cache.error", error=repr(err))
@@ -1,20 +1,26 @@
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 
 import arrow
 import sentry_sdk
 import structlog
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
 from django.urls import reverse
-from slacker import Error as SlackError
-from slacker import Slacker
 
+from ..base.processes import TimeLimitExceeded, run_in_processes, run_in_threads
+from ..repos.file_index import FileIndex
 from ..services.models import Service
-from .check_discovery import CHECKS
+from .check_discovery import CHECK_KINDS, CHECKS
+from .metrics import CheckMetrics, CheckStats, get_check_name, measure
 from .models import Issue
+from .notifications import SlackDigestQueue
+from .result_cache import CheckResultCache, get_fingerprints
 
 log = structlog.get_logger()
-slack = Slacker(settings.SLACK_TOKEN)
+
+ISSUES_BATCH_SIZE = 500
 
 Result = namedtuple("Result", ["issue_key", "is_found", "details"], defaults=(None,))
 CodePatch = namedtuple(
@@ -32,7 +38,7 @@ class CheckContext:  # pylint: disable=too-many-instance-attributes
     CodePatch = CodePatch
     RequestPatch = RequestPatch
 
-    def __init__(self, repository, fake_path):
+    def __init__(self, repository, fake_path, files=None):
         self.owner = repository.owner
         self.name = repository.name
         self.repo_url = repository.url
@@ -42,6 +48,15 @@ class CheckContext:  # pylint: disable=too-many-instance-attributes
         self.languages = repository.languages_from_analytics
         self.project_type = repository.project_type
         self.exclude_files = repository.exclusions
+        self._repository = repository
+        self._files = files
+
+    @property
+    def files(self):
+        """:class:`~zoo.repos.file_index.FileIndex` of ``path`` without the exclusions."""
+        if self._files is None:
+            self._files = FileIndex.for_repository(self._repository, self.path)
+        return self._files
 
 
 def determine_issue_status(is_found, old_status):
@@ -59,31 +74,30 @@ def determine_issue_status(is_found, old_status):
     return old_status
 
 
-def create_issue(issue_repo, issue_key, is_found, details=None):
-    status = Issue.Status.NEW.value if is_found else Issue.Status.NOT_FOUND.value
-    Issue.objects.create(
-        repository=issue_repo, kind_key=issue_key, status=status, details=details
-    )
-
-
-def update_issue(issue: Issue, is_found, details=None):
-    if issue.details != details:
-        issue.details = details
-    issue.status = determine_issue_status(is_found, issue.status)
-    issue.last_check = arrow.utcnow().datetime
-    issue.deleted = False
-    issue.save()
+def notify_status_changes(issues):
+    """Queue Slack notifications of the issues that are new or reopened.
 
-    notify_status_change(issue)
+    The notifications go to the channels of the services of the issues'
+    repositories, in digests, see :class:`SlackDigestQueue`.
+    """
+    issues = [
+        issue
+        for issue in issues
+        if Issue.Status(issue.status) in [Issue.Status.NEW, Issue.Status.REOPENED]
+    ]
+    if not issues:
+        return
 
+    site = Site.objects.get_current()
+    services = defaultdict(list)
+    for service in Service.objects.filter(
+        repository__in={issue.repository_id for issue in issues}
+    ).exclude(slack_channel__isnull=True):
+        services[service.repository_id].append(service)
 
-def notify_status_change(issue: Issue):
-    if Issue.Status(issue.status) in [Issue.Status.NEW, Issue.Status.REOPENED]:
-        site = Site.objects.get_current()
-        services = Service.objects.filter(repository=issue.repository).exclude(
-            slack_channel__isnull=True
-        )
-        for service in services:
+    messages = defaultdict(list)
+    for issue in issues:
+        for service in services[issue.repository_id]:
             audit_url = reverse(
                 "audit_report",
                 args=("services", service.owner_slug, service.name_slug),
@@ -93,65 +107,250 @@ def notify_status_change(issue: Issue):
                 issue=f"<http://{site.domain}{audit_url}|{issue.kind.title}>",
                 repo=issue.repository,
             )
-            try:
-                slack.chat.post_message(service.slack_channel, text)
-            except SlackError as error:
-                log.exception("auditing.update_issue.slack_error", error=repr(error))
+            messages[service.slack_channel].append(text)
+
+    queue = SlackDigestQueue()
+    for channel, lines in messages.items():
+        queue.push(channel, lines)
+
 
+def _get_unknown_results(check):
+    return [Result(key, None) for key in CHECK_KINDS.get(check.__module__, [])]
 
-def save_check_result(issue_repo, issue_key, is_found, details=None):
-    if details is None:
-        details = {}
 
-    # we ignore/clear details for not found (or fixed) issues
-    if not is_found:
-        details = {}
+def _get_check_outcome(check, repository, outcome):
+    """Return the ``(results, stats, error)`` of a check run in a process or thread."""
+    process_error, measured = outcome
+    if process_error is None:
+        return measured
 
+    is_timeout = isinstance(process_error, TimeLimitExceeded)
+    log.warning(
+        "auditing.check.timeout" if is_timeout else "auditing.check.process_lost",
+        repo_id=repository.id,
+        check=check.__name__,
+        check_module=check.__module__,
+    )
+    stats = CheckStats(
+        wall_time=settings.ZOO_AUDITING_CHECK_TIMEOUT if is_timeout else 0,
+        cpu_time=0,
+        memory_delta=0,
+        results=0,
+        errors=int(not is_timeout),
+        timeouts=int(is_timeout),
+    )
+    return _get_unknown_results(check), stats, None
+
+
+def _run_measured(checks, context):
+    """Measure the checks, return a generator of their outcomes in order."""
+    pools = {"process": run_in_processes, "thread": run_in_threads}
     try:
-        issue = issue_repo.issues.get(kind_key=issue_key)
-    except Issue.DoesNotExist:
-        create_issue(issue_repo, issue_key, is_found, details=details)
-    else:
-        update_issue(issue, is_found, details=details)
+        run = pools[settings.ZOO_AUDITING_CHECK_POOL]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"ZOO_AUDITING_CHECK_POOL must be one of {', '.join(pools)}, "
+            f"not {settings.ZOO_AUDITING_CHECK_POOL!r}."
+        ) from None
+    return run(
+        measure,
+        [(check, context) for check in checks],
+        settings.ZOO_AUDITING_CHECK_WORKERS,
+        timeout=settings.ZOO_AUDITING_CHECK_TIMEOUT,
+    )
+
+
+def run_checks(checks, repository, fake_path, files=None, timings=None):
+    """Run the checks concurrently, yield their results in the order of ``checks``.
+
+    With ``ZOO_AUDITING_CHECK_POOL`` set to ``"process"``, the default, every
+    check runs in a process of its own, ``ZOO_AUDITING_CHECK_WORKERS`` at once,
+    see :func:`~zoo.base.processes.run_in_processes`. A check running for
+    longer than ``ZOO_AUDITING_CHECK_TIMEOUT`` seconds from its start is killed,
+    and all the kinds of issues its module reports are unknown results.
+
+    With ``ZOO_AUDITING_CHECK_POOL`` set to ``"thread"`` the checks run in
+    threads instead, see :func:`~zoo.base.processes.run_in_threads`. A check
+    running out of time is given up on then, but not killed. Any other pool is
+    :exc:`~django.core.exceptions.ImproperlyConfigured`.
+
+    Checks declaring the files they read aren't run again while their inputs
+    don't change, their results are reused, see :func:`get_fingerprints`.
+
+    The wall times of the checks that ran are put in ``timings``, if given, by
+    check name.
+    """
+    if not checks:
+        return
 
+    context = CheckContext(repository, fake_path, files)
+    # build the index once, before the checks share it
+    context.files  # pylint: disable=pointless-statement
+    metrics = CheckMetrics()
+    result_cache = CheckResultCache()
+    fingerprints = get_fingerprints(checks, context)
+    cached = result_cache.get_many(filter(None, fingerprints))
+    missed = [
+        check
+        for check, fingerprint in zip(checks, fingerprints)
+        if fingerprint not in cached
+    ]
 
-def check_repository(checks, repository, fake_path):
-    context = CheckContext(repository, fake_path)
-    for check in checks:
-        try:
-            for result in check(context):
-                # skip unknown results
-                if result.is_found is None:
-                    continue
+    outcomes = _run_measured(missed, context)
+    try:
+        for check, fingerprint in zip(checks, fingerprints):
+            name = get_check_name(check)
+            if check not in missed:
+                metrics.record_cache(name, is_hit=True)
+                results = [Result(*result) for result in cached[fingerprint]]
+                error = None
+            else:
+                results, stats, error = _get_check_outcome(
+                    check, repository, next(outcomes)
+                )
+                log.info(
+                    "auditing.check.stats",
+                    repo_id=repository.id,
+                    check=check.__name__,
+                    check_module=check.__module__,
+                    package=check.__module__.split(".")[0],
+                    **stats._asdict(),
+                )
+                metrics.record(name, stats)
+                if timings is not None:
+                    timings[name] = round(stats.wall_time, 3)
+                if fingerprint is not None:
+                    metrics.record_cache(name, is_hit=False)
+                    if error is None and not stats.timeouts and not stats.errors:
+                        result_cache.set(fingerprint, results)
 
-                if result.is_found:
+            for check_result in results:
+                if check_result.is_found:
                     log.info(
                         "auditing.check.result_found",
                         repo_id=repository.id,
                         check=check.__name__,
                         check_module=check.__module__,
-                        issue=result.issue_key,
+                        issue=check_result.issue_key,
                     )
+                yield check_result
+
+            if error is not None:
+                _log_check_error(check, repository, error)
+    finally:
+        outcomes.close()
+
+
+def _log_check_error(check, repository, error):
+    try:
+        raise error
+    except Exception:  # pylint: disable=broad-except
+        log.exception(
+            "auditing.check.error",
+            repo_id=repository.id,
+            check=check.__name__,
+            check_module=check.__module__,
+        )
+        with sentry_sdk.push_scope() as scope:
+            scope.fingerprint = [check.__module__, check.__name__]
+            sentry_sdk.capture_exception()
+
+
+def check_repository(checks, repository, fake_path, files=None):
+    for result in run_checks(checks, repository, fake_path, files):
+        # skip unknown results
+        if result.is_found is not None:
+            yield result
+
+
+def save_check_results(repository, results, seen_keys=None):
+    """Persist the results of a repository's checks with a few bulk queries.
+
+    The results apply in order to the issues of the repository, loaded at once:
+    an issue is created for a key seen the first time, otherwise its status
+    moves on, see :func:`determine_issue_status`, and its last check is updated.
+    Details are only kept for found issues. Without ``seen_keys`` the other
+    issues of the repository are left as they are, with them the issues whose
+    key isn't in ``seen_keys`` are marked deleted. Issues changing to new or
+    reopened are notified once the changes are committed.
+    """
+    now = arrow.utcnow().datetime
+    issues = {issue.kind_key: issue for issue in repository.issues.all()}
+    old_statuses = {issue.pk: issue.status for issue in issues.values()}
+    created, changed, checked = [], set(), set()
 
-                yield result
-        except:
-            log.exception(
-                "auditing.check.error",
-                repo_id=repository.id,
-                check=check.__name__,
-                check_module=check.__module__,
+    for issue_key, is_found, details in results:
+        # we ignore/clear details for not found (or fixed) issues
+        details = (details or {}) if is_found else {}
+        issue = issues.get(issue_key)
+        if issue is None:
+            issue = Issue(
+                repository=repository,
+                kind_key=issue_key,
+                status=(
+                    Issue.Status.NEW.value if is_found else Issue.Status.NOT_FOUND.value
+                ),
+                details=details,
+                last_check=now,
             )
-            with sentry_sdk.push_scope() as scope:
-                scope.fingerprint = [check.__module__, check.__name__]
-                sentry_sdk.capture_exception()
+            issues[issue_key] = issue
+            created.append(issue)
+            continue
 
+        status = determine_issue_status(is_found, issue.status)
+        if issue.pk is not None:
+            checked.add(issue.pk)
+            if status != issue.status or details != issue.details:
+                changed.add(issue_key)
+        issue.status = status
+        issue.details = details
+
+    with transaction.atomic():
+        Issue.objects.bulk_create(created, batch_size=ISSUES_BATCH_SIZE)
+        Issue.objects.bulk_update(
+            [issues[key] for key in changed],
+            ["status", "details"],
+            batch_size=ISSUES_BATCH_SIZE,
+        )
+        Issue.objects.filter(pk__in=checked).update(last_check=now, deleted=False)
+        if seen_keys is not None:
+            repository.issues.exclude(kind_key__in=seen_keys).update(deleted=True)
+
+    log.info(
+        "auditing.issues.saved",
+        repo_id=repository.id,
+        created=len(created),
+        changed=len(changed),
+        checked=len(checked),
+    )
 
-def run_checks_and_save_results(checks, repository, fake_path):
-    found_issues = set()
+    notify_status_changes(
+        issues[key]
+        for key in changed
+        if issues[key].status != old_statuses[issues[key].pk]
+    )
+
+
+def run_checks_and_save_results(checks, repository, fake_path, files=None):
+    seen_keys = set()
+    results = []
+    timings = {}
 
-    for result in check_repository(checks, repository, fake_path):
-        found_issues.add(result.issue_key)
-        save_check_result(repository, result.issue_key, result.is_found, result.details)
+    for result in run_checks(checks, repository, fake_path, files, timings):
+        # keep the issues of unknown results as they are
+        seen_keys.add(result.issue_key)
+        if result.is_found is not None:
+            results.append(result)
+
+    save_check_results(
+        repository, results, seen_keys=seen_keys if checks == CHECKS else None
+    )
 
-    if checks == CHECKS:
-        repository.issues.exclude(kind_key__in=found_issues).update(deleted=True)
+    # checks whose results were reused keep the timings of their last run
+    known = {get_check_name(check) for check in CHECKS} | set(timings)
+    repository.check_timings = {
+        name: wall_time
+        for name, wall_time in {**repository.check_timings, **timings}.items()
+        if name in known
+    }
+    repository.save(update_fields=["check_timings"])
@@ -2,13 +2,18 @@ import arrow
 import structlog
 from celery import shared_task
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Count
 
+from ..utils import get_snapshot_timestamp
+from . import notifications
 from .models import Issue, IssueCountByKindSnapshot, IssueCountByRepositorySnapshot
 from .utils import apply_patches, create_git_issue
 
 log = structlog.get_logger()
 
+SNAPSHOT_BATCH_SIZE = 1000
+
 
 @shared_task
 def bulk_create_git_issues(issues):
@@ -24,17 +29,27 @@ def bulk_apply_patches(issues):
         apply_patches(issue)
 
 
+@shared_task
+def send_slack_digest(channel):
+    notifications.SlackDigestQueue().deliver(channel)
+
+
 @shared_task
 def take_issue_table_snapshots():
-    issues = Issue.objects.all()
-    for row in issues.values("repository_id", "status").annotate(count=Count("*")):
-        snapshot = IssueCountByRepositorySnapshot(**row)
-        snapshot.full_clean()
-        snapshot.save()
-    for row in issues.values("kind_key", "status").annotate(count=Count("*")):
-        snapshot = IssueCountByKindSnapshot(**row)
-        snapshot.full_clean()
-        snapshot.save()
+    timestamp = get_snapshot_timestamp()
+    issues = Issue.objects.order_by()
+
+    with transaction.atomic():
+        for model, fields in [
+            (IssueCountByRepositorySnapshot, ("repository_id", "status")),
+            (IssueCountByKindSnapshot, ("kind_key", "status")),
+        ]:
+            rows = issues.values(*fields).annotate(count=Count("*"))
+            model.objects.filter(timestamp=timestamp).delete()
+            model.objects.bulk_create(
+                (model(timestamp=timestamp, **row) for row in rows.iterator()),
+                batch_size=SNAPSHOT_BATCH_SIZE,
+            )
 
 
 @shared_task
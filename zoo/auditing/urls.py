@@ -7,6 +7,7 @@ global_urls = [
     path("", views.AuditOverview.as_view(), name="audit_overview"),
     path("bulk_create/", views.open_bulk_git_issues, name="bulk_create_issues"),
     path("bulk_apply/", views.apply_bulk_patches, name="bulk_apply_patches"),
+    path("metrics/", views.check_metrics, name="check_metrics"),
     path(
         "<str:owner_slug>/", views.AuditOverview.as_view(), name="owned_audit_overview"
     ),
@@ -20,6 +21,7 @@ project_urls = [
 ]
 
 urlpatterns = [
+    path("admin/auditing/slowest-checks/", views.slowest_checks, name="slowest_checks"),
     path("auditing/", include(global_urls)),
     path(
         "<str:project_type>/<str:owner_slug>/<str:name_slug>/auditing/",
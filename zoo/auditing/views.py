@@ -1,12 +1,15 @@
+import hmac
 import itertools
 import json
 import tempfile
 from collections import OrderedDict, defaultdict
 
-from django.http import Http404, HttpResponseForbidden, JsonResponse
-from django.shortcuts import redirect
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.shortcuts import redirect, render
 from django.urls import reverse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import TemplateView
 
 from ..libraries.models import Library
@@ -15,6 +18,7 @@ from ..repos.utils import download_repository
 from ..services.models import Service
 from . import models, runner, tasks
 from .check_discovery import KINDS
+from .metrics import HISTOGRAMS, CheckMetrics, render_prometheus
 from .utils import PatchHandler, create_git_issue
 
 
@@ -177,7 +181,7 @@ class AuditReport(TemplateView):
         project = context["project"]
 
         if "force" in self.request.GET and project.repository:
-            pull(project.repository.remote_id, project.repository.provider)
+            pull(project.repository.remote_id, project.repository.provider, force=True)
             return redirect(
                 "audit_report",
                 self.kwargs["project_type"],
@@ -354,3 +358,30 @@ def wontfix_issue(request, project_type, owner_slug, name_slug, issue_pk):
     issue.save()
 
     return redirect("audit_report", project_type, owner_slug, name_slug)
+
+
+@require_GET
+def check_metrics(request):
+    """Histograms of the checks' costs, in the Prometheus text format."""
+    token = settings.ZOO_METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if not token or not hmac.compare_digest(authorization, f"Bearer {token}"):
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        render_prometheus(CheckMetrics().get_all()),
+        content_type="text/plain; version=0.0.4",
+    )
+
+
+@staff_member_required
+def slowest_checks(request):
+    return render(
+        request,
+        "admin/auditing/slowest_checks.html",
+        {
+            "title": "Slowest checks",
+            "checks": CheckMetrics().get_slowest(),
+            "max_bucket": HISTOGRAMS["wall_time"][-1],
+        },
+    )
@@ -17,13 +17,16 @@ class BaseConfig(AppConfig):
         from ..datacenters import tasks as datacenters_tasks
         from ..globalsearch import tasks as meilisearch_tasks
         from ..objectives import tasks as objective_tasks
+        from ..repos import scheduling as repos_scheduling
         from ..repos import tasks as repos_tasks
         from ..services import tasks as service_tasks
 
         # pylint: enable=import-outside-toplevel
 
         celery_app.add_periodic_task(timedelta(hours=1), repos_tasks.sync_repos)
-        celery_app.add_periodic_task(timedelta(hours=1), repos_tasks.schedule_pulls)
+        celery_app.add_periodic_task(
+            repos_scheduling.SCHEDULE_PERIOD, repos_tasks.schedule_pulls
+        )
         celery_app.add_periodic_task(timedelta(days=1), repos_tasks.sync_zoo_file)
         celery_app.add_periodic_task(
             timedelta(hours=1), service_tasks.schedule_sentry_sync
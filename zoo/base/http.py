@@ -1,8 +1,10 @@
 import requests
 from django.conf import settings
-from requests.adapters import HTTPAdapter
 from urllib3.util import Retry
 
+from .http_cache import CachingHTTPAdapter, DiskCacheStorage, RedisCacheStorage
+from .ratelimit import RateLimiter, ThrottlingHTTPAdapter
+
 
 def get_retry_object(retries=5, backoff_factor=0.1):
     """Create an instance of :obj:`urllib3.util.Retry`.
@@ -26,9 +28,31 @@ def get_requests_session():
     return session
 
 
-def requests_retry_session(retries=3, backoff_factor=0.1, session=None):
+def get_cache_storage():
+    """Storage of the HTTP cache configured with ``HTTP_CACHE_BACKEND``."""
+    if settings.HTTP_CACHE_BACKEND == "redis":
+        return RedisCacheStorage(settings.HTTP_CACHE_MAX_SIZE)
+    if settings.HTTP_CACHE_BACKEND == "disk":
+        return DiskCacheStorage(settings.HTTP_CACHE_ROOT, settings.HTTP_CACHE_MAX_SIZE)
+    return None
+
+
+def get_rate_limiter():
+    """Limiter of requests to the provider APIs, if ``RATE_LIMIT_ENABLED``."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    return RateLimiter(settings.RATE_LIMITS, max_wait=settings.RATE_LIMIT_MAX_WAIT)
+
+
+def requests_retry_session(
+    retries=3, backoff_factor=0.1, session=None, cache=None, limiter=None
+):
     """Session which automatically retries requests for 5xx HTTP statuses.
 
+    Responses are cached in ``cache``, a storage like the one returned by
+    :func:`get_cache_storage`, and revalidated with conditional requests.
+    Requests are paced by ``limiter``, see :func:`get_rate_limiter`.
+
     See https://www.peterbe.com/plog/best-practice-with-retries-with-requests
 
     Usage example:
@@ -47,10 +71,22 @@ def requests_retry_session(retries=3, backoff_factor=0.1, session=None):
     """
     session = session or get_requests_session()
     max_retries = get_retry_object(retries=retries, backoff_factor=backoff_factor)
-    adapter = HTTPAdapter(max_retries=max_retries)
+    if cache is not None:
+        adapter = CachingHTTPAdapter(cache, limiter=limiter, max_retries=max_retries)
+    else:
+        adapter = ThrottlingHTTPAdapter(limiter=limiter, max_retries=max_retries)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
 
 
-session = requests_retry_session()
+limiter = get_rate_limiter()
+session = requests_retry_session(cache=get_cache_storage(), limiter=limiter)
+
+
+def get_cache_stats(session=session):
+    """Per host hits, misses and saved bytes of the cache of ``session``."""
+    adapter = session.get_adapter("https://")
+    if not isinstance(adapter, CachingHTTPAdapter):
+        return {}
+    return adapter.stats.as_dict()
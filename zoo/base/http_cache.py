@@ -0,0 +1,263 @@
+import base64
+import hashlib
+import json
+import os
+from collections import Counter, defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import structlog
+from redis.exceptions import RedisError
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import redis
+from .ratelimit import ThrottlingHTTPAdapter
+
+log = structlog.get_logger()
+
+# request headers that change the response, they're part of the cache key
+KEY_HEADERS = ("Accept", "Authorization", "PRIVATE-TOKEN")
+# headers of a 304 response that mustn't replace the stored ones
+NOT_MODIFIED_SKIP_HEADERS = ("Content-Length", "Content-Encoding", "Transfer-Encoding")
+
+
+def _cache_key(request):
+    parts = [request.method, request.url] + [
+        request.headers.get(header, "") for header in KEY_HEADERS
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def _is_cacheable(response):
+    cache_control = response.headers.get("Cache-Control", "").lower()
+    return (
+        response.status_code == 200
+        and ("ETag" in response.headers or "Last-Modified" in response.headers)
+        and "no-store" not in cache_control
+        and response.headers.get("Vary", "").strip() != "*"
+    )
+
+
+class RedisCacheStorage:
+    """Cached responses in Redis, the least recently used ones are evicted."""
+
+    prefix = "zoo:http-cache"
+
+    def __init__(self, max_size, connection=None):
+        self.max_size = max_size
+        self._connection = connection
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = redis.get_connection()
+        return self._connection
+
+    def _key(self, key):
+        return f"{self.prefix}:entry:{key}"
+
+    def get(self, key):
+        pipeline = self.connection.pipeline()
+        pipeline.get(self._key(key))
+        # a counter orders the uses, unlike timestamps it never ties
+        pipeline.incr(f"{self.prefix}:clock")
+        value, clock = pipeline.execute()
+        if value is None:
+            return None
+        self.connection.zadd(f"{self.prefix}:lru", {key: clock})
+        return value
+
+    def set(self, key, value):
+        size = len(value)
+        clock = self.connection.incr(f"{self.prefix}:clock")
+        pipeline = self.connection.pipeline()
+        pipeline.set(self._key(key), value)
+        pipeline.zadd(f"{self.prefix}:lru", {key: clock})
+        pipeline.hget(f"{self.prefix}:sizes", key)
+        pipeline.hset(f"{self.prefix}:sizes", key, size)
+        _, _, previous_size, _ = pipeline.execute()
+        total = self.connection.incrby(
+            f"{self.prefix}:total", size - int(previous_size or 0)
+        )
+
+        if total > self.max_size:
+            self._evict(total)
+
+    def _evict(self, total):
+        while total > self.max_size:
+            oldest = [
+                key.decode()
+                for key in self.connection.zrange(f"{self.prefix}:lru", 0, 99)
+            ]
+            if not oldest:
+                break
+            sizes = self.connection.hmget(f"{self.prefix}:sizes", oldest)
+
+            keys, freed = [], 0
+            for key, size in zip(oldest, sizes):
+                if total - freed <= self.max_size:
+                    break
+                keys.append(key)
+                freed += int(size or 0)
+
+            pipeline = self.connection.pipeline()
+            pipeline.delete(*(self._key(key) for key in keys))
+            pipeline.zrem(f"{self.prefix}:lru", *keys)
+            pipeline.hdel(f"{self.prefix}:sizes", *keys)
+            pipeline.decrby(f"{self.prefix}:total", freed)
+            total = pipeline.execute()[-1]
+
+
+class DiskCacheStorage:
+    """Cached responses in files, the least recently used ones are evicted.
+
+    The modification time of a file marks its last use.
+    """
+
+    def __init__(self, root, max_size):
+        self.root = Path(root)
+        self.max_size = max_size
+        self._total = None
+
+    def _path(self, key):
+        return self.root / key[:2] / key
+
+    def _entries(self):
+        return [
+            (entry.path, entry.stat())
+            for directory in os.scandir(self.root)
+            if directory.is_dir()
+            for entry in os.scandir(directory.path)
+        ]
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            value = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self._total is None:
+            self._total = sum(stat.st_size for _, stat in self._entries())
+
+        try:
+            self._total -= path.stat().st_size
+        except FileNotFoundError:
+            pass
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_bytes(value)
+        temp_path.replace(path)
+        self._total += len(value)
+
+        if self._total > self.max_size:
+            self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        self._total = sum(stat.st_size for _, stat in entries)
+
+        for path, stat in entries:
+            if self._total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self._total -= stat.st_size
+
+
+class CacheStats:
+    """Hits, misses and bytes not downloaded thanks to the cache, per host."""
+
+    def __init__(self):
+        self._hosts = defaultdict(Counter)
+
+    def record(self, url, hit, size=0):
+        counter = self._hosts[urlsplit(url).netloc]
+        counter["hits" if hit else "misses"] += 1
+        if hit:
+            counter["bytes_saved"] += size
+
+    def as_dict(self):
+        return {host: dict(counter) for host, counter in self._hosts.items()}
+
+    def log(self):
+        for host, counter in self._hosts.items():
+            log.info("http.cache.stats", host=host, **counter)
+
+
+class CachingHTTPAdapter(ThrottlingHTTPAdapter):
+    """Revalidate cached responses with conditional requests.
+
+    Successful GET responses with an ``ETag`` or ``Last-Modified`` header are
+    stored. The next request for the same URL sends them as ``If-None-Match``
+    and ``If-Modified-Since``, and when the server answers ``304 Not Modified``,
+    the stored body is returned. Streamed requests bypass the cache. Failures
+    of the storage are logged and the request goes on uncached.
+    """
+
+    def __init__(self, storage, *args, **kwargs):
+        self.storage = storage
+        self.stats = CacheStats()
+        super().__init__(*args, **kwargs)
+
+    def _load(self, key):
+        try:
+            value = self.storage.get(key)
+        except (OSError, RedisError) as err:
+            log.warning("http.cache.error", error=repr(err))
+            return None
+        return json.loads(value) if value is not None else None
+
+    def _store(self, key, response):
+        value = json.dumps(
+            {
+                "reason": response.reason,
+                "headers": dict(response.headers),
+                "body": base64.b64encode(response.content).decode(),
+            }
+        ).encode()
+        try:
+            self.storage.set(key, value)
+        except (OSError, RedisError) as err:
+            log.warning("http.cache.error", error=repr(err))
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != "GET" or stream:
+            return super().send(request, stream=stream, **kwargs)
+
+        key = _cache_key(request)
+        entry = self._load(key)
+        if entry is not None:
+            headers = CaseInsensitiveDict(entry["headers"])
+            if "ETag" in headers:
+                request.headers["If-None-Match"] = headers["ETag"]
+            if "Last-Modified" in headers:
+                request.headers["If-Modified-Since"] = headers["Last-Modified"]
+
+        response = super().send(request, stream=stream, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            body = base64.b64decode(entry["body"])
+            for header, value in response.headers.items():
+                if header not in NOT_MODIFIED_SKIP_HEADERS:
+                    headers[header] = value
+
+            response.status_code = 200
+            response.reason = entry["reason"]
+            response.headers = headers
+            response.encoding = get_encoding_from_headers(headers)
+            response._content = body
+            self.stats.record(request.url, hit=True, size=len(body))
+            return response
+
+        self.stats.record(request.url, hit=False)
+        if _is_cacheable(response):
+            self._store(key, response)
+        return response
@@ -0,0 +1,166 @@
+import os
+import queue
+import signal
+import threading
+import time
+
+import billiard
+from billiard.connection import wait
+
+
+class TimeLimitExceeded(Exception):
+    """The process ran for longer than allowed and was killed."""
+
+
+class ProcessLostError(Exception):
+    """The process exited without sending a result."""
+
+
+def _run(connection, function, args, timeout):
+    # the kernel kills the process at its deadline, even when stuck outside Python
+    signal.signal(signal.SIGALRM, signal.SIG_DFL)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        outcome = (None, function(*args))
+    except Exception as err:  # pylint: disable=broad-except
+        outcome = (err, None)
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    connection.send(outcome)
+    connection.close()
+
+
+def _kill(process):
+    try:
+        os.kill(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.join()
+
+
+def _get_time_limit_error(timeout):
+    return TimeLimitExceeded(f"killed after {timeout} seconds")
+
+
+def _get_exit_error(process, timeout):
+    if process.exitcode == -signal.SIGALRM:
+        return _get_time_limit_error(timeout)
+    return ProcessLostError(f"exit code {process.exitcode}")
+
+
+def run_in_processes(function, args_list, processes, timeout):
+    """Call ``function`` with each of ``args_list`` in a process of its own.
+
+    Yield the ``(error, result)`` of the calls in the order of ``args_list``.
+    At most ``processes`` calls run at once, each in a forked process, so the
+    function and its arguments aren't pickled, only the results are. Unlike the
+    ``multiprocessing`` ones, the processes of billiard can be forked from
+    Celery's daemonic prefork workers.
+
+    A process running for longer than ``timeout`` seconds from its start is
+    killed, by its own timer or else by the caller, and its error is
+    :class:`TimeLimitExceeded`. The processes still running when the generator
+    is closed are killed too.
+    """
+    context = billiard.get_context("fork")
+    processes = max(processes, 1)
+    waiting = list(enumerate(args_list))[::-1]
+    running = {}
+    outcomes = {}
+
+    try:
+        for index in range(len(args_list)):
+            while index not in outcomes:
+                while waiting and len(running) < processes:
+                    started, args = waiting.pop()
+                    reader, writer = context.Pipe(duplex=False)
+                    process = context.Process(
+                        target=_run,
+                        args=(writer, function, args, timeout),
+                        daemon=True,
+                    )
+                    process.start()
+                    writer.close()
+                    running[reader] = (started, process, time.monotonic() + timeout)
+
+                next_deadline = min(deadline for _, _, deadline in running.values())
+                for reader in wait(
+                    list(running), max(next_deadline - time.monotonic(), 0)
+                ):
+                    done, process, _ = running.pop(reader)
+                    try:
+                        outcomes[done] = reader.recv()
+                    except EOFError:
+                        process.join()
+                        outcomes[done] = (_get_exit_error(process, timeout), None)
+                    reader.close()
+                    process.join()
+
+                now = time.monotonic()
+                for reader, (done, process, deadline) in list(running.items()):
+                    if deadline <= now:
+                        del running[reader]
+                        _kill(process)
+                        reader.close()
+                        outcomes[done] = (_get_time_limit_error(timeout), None)
+
+            yield outcomes.pop(index)
+    finally:
+        for reader, (_, process, _) in running.items():
+            _kill(process)
+            reader.close()
+
+
+def _call(done, index, function, args):
+    try:
+        outcome = (None, function(*args))
+    except Exception as err:  # pylint: disable=broad-except
+        outcome = (err, None)
+    done.put((index, outcome))
+
+
+def run_in_threads(function, args_list, threads, timeout):
+    """Call ``function`` with each of ``args_list`` in a thread of its own.
+
+    Works like :func:`run_in_processes`, but the calls share the memory of the
+    process and nothing is forked or pickled. Threads can't be killed, a call
+    running for longer than ``timeout`` seconds from its start is given up on
+    instead: its error is :class:`TimeLimitExceeded`, its result is dropped
+    once it ends, and another thread takes its place meanwhile.
+    """
+    done = queue.Queue()
+    threads = max(threads, 1)
+    waiting = list(enumerate(args_list))[::-1]
+    running = {}
+    outcomes = {}
+
+    for index in range(len(args_list)):
+        while index not in outcomes:
+            while waiting and len(running) < threads:
+                started, args = waiting.pop()
+                threading.Thread(
+                    target=_call, args=(done, started, function, args), daemon=True
+                ).start()
+                running[started] = time.monotonic() + timeout
+
+            next_deadline = min(running.values())
+            try:
+                finished, outcome = done.get(
+                    timeout=max(next_deadline - time.monotonic(), 0)
+                )
+            except queue.Empty:
+                pass
+            else:
+                # the calls given up on already have their outcome
+                if running.pop(finished, None) is not None:
+                    outcomes[finished] = outcome
+
+            now = time.monotonic()
+            for started, deadline in list(running.items()):
+                if deadline <= now:
+                    del running[started]
+                    outcomes[started] = (
+                        TimeLimitExceeded(f"gave up after {timeout} seconds"),
+                        None,
+                    )
+
+        yield outcomes.pop(index)
@@ -0,0 +1,230 @@
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import structlog
+from redis.exceptions import RedisError, WatchError
+from requests.adapters import HTTPAdapter
+
+from . import redis
+
+log = structlog.get_logger()
+
+# a bucket holds tokens for this many seconds of requests at the allowed rate
+BURST_SECONDS = 10
+# buckets of hosts not called for this long are dropped
+BUCKET_TTL = 24 * 60 * 60
+# resets below this are seconds from now, above it UNIX timestamps
+RESET_DELTA_LIMIT = 10**9
+
+
+def get_bucket_name(url):
+    """Name of the bucket counting requests to ``url``.
+
+    GitHub limits GraphQL queries separately from the REST API on the same host.
+    Default ports are left out, PyGithub gives them explicitly.
+    """
+    parts = urlsplit(url)
+    host = parts.netloc
+    if (parts.scheme, parts.port) in (("http", 80), ("https", 443)):
+        host = parts.hostname
+    if parts.path.rstrip("/").endswith("/graphql"):
+        return f"{host}/graphql"
+    return host
+
+
+def _parse_reset(value, now):
+    reset = float(value)
+    return now + reset if reset < RESET_DELTA_LIMIT else reset
+
+
+def _parse_retry_after(value, now):
+    try:
+        return now + float(value)
+    except ValueError:
+        return parsedate_to_datetime(value).timestamp()
+
+
+class RateLimiter:
+    """Token buckets per host, shared by all workers through Redis.
+
+    Hosts start with the requests per hour configured in ``rates``, hosts
+    without one aren't limited until they report their limits. The rate adapts
+    to the ``X-RateLimit-Remaining`` and ``X-RateLimit-Reset`` (or the
+    ``RateLimit-*``) response headers, spreading the remaining requests until
+    the reset. An exhausted limit or ``Retry-After`` blocks the host until
+    the given time. Callers never wait longer than ``max_wait`` seconds.
+    """
+
+    prefix = "zoo:ratelimit"
+
+    def __init__(self, rates=None, max_wait=300, connection=None):
+        self.rates = rates or {}
+        self.max_wait = max_wait
+        self._connection = connection
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = redis.get_connection()
+        return self._connection
+
+    def _key(self, bucket):
+        return f"{self.prefix}:{bucket}"
+
+    def _take(self, bucket, now):
+        """Take a token, return how long to wait if there's none."""
+        key = self._key(bucket)
+        with self.connection.pipeline() as pipeline:
+            while True:
+                try:
+                    pipeline.watch(key)
+                    state = {
+                        field.decode(): float(value)
+                        for field, value in pipeline.hgetall(key).items()
+                    }
+
+                    if state.get("blocked_until", 0) > now:
+                        return state["blocked_until"] - now
+
+                    if state.get("reset", 0) > now:
+                        rate = state["rate"]
+                    else:
+                        rate = float(self.rates.get(bucket, 0)) / 3600
+                    if not rate:
+                        return 0
+
+                    capacity = max(1, rate * BURST_SECONDS)
+                    elapsed = now - state.get("updated_at", now)
+                    tokens = min(
+                        capacity, state.get("tokens", capacity) + elapsed * rate
+                    )
+                    wait = 0 if tokens >= 1 else (1 - tokens) / rate
+
+                    pipeline.multi()
+                    pipeline.hset(
+                        key,
+                        mapping={
+                            "tokens": tokens - 1 if wait == 0 else tokens,
+                            "updated_at": now,
+                        },
+                    )
+                    pipeline.expire(key, BUCKET_TTL)
+                    pipeline.execute()
+                    return wait
+                except WatchError:
+                    continue
+
+    def acquire(self, bucket):
+        """Block until a request to ``bucket`` is allowed."""
+        started_at = time.time()
+        while True:
+            now = time.time()
+            try:
+                wait = self._take(bucket, now)
+            except RedisError as err:
+                log.warning("ratelimit.error", bucket=bucket, error=repr(err))
+                return
+
+            if wait <= 0:
+                return
+
+            waited = now - started_at
+            if waited + wait > self.max_wait:
+                log.warning("ratelimit.max_wait", bucket=bucket, wait=wait)
+                return
+            log.debug("ratelimit.wait", bucket=bucket, wait=wait)
+            time.sleep(wait)
+
+    def try_acquire(self, bucket):
+        """Take a token without waiting, return how long to wait if there's none.
+
+        Returns 0 once the request to ``bucket`` is allowed.
+        """
+        try:
+            return self._take(bucket, time.time())
+        except RedisError as err:
+            log.warning("ratelimit.error", bucket=bucket, error=repr(err))
+            return 0
+
+    def update(self, bucket, remaining, reset):
+        """Spread the ``remaining`` requests until ``reset``, a UNIX timestamp."""
+        now = time.time()
+        if remaining > 0:
+            mapping = {"rate": remaining / max(reset - now, 1), "reset": reset}
+        else:
+            mapping = {"blocked_until": reset}
+        self._update(bucket, mapping)
+
+    def block(self, bucket, until):
+        self._update(bucket, {"blocked_until": until})
+
+    def _update(self, bucket, mapping):
+        key = self._key(bucket)
+        try:
+            pipeline = self.connection.pipeline()
+            pipeline.hset(key, mapping=mapping)
+            pipeline.expire(key, BUCKET_TTL)
+            pipeline.execute()
+        except RedisError as err:
+            log.warning("ratelimit.error", bucket=bucket, error=repr(err))
+
+    def update_from_response(self, bucket, response):
+        """Adapt to the limits reported by ``response``.
+
+        Returns the UNIX timestamp when a rate limited request may be retried,
+        ``None`` if the request wasn't rate limited.
+        """
+        now = time.time()
+        headers = response.headers
+        remaining = headers.get(
+            "X-RateLimit-Remaining", headers.get("RateLimit-Remaining")
+        )
+        reset = headers.get("X-RateLimit-Reset", headers.get("RateLimit-Reset"))
+        if remaining is not None and reset is not None:
+            self.update(bucket, int(remaining), _parse_reset(reset, now))
+
+        if response.status_code not in (403, 429):
+            return None
+        if "Retry-After" in headers:
+            retry_at = _parse_retry_after(headers["Retry-After"], now)
+        elif remaining == "0" and reset is not None:
+            retry_at = _parse_reset(reset, now)
+        else:
+            return None  # forbidden for other reasons
+
+        self.block(bucket, retry_at)
+        return retry_at
+
+
+class ThrottlingHTTPAdapter(HTTPAdapter):
+    """Send requests at the pace allowed by a :class:`RateLimiter`.
+
+    Requests rejected by the rate limit are retried, up to ``rate_limit_retries``
+    times, once the host allows it again. Without ``limiter`` this is a plain
+    :class:`requests.adapters.HTTPAdapter`.
+    """
+
+    def __init__(self, *args, limiter=None, rate_limit_retries=2, **kwargs):
+        self.limiter = limiter
+        self.rate_limit_retries = rate_limit_retries
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if self.limiter is None:
+            return super().send(request, **kwargs)
+
+        bucket = get_bucket_name(request.url)
+        for attempt in range(self.rate_limit_retries + 1):
+            self.limiter.acquire(bucket)
+            response = super().send(request, **kwargs)
+            retry_at = self.limiter.update_from_response(bucket, response)
+
+            if retry_at is None or attempt == self.rate_limit_retries:
+                break
+            if retry_at - time.time() > self.limiter.max_wait:
+                break
+            log.info("ratelimit.retry", bucket=bucket, retry_at=retry_at)
+            response.close()
+
+        return response
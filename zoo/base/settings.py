@@ -29,9 +29,15 @@ env = environ.Env(
     ZOO_DATADOG_APP_KEY=(str, ""),
     ZOO_SLACK_TOKEN=(str, None),
     ZOO_SLACK_URL=(str, ""),
+    ZOO_SLACK_DIGEST_WINDOW=(int, 60),
+    ZOO_SLACK_DIGEST_MAX_LINES=(int, 50),
+    ZOO_SLACK_DIGEST_RATE_LIMIT=(int, 3600),
     ZOO_GITHUB_TOKEN=(str, ""),
+    ZOO_GITHUB_GRAPHQL_URL=(str, "https://api.github.com/graphql"),
+    ZOO_GITHUB_WEBHOOK_SECRET=(str, ""),
     ZOO_GITLAB_URL=(str, ""),
     ZOO_GITLAB_TOKEN=(str, ""),
+    ZOO_GITLAB_WEBHOOK_SECRET=(str, ""),
     ZOO_GITLAB_DB_URL=(str, ""),
     ZOO_USER_AGENT=(str, "zoo/{version}" if version else "zoo"),
     ZOO_PAGERDUTY_TOKEN=(str, None),
@@ -45,8 +51,36 @@ env = environ.Env(
     ZOO_SENTRY_API_KEY=(str, None),
     ZOO_SYNC_REPOS_SKIP_FORKS=(bool, False),
     ZOO_SYNC_REPOS_SKIP_PERSONAL=(bool, False),
+    ZOO_SYNC_REPOS_FULL_INTERVAL_HOURS=(int, 24),
+    ZOO_PULL_BUDGET_PER_HOUR=(int, 2000),
+    ZOO_PULL_DEBOUNCE_SECONDS=(int, 60),
+    ZOO_REPO_DETAILS_SOFT_TTL=(int, 5 * 60),
+    ZOO_REPO_DETAILS_HARD_TTL=(int, 7 * 24 * 60 * 60),
+    ZOO_FLEET_PULL_WORKERS=(int, 8),
+    ZOO_FLEET_PULL_CONCURRENCY=(dict, {}),
+    ZOO_OPENAPI_PARSE_WORKERS=(int, 4),
+    ZOO_OPENAPI_PARSE_TIMEOUT=(int, 30),
+    ZOO_ANALYZER_TIMEOUT=(int, 300),
+    ZOO_FETCH_BACKEND=(str, "archive"),
+    ZOO_GIT_MIRROR_ROOT=(str, "/tmp/zoo/mirrors"),
+    ZOO_GIT_MIRROR_MAX_SIZE=(int, 10 * 1024 * 1024 * 1024),
+    ZOO_GIT_MIRROR_TIMEOUT=(int, 10 * 60),  # seconds per git command
+    ZOO_HTTP_CACHE_BACKEND=(str, ""),
+    ZOO_HTTP_CACHE_ROOT=(str, "/tmp/zoo/http-cache"),
+    ZOO_HTTP_CACHE_MAX_SIZE=(int, 512 * 1024 * 1024),
+    ZOO_PYPI_URL=(str, "https://pypi.org/pypi"),
+    ZOO_PYPI_CACHE_TTL=(int, 24 * 60 * 60),
+    ZOO_PYPI_FETCH_WORKERS=(int, 8),
+    ZOO_RATE_LIMIT_ENABLED=(bool, False),
+    ZOO_RATE_LIMITS=(dict, {}),
+    ZOO_RATE_LIMIT_MAX_WAIT=(int, 300),
     ZOO_AUDITING_CHECKS=(list, []),
     ZOO_AUDITING_DROP_ISSUES=(int, 7),
+    ZOO_AUDITING_CHECK_POOL=(str, "process"),  # process or thread
+    ZOO_AUDITING_CHECK_WORKERS=(int, 4),
+    ZOO_AUDITING_CHECK_TIMEOUT=(int, 120),
+    ZOO_AUDITING_RESULT_CACHE_TTL=(int, 7 * 24 * 60 * 60),
+    ZOO_METRICS_TOKEN=(str, ""),
     ZOO_SONARQUBE_URL=(str, None),
     ZOO_SONARQUBE_TOKEN=(str, None),
     ZOO_YAML_FILE=(str, ".zoo.yml"),
@@ -209,6 +243,8 @@ STRONGHOLD_PUBLIC_URLS = (
     r"^/admin.*?$",  # let Django manage auth for /admin
     r"^/robots.txt$",
     r"^/ping$",
+    r"^/repos/webhooks/",  # authenticated by the webhook secrets
+    r"^/auditing/metrics/$",  # authenticated by ZOO_METRICS_TOKEN
     ZOO_API_URL,
 )
 
@@ -220,6 +256,7 @@ REDIS_CACHE_URL = env("ZOO_REDIS_CACHE_URL")
 DATADOG_API_KEY = env("ZOO_DATADOG_API_KEY")
 DATADOG_APP_KEY = env("ZOO_DATADOG_APP_KEY")
 GITLAB_TOKEN = env("ZOO_GITLAB_TOKEN")
+GITLAB_WEBHOOK_SECRET = env("ZOO_GITLAB_WEBHOOK_SECRET")
 GITLAB_DB_URL = env("ZOO_GITLAB_DB_URL")
 PAGERDUTY_TOKEN = env("ZOO_PAGERDUTY_TOKEN")
 PAGERDUTY_URL = env("ZOO_PAGERDUTY_URL")
@@ -228,6 +265,10 @@ PINGDOM_PASS = env("ZOO_PINGDOM_PASS")
 PINGDOM_APP_KEY = env("ZOO_PINGDOM_APP_KEY")
 SLACK_URL = env("ZOO_SLACK_URL")
 SLACK_TOKEN = env("ZOO_SLACK_TOKEN")
+SLACK_DIGEST_WINDOW = env("ZOO_SLACK_DIGEST_WINDOW")
+SLACK_DIGEST_MAX_LINES = env("ZOO_SLACK_DIGEST_MAX_LINES")
+# digests per hour, sent by all the workers together
+SLACK_DIGEST_RATE_LIMIT = env("ZOO_SLACK_DIGEST_RATE_LIMIT")
 
 SENTRY_URL = env("ZOO_SENTRY_URL")
 SENTRY_ORGANIZATION = env("ZOO_SENTRY_ORGANIZATION")
@@ -241,11 +282,18 @@ sentry_sdk.init(
 
 
 GITHUB_TOKEN = env("ZOO_GITHUB_TOKEN")
+GITHUB_WEBHOOK_SECRET = env("ZOO_GITHUB_WEBHOOK_SECRET")
+GITHUB_GRAPHQL_URL = env("ZOO_GITHUB_GRAPHQL_URL")
 SONARQUBE_URL = env("ZOO_SONARQUBE_URL")
 SONARQUBE_TOKEN = env("ZOO_SONARQUBE_TOKEN")
 
 ZOO_AUDITING_CHECKS = env("ZOO_AUDITING_CHECKS")
 ZOO_AUDITING_DROP_ISSUES = env("ZOO_AUDITING_DROP_ISSUES")
+ZOO_AUDITING_CHECK_POOL = env("ZOO_AUDITING_CHECK_POOL")
+ZOO_AUDITING_CHECK_WORKERS = env("ZOO_AUDITING_CHECK_WORKERS")
+ZOO_AUDITING_CHECK_TIMEOUT = env("ZOO_AUDITING_CHECK_TIMEOUT")
+ZOO_AUDITING_RESULT_CACHE_TTL = env("ZOO_AUDITING_RESULT_CACHE_TTL")
+ZOO_METRICS_TOKEN = env("ZOO_METRICS_TOKEN")
 
 ZOO_YAML_FILE = env("ZOO_YAML_FILE")
 ZOO_YAML_DEFAULT_REF = env("ZOO_YAML_DEFAULT_REF")
@@ -267,6 +315,38 @@ GCP_SERVICE_KEY = env("GCP_SERVICE_KEY")
 
 SYNC_REPOS_SKIP_FORKS = env("ZOO_SYNC_REPOS_SKIP_FORKS")
 SYNC_REPOS_SKIP_PERSONAL = env("ZOO_SYNC_REPOS_SKIP_PERSONAL")
+SYNC_REPOS_FULL_INTERVAL_HOURS = env("ZOO_SYNC_REPOS_FULL_INTERVAL_HOURS")
+
+PULL_BUDGET_PER_HOUR = env("ZOO_PULL_BUDGET_PER_HOUR")
+PULL_DEBOUNCE_SECONDS = env("ZOO_PULL_DEBOUNCE_SECONDS")
+
+REPO_DETAILS_SOFT_TTL = env("ZOO_REPO_DETAILS_SOFT_TTL")
+REPO_DETAILS_HARD_TTL = env("ZOO_REPO_DETAILS_HARD_TTL")
+
+FLEET_PULL_WORKERS = env("ZOO_FLEET_PULL_WORKERS")
+FLEET_PULL_CONCURRENCY = env("ZOO_FLEET_PULL_CONCURRENCY")
+
+OPENAPI_PARSE_WORKERS = env("ZOO_OPENAPI_PARSE_WORKERS")
+OPENAPI_PARSE_TIMEOUT = env("ZOO_OPENAPI_PARSE_TIMEOUT")
+ANALYZER_TIMEOUT = env("ZOO_ANALYZER_TIMEOUT")
+
+FETCH_BACKEND = env("ZOO_FETCH_BACKEND")
+GIT_MIRROR_ROOT = env("ZOO_GIT_MIRROR_ROOT")
+GIT_MIRROR_MAX_SIZE = env("ZOO_GIT_MIRROR_MAX_SIZE")
+GIT_MIRROR_TIMEOUT = env("ZOO_GIT_MIRROR_TIMEOUT")
+
+HTTP_CACHE_BACKEND = env("ZOO_HTTP_CACHE_BACKEND")
+HTTP_CACHE_ROOT = env("ZOO_HTTP_CACHE_ROOT")
+HTTP_CACHE_MAX_SIZE = env("ZOO_HTTP_CACHE_MAX_SIZE")
+
+PYPI_URL = env("ZOO_PYPI_URL")
+PYPI_CACHE_TTL = env("ZOO_PYPI_CACHE_TTL")
+PYPI_FETCH_WORKERS = env("ZOO_PYPI_FETCH_WORKERS")
+
+# requests per hour by host, e.g. ZOO_RATE_LIMITS=api.github.com=5000
+RATE_LIMIT_ENABLED = env("ZOO_RATE_LIMIT_ENABLED")
+RATE_LIMITS = env("ZOO_RATE_LIMITS")
+RATE_LIMIT_MAX_WAIT = env("ZOO_RATE_LIMIT_MAX_WAIT")
 
 REMOTE_DATA_OWNERS = env("ZOO_REMOTE_DATA_OWNERS")
 
@@ -0,0 +1,122 @@
+import json
+import time
+
+import structlog
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from redis.exceptions import RedisError
+from requests import RequestException
+
+from ..base import redis
+from . import github
+from .exceptions import RepositoryNotFoundError
+from .models import Provider, Repository
+from .utils import get_scm_module
+
+log = structlog.get_logger()
+
+
+def fetch_details(provider, remote_id):
+    """Ask the provider for the details shown on the service page.
+
+    GitHub repositories are read with GraphQL, or with the REST API when the
+    query fails. Raises :class:`RepositoryNotFoundError` if the repository
+    doesn't exist.
+    """
+    repository = Repository.objects.filter(
+        provider=provider, remote_id=remote_id
+    ).first()
+
+    if provider == Provider.GITHUB.value and repository is not None:
+        # one GraphQL query instead of a REST call per statistic
+        try:
+            metadata = github.get_repositories_metadata([str(repository)])
+        except RequestException as err:
+            log.warning(
+                "repos.details.graphql_error", remote_id=remote_id, error=repr(err)
+            )
+        else:
+            if metadata[str(repository)] is None:
+                raise RepositoryNotFoundError
+            return metadata[str(repository)]["details"]
+
+    return get_scm_module(provider).get_project_details(remote_id)
+
+
+class DetailsCache:
+    """Repository details kept in Redis, served stale while they're refreshed.
+
+    Entries younger than ``soft_ttl`` seconds are fresh. Older ones are still
+    served, but :meth:`claim_refresh` lets one caller queue a refresh for them
+    in the background. Entries not refreshed for ``hard_ttl`` seconds expire.
+    """
+
+    prefix = "zoo:repo-details"
+
+    def __init__(self, soft_ttl=None, hard_ttl=None, connection=None):
+        self.soft_ttl = (
+            soft_ttl if soft_ttl is not None else settings.REPO_DETAILS_SOFT_TTL
+        )
+        self.hard_ttl = (
+            hard_ttl if hard_ttl is not None else settings.REPO_DETAILS_HARD_TTL
+        )
+        self._connection = connection
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = redis.get_connection()
+        return self._connection
+
+    def _key(self, provider, remote_id):
+        return f"{self.prefix}:{provider}:{remote_id}"
+
+    def get(self, provider, remote_id):
+        """Return the cached ``(details, is_stale)``, ``(None, True)`` on a miss."""
+        try:
+            cached = self.connection.get(self._key(provider, remote_id))
+        except RedisError as err:
+            log.warning("repos.details.cache_error", error=repr(err))
+            return None, True
+
+        if cached is None:
+            return None, True
+
+        entry = json.loads(cached)
+        return entry["details"], time.time() - entry["fetched_at"] > self.soft_ttl
+
+    def set(self, provider, remote_id, details):
+        entry = {"details": details, "fetched_at": time.time()}
+        try:
+            self.connection.set(
+                self._key(provider, remote_id),
+                json.dumps(entry, cls=DjangoJSONEncoder),
+                ex=self.hard_ttl,
+            )
+        except RedisError as err:
+            log.warning("repos.details.cache_error", error=repr(err))
+
+    def delete(self, provider, remote_id):
+        try:
+            self.connection.delete(self._key(provider, remote_id))
+        except RedisError as err:
+            log.warning("repos.details.cache_error", error=repr(err))
+
+    def claim_refresh(self, provider, remote_id):
+        """Whether the caller should refresh the entry, only one in ``soft_ttl`` is."""
+        key = f"{self._key(provider, remote_id)}:refresh"
+        try:
+            return bool(self.connection.set(key, 1, nx=True, ex=self.soft_ttl))
+        except RedisError as err:
+            log.warning("repos.details.cache_error", error=repr(err))
+            return False
+
+    def refresh(self, provider, remote_id):
+        """Fetch the details and store them, forget repositories that are gone."""
+        try:
+            details = fetch_details(provider, remote_id)
+        except RepositoryNotFoundError:
+            self.delete(provider, remote_id)
+            raise
+        self.set(provider, remote_id, details)
+        return details
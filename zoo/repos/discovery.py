@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+import structlog
+from django.conf import settings
+from django.utils import timezone
+
+from . import github, gitlab
+from .models import DiscoveryState, Provider
+
+log = structlog.get_logger()
+
+LISTINGS = [
+    (Provider.GITHUB.value, github.get_repositories),
+    (Provider.GITLAB.value, gitlab.get_repositories),
+]
+# projects updated shortly before the high-water mark are listed again, so that
+# clock skew and updates racing with the listing aren't missed
+HIGH_WATER_OVERLAP = timedelta(minutes=5)
+
+
+class ProjectDiscovery:
+    """Iterate over the projects of all providers changed since the last run.
+
+    Every ``task`` keeps a high-water mark per provider, the latest update of
+    a project it has listed. A full listing runs without a mark, once the last
+    full listing is older than ``SYNC_REPOS_FULL_INTERVAL_HOURS`` or with
+    ``full=True``. Only full listings reveal deleted projects, the providers
+    listed in full are collected in ``full_providers``.
+
+    The marks are saved by :meth:`commit`, which the caller runs once it has
+    stored the listed projects, so that a failed run lists them again.
+    """
+
+    def __init__(self, task, full=None):
+        self.task = task
+        self.full = full
+        self.full_providers = set()
+        self._states = []
+
+    def _is_full(self, state):
+        if self.full is not None:
+            return self.full
+        if state.high_water is None or state.full_sync_at is None:
+            return True
+        interval = timedelta(hours=settings.SYNC_REPOS_FULL_INTERVAL_HOURS)
+        return state.full_sync_at < timezone.now() - interval
+
+    def __iter__(self):
+        for provider, get_repositories in LISTINGS:
+            state, _ = DiscoveryState.objects.get_or_create(
+                task=self.task, provider=provider
+            )
+            full = self._is_full(state)
+            since = None if full else state.high_water - HIGH_WATER_OVERLAP
+            started_at = timezone.now()
+            high_water = state.high_water
+            count = 0
+
+            log.info(
+                "repos.discovery.start",
+                task=self.task,
+                provider=provider,
+                full=full,
+                since=since,
+            )
+            listing = get_repositories(since=since)
+            while True:
+                try:
+                    project = next(listing)
+                except StopIteration as stop:
+                    completed = stop.value
+                    break
+
+                count += 1
+                if high_water is None or project["updated_at"] > high_water:
+                    high_water = project["updated_at"]
+                yield project
+
+            if not completed:
+                # the mark can't move past projects that weren't listed
+                log.info(
+                    "repos.discovery.incomplete", task=self.task, provider=provider
+                )
+                continue
+
+            state.high_water = high_water
+            if full:
+                state.full_sync_at = started_at
+                self.full_providers.add(provider)
+            self._states.append(state)
+
+            log.info(
+                "repos.discovery.done",
+                task=self.task,
+                provider=provider,
+                projects=count,
+                high_water=high_water,
+            )
+
+    def commit(self):
+        """Save the marks of the listings completed so far."""
+        for state in self._states:
+            state.save()
+        self._states = []
@@ -0,0 +1,169 @@
+import fnmatch
+import functools
+import hashlib
+import os
+import re
+from collections import defaultdict
+from pathlib import Path, PurePosixPath
+
+import attr
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_glob(pattern):
+    """Translate a :meth:`pathlib.Path.glob` pattern to a regular expression.
+
+    ``*`` and ``?`` don't match across directories, a ``**`` part matches any
+    number of them, including none.
+    """
+    regex = ""
+    parts = pattern.split("/")
+
+    for index, part in enumerate(parts):
+        last = index == len(parts) - 1
+        if part == "**":
+            regex += ".*" if last else "(?:[^/]+/)*"
+            continue
+
+        for char in re.split(r"(\*|\?|\[[^\]]+\])", part):
+            if char == "*":
+                regex += "[^/]*"
+            elif char == "?":
+                regex += "[^/]"
+            elif char.startswith("[") and char.endswith("]") and len(char) > 2:
+                regex += "[^" + char[2:] if char[1] == "!" else char
+            else:
+                regex += re.escape(char)
+
+        if not last:
+            regex += "/"
+
+    return re.compile(f"{regex}\\Z", re.DOTALL)
+
+
+def _is_excluded(path, patterns):
+    """Check the path and each of its parent directories against the patterns."""
+    candidates = [path] + [str(parent) for parent in PurePosixPath(path).parents][:-1]
+    return any(
+        fnmatch.fnmatchcase(candidate, pattern)
+        for candidate in candidates
+        for pattern in patterns
+    )
+
+
+def parse_exclusions(exclusions):
+    """Split the comma separated ``Repository.exclusions``."""
+    return [path.strip().strip("/") for path in exclusions.split(",") if path.strip()]
+
+
+@attr.s(slots=True)
+class IndexedFile:
+    """A file found in the repository, ``path`` is relative to the repository root."""
+
+    root = attr.ib(repr=False, eq=False)
+    path = attr.ib()
+    size = attr.ib(eq=False)
+    mtime = attr.ib(eq=False)
+    extension = attr.ib(eq=False)
+    _content_hash = attr.ib(default=None, init=False, repr=False, eq=False)
+
+    @property
+    def full_path(self):
+        return self.root / self.path
+
+    @property
+    def name(self):
+        return PurePosixPath(self.path).name
+
+    @property
+    def content_hash(self):
+        """MD5 of the file contents, read on first access."""
+        if self._content_hash is None:
+            self._content_hash = hashlib.md5(self.full_path.read_bytes()).hexdigest()
+        return self._content_hash
+
+    def read_text(self):
+        return self.full_path.read_text()
+
+
+class FileIndex:
+    """Files of an extracted repository, collected in a single walk of the tree.
+
+    Analyzers and checks query the index instead of walking the tree on their
+    own. Entries are shared between an index and its filtered views, so content
+    hashes are computed at most once per pull.
+    """
+
+    def __init__(self, root, files):
+        self.root = Path(root)
+        self._files = {file.path: file for file in files}
+        self._by_extension = defaultdict(list)
+        for file in self._files.values():
+            self._by_extension[file.extension].append(file)
+
+    @classmethod
+    def build(cls, root):
+        root = Path(root)
+        files = []
+        directories = [root]
+
+        while directories:
+            directory = directories.pop()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                        continue
+                    # skips broken symlinks and symlinks to directories too
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    path = Path(entry.path).relative_to(root).as_posix()
+                    files.append(
+                        IndexedFile(
+                            root=root,
+                            path=path,
+                            size=stat.st_size,
+                            mtime=stat.st_mtime,
+                            extension=PurePosixPath(path).suffix[1:],
+                        )
+                    )
+
+        return cls(root, sorted(files, key=lambda file: file.path))
+
+    @classmethod
+    def for_repository(cls, repository, root):
+        """Index the tree at ``root`` without the paths excluded on the repository."""
+        return cls.build(root).exclude(parse_exclusions(repository.exclusions))
+
+    def __iter__(self):
+        return iter(self._files.values())
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, path):
+        return path in self._files
+
+    def get(self, path):
+        return self._files.get(path)
+
+    def glob(self, pattern):
+        """Files matching a :meth:`pathlib.Path.glob` pattern, e.g. ``**/*.json``."""
+        regex = _compile_glob(pattern)
+        return [file for file in self if regex.match(file.path)]
+
+    def with_extension(self, extension):
+        """Files with the given extension, without the leading dot."""
+        return list(self._by_extension.get(extension, []))
+
+    def exclude(self, patterns):
+        """Return a view without the files matching one of the ``fnmatch`` patterns.
+
+        A file is left out also if one of its parent directories matches.
+        """
+        if not patterns:
+            return self
+        return FileIndex(
+            self.root, [file for file in self if not _is_excluded(file.path, patterns)]
+        )
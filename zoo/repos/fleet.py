@@ -0,0 +1,232 @@
+import json
+import multiprocessing
+import os
+from collections import Counter, defaultdict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from itertools import islice
+from pathlib import Path
+
+import structlog
+from django.conf import settings
+from django.db import connections
+from requests import RequestException
+
+from . import github
+from .models import Provider, Repository
+from .tasks import PullOutcome, pull
+
+log = structlog.get_logger()
+
+
+def select_repositories(provider=None, owner=None, ids=None):
+    """Return the repositories a fleet pull should run on, all of them by default."""
+    repositories = Repository.objects.order_by("pk")
+
+    if provider:
+        repositories = repositories.filter(provider=provider)
+    if owner:
+        repositories = repositories.filter(owner=owner)
+    if ids:
+        repositories = repositories.filter(pk__in=ids)
+
+    return repositories
+
+
+def _pull_repository(remote_id, provider, force, metadata=None):
+    try:
+        # metadata the fleet fetched in a batch, lookups of the pull don't query
+        with github.cached_metadata(metadata or {}):
+            return pull(remote_id, provider, force=force)
+    finally:
+        # pool workers outlive the pull, don't leave idle connections behind
+        connections.close_all()
+
+
+class Checkpoint:
+    """Progress of a fleet pull persisted to a JSON file, so it can be resumed."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.done = set()
+        self.failed = set()
+
+        if self.path is not None and self.path.exists():
+            data = json.loads(self.path.read_text())
+            self.done = set(data.get("done", []))
+            self.failed = set(data.get("failed", []))
+
+    def mark(self, repository_id, success):
+        if success:
+            self.done.add(repository_id)
+            self.failed.discard(repository_id)
+        else:
+            self.failed.add(repository_id)
+        self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        tmp_path.write_text(
+            json.dumps({"done": sorted(self.done), "failed": sorted(self.failed)})
+        )
+        os.replace(tmp_path, self.path)
+
+
+class FleetPull:
+    """Run :func:`zoo.repos.tasks.pull` on many repositories in parallel.
+
+    At most ``workers`` pulls run at once and at most ``concurrency[provider]`` of
+    them against the same provider. Repositories already pulled according to the
+    checkpoint are skipped, failed ones are retried.
+
+    The GitHub metadata of the repositories is fetched in batches of
+    ``GRAPHQL_BATCH_SIZE``, each one just before its first pull, and passed on to
+    the pulls, so it's fresh however long the fleet runs.
+    """
+
+    def __init__(
+        self,
+        repositories,
+        workers=None,
+        concurrency=None,
+        checkpoint=None,
+        force=False,
+        use_threads=False,
+        progress=None,
+    ):
+        self.repositories = repositories
+        self.workers = workers or settings.FLEET_PULL_WORKERS
+        self.concurrency = {
+            provider: int(limit)
+            for provider, limit in (
+                settings.FLEET_PULL_CONCURRENCY if concurrency is None else concurrency
+            ).items()
+        }
+        self.checkpoint = Checkpoint(checkpoint)
+        self.force = force
+        self.use_threads = use_threads
+        self.progress = progress
+        self._github_metadata = {}
+        self._github_fetched = set()
+
+    def _provider_limit(self, provider):
+        return max(1, min(self.concurrency.get(provider, self.workers), self.workers))
+
+    def _get_executor(self):
+        if self.use_threads:
+            return ThreadPoolExecutor(max_workers=self.workers)
+
+        # forked workers must not share the parent's database connections
+        connections.close_all()
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("fork")
+        )
+
+    def run(self):
+        queues = defaultdict(deque)
+        total = 0
+        for repository in self.repositories:
+            if repository.pk in self.checkpoint.done:
+                continue
+            queues[repository.provider].append(repository)
+            total += 1
+
+        log.info("repos.fleet.start", total=total, workers=self.workers)
+
+        summary = Counter()
+        running = Counter()
+        in_flight = {}
+
+        with self._get_executor() as executor:
+            while in_flight or any(queues.values()):
+                for provider, queue in queues.items():
+                    while (
+                        queue
+                        and len(in_flight) < self.workers
+                        and running[provider] < self._provider_limit(provider)
+                    ):
+                        repository = queue.popleft()
+                        metadata = (
+                            self._take_github_metadata(repository, queue)
+                            if provider == Provider.GITHUB.value
+                            else None
+                        )
+                        future = executor.submit(
+                            _pull_repository,
+                            repository.remote_id,
+                            repository.provider,
+                            self.force,
+                            metadata,
+                        )
+                        in_flight[future] = repository
+                        running[provider] += 1
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    repository = in_flight.pop(future)
+                    running[repository.provider] -= 1
+                    self._finish(repository, future, summary, total)
+
+        log.info("repos.fleet.done", **summary)
+        return dict(summary)
+
+    def _take_github_metadata(self, repository, queue):
+        """Return the metadata of a GitHub repository for its pull.
+
+        The first repository of a batch fetches the metadata of the whole batch,
+        itself and the next ones in its ``queue``.
+        """
+        full_name = str(repository)
+        if full_name not in self._github_fetched:
+            batch = [full_name] + [
+                str(queued) for queued in islice(queue, github.GRAPHQL_BATCH_SIZE - 1)
+            ]
+            self._github_fetched.update(batch)
+            try:
+                self._github_metadata.update(github.get_repositories_metadata(batch))
+            except RequestException as err:
+                log.info("repos.fleet.prefetch_error", error=repr(err))
+
+        if full_name not in self._github_metadata:
+            return None
+        return {full_name: self._github_metadata.pop(full_name)}
+
+    def _finish(self, repository, future, summary, total):
+        error = future.exception()
+        outcome = None if error is not None else future.result()
+        # pulls catching their own errors return their outcome instead of raising
+        success = error is None and outcome != PullOutcome.FAILED.value
+
+        if not success:
+            summary["failed"] += 1
+        elif outcome == PullOutcome.UNCHANGED.value:
+            summary["unchanged"] += 1
+        else:
+            summary["pulled"] += 1
+        self.checkpoint.mark(repository.pk, success)
+
+        if success:
+            log.info(
+                "repos.fleet.progress",
+                repo=str(repository),
+                done=sum(summary.values()),
+                total=total,
+            )
+        else:
+            log.error(
+                "repos.fleet.pull_error",
+                repo=str(repository),
+                error=repr(error) if error is not None else None,
+                done=sum(summary.values()),
+                total=total,
+            )
+
+        if self.progress is not None:
+            self.progress(repository, success, sum(summary.values()), total)
@@ -1,5 +1,13 @@
+import json
+import re
+import threading
+import time
 from base64 import b64decode as decode
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
+import arrow
 import requests
 import structlog
 from django.conf import settings
@@ -10,20 +18,105 @@ from github.GithubException import (
     UnknownObjectException,
 )
 from github.GithubObject import NotSet
+from github.Requester import (
+    HTTPRequestsConnectionClass,
+    HTTPSRequestsConnectionClass,
+    Requester,
+)
 
 from ..base import http
+from ..base.http_cache import CachingHTTPAdapter
+from ..base.ratelimit import ThrottlingHTTPAdapter
 from .exceptions import MissingFilesError, RepositoryNotFoundError
 
+log = structlog.get_logger()
+
+GRAPHQL_BATCH_SIZE = 100
+GRAPHQL_CACHE_TTL = 10 * 60
+GRAPHQL_CACHE_SIZE = 10_000
+METADATA_FRAGMENT = """
+fragment metadata on Repository {
+  databaseId
+  nameWithOwner
+  description
+  url
+  stargazerCount
+  forkCount
+  updatedAt
+  defaultBranchRef { name }
+  refs(refPrefix: "refs/heads/") { totalCount }
+  assignableUsers { totalCount }
+  issues(states: OPEN) { totalCount }
+  pullRequests(states: OPEN) { totalCount }
+  languages(first: 100) { edges { size node { name } } }
+  zooFile: object(expression: $zooFile) { ... on Blob { text } }
+  githubDir: object(expression: "HEAD:.github") { ...entries }
+  rootDir: object(expression: "HEAD:") { ...entries }
+  docsDir: object(expression: "HEAD:docs") { ...entries }
+}
+
+fragment entries on Tree { entries { name type } }
+"""
+# directories GitHub looks for the readme in, in its order
+README_DIRS = (("githubDir", ".github/"), ("rootDir", ""), ("docsDir", "docs/"))
+README_PATTERN = re.compile(r"readme(\.[^/]*)?", re.IGNORECASE)
+
+# full name -> (expires at or None, metadata), the oldest first
+_metadata_cache = OrderedDict()
+# pulls in threads and the threaded analyzers share the cache
+_metadata_lock = threading.Lock()
+
+
+class ThrottledConnection(HTTPSRequestsConnectionClass):
+    """PyGithub connection sending every request through the rate limiter.
+
+    GET responses are revalidated with conditional requests when an HTTP cache
+    is configured, GitHub doesn't count the ``304 Not Modified`` answers against
+    the rate limit. PyGithub creates a connection for each request once its
+    connection classes are replaced, they all share one session to keep the
+    connections alive.
+    """
+
+    _session = None
+    _session_lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self._session_lock:
+            if ThrottledConnection._session is None:
+                options = {
+                    "limiter": http.limiter,
+                    "max_retries": kwargs.get("retry") or 0,
+                }
+                storage = http.get_cache_storage()
+                adapter = (
+                    CachingHTTPAdapter(storage, **options)
+                    if storage is not None
+                    else ThrottlingHTTPAdapter(**options)
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                ThrottledConnection._session = session
+        self.session = ThrottledConnection._session
+
+
+Requester.injectConnectionClasses(HTTPRequestsConnectionClass, ThrottledConnection)
 github = Github(
     settings.GITHUB_TOKEN, user_agent=settings.USER_AGENT, retry=http.get_retry_object()
 )
 
-log = structlog.get_logger()
 
+def get_repositories(since=None):
+    """Yield the repositories, only those updated after ``since`` if given.
 
-def get_repositories():
+    Returns whether the listing completed.
+    """
     try:
-        for repo in github.get_user().get_repos():
+        repos = github.get_user().get_repos(sort="updated", direction="desc")
+        for repo in repos:
+            updated_at = arrow.get(repo.updated_at).datetime
+            if since is not None and updated_at < since:
+                break
             yield {
                 "id": repo.id,
                 "provider": "github",
@@ -32,13 +125,18 @@ def get_repositories():
                 "url": repo.svn_url,
                 "is_fork": repo.fork,
                 "is_personal": repo.owner.type == "User",
+                "updated_at": updated_at,
+                "last_activity_at": arrow.get(
+                    repo.pushed_at or repo.updated_at
+                ).datetime,
             }
     except BadCredentialsException:
         log.info("github.get_repositories.skip")
     except GithubException:
         log.exception("github.get_repositories.error")
+        return False
 
-    return []
+    return True
 
 
 def get_namespaces():
@@ -63,6 +161,19 @@ def get_project(github_id):
     return project
 
 
+def get_head_sha(github_id):
+    project = get_project(github_id)
+    try:
+        return project.get_branch(project.default_branch).commit.sha
+    except UnknownObjectException:
+        return None  # the default branch has no commits yet
+    except GithubException as err:
+        # empty repositories, other errors like rate limits must not look alike
+        if err.status == 409:
+            return None
+        raise
+
+
 def download_archive(project, archive, sha=None):
     archive.seek(0)  # needed if retry
     sha = sha if sha else NotSet
@@ -76,26 +187,65 @@ def download_archive(project, archive, sha=None):
     return archive
 
 
+def stream_archive(project, sha=None):
+    sha = sha if sha else NotSet
+    archive_url = project.get_archive_link("tarball", ref=sha)
+    r = http.session.get(archive_url, stream=True)
+    if r.status_code == requests.codes.not_found:
+        raise MissingFilesError
+    r.raise_for_status()
+    r.raw.decode_content = True
+    return r.raw
+
+
+def get_clone_url(project):
+    return project.clone_url
+
+
+def get_clone_credentials():
+    if not settings.GITHUB_TOKEN:
+        return None
+    return ("x-access-token", settings.GITHUB_TOKEN)
+
+
+def _get_readme_url(project):
+    try:
+        return project.get_readme().url
+    except UnknownObjectException:
+        return None
+
+
 def get_project_details(github_id):
+    """Return the details of the repository, see also :func:`_parse_metadata`."""
     project = get_project(github_id)
+    # the readme and the counts are separate requests, don't wait for them one by one
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        readme = executor.submit(_get_readme_url, project)
+        branch_count = executor.submit(lambda: project.get_branches().totalCount)
+        # users issues can be assigned to, GraphQL doesn't count contributors
+        member_count = executor.submit(lambda: project.get_assignees().totalCount)
+        issue_count = executor.submit(lambda: project.get_issues().totalCount)
     return {
         "id": project.id,
         "name": project.full_name,
         "description": project.description,
         "avatar": None,
         "url": project.svn_url,
-        "readme": project.get_readme().url,
+        "readme": readme.result(),
         "stars": project.stargazers_count,
         "forks": project.forks_count,
-        "branch_count": project.get_branches().totalCount,
-        "member_count": project.get_contributors().totalCount,
-        "issue_count": project.get_issues().totalCount,
-        "last_activity_at": project.updated_at,
+        "branch_count": branch_count.result(),
+        "member_count": member_count.result(),
+        "issue_count": issue_count.result(),
+        "last_activity_at": arrow.get(project.updated_at).datetime,
     }
 
 
 def get_languages(remote_id):
-    langs = get_project(remote_id).get_languages()
+    return get_languages_percent(get_project(remote_id).get_languages())
+
+
+def get_languages_percent(langs):
     sum_of_bytes = sum(langs.values())
     langs_percent = {}
     for lang, num in langs.items():
@@ -103,6 +253,150 @@ def get_languages(remote_id):
     return langs_percent
 
 
+class GraphQLError(requests.RequestException):
+    """GitHub answered a GraphQL query with errors only, without any data."""
+
+
+def graphql(query, variables=None):
+    response = http.session.post(
+        settings.GITHUB_GRAPHQL_URL,
+        json={"query": query, "variables": variables or {}},
+        headers={"Authorization": f"bearer {settings.GITHUB_TOKEN}"},
+    )
+    response.raise_for_status()
+    payload = response.json()
+
+    for error in payload.get("errors", []):
+        # missing repositories are reported as errors, their data is null
+        if error.get("type") != "NOT_FOUND":
+            log.warning("github.graphql.error", error=error)
+
+    if payload.get("data") is None:
+        raise GraphQLError(payload.get("errors"), response=response)
+    return payload["data"]
+
+
+def _build_metadata_query(full_names):
+    aliases = "\n".join(
+        f"  r{index}: repository(owner: {json.dumps(owner)}, "
+        f"name: {json.dumps(name)}) {{ ...metadata }}"
+        for index, (owner, name) in enumerate(
+            full_name.split("/", 1) for full_name in full_names
+        )
+    )
+    return f"query($zooFile: String!) {{\n{aliases}\n}}\n{METADATA_FRAGMENT}"
+
+
+def _get_metadata_readme_url(node):
+    """Return the API URL of the readme GitHub shows, like the REST API does."""
+    if node["defaultBranchRef"] is None:
+        return None
+
+    for key, directory in README_DIRS:
+        for entry in (node[key] or {}).get("entries", []):
+            if entry["type"] == "blob" and README_PATTERN.fullmatch(entry["name"]):
+                return (
+                    f"https://api.github.com/repos/{node['nameWithOwner']}/contents/"
+                    f"{directory}{entry['name']}?ref={node['defaultBranchRef']['name']}"
+                )
+    return None
+
+
+def _parse_metadata(node):
+    """Parse a repository of the GraphQL query, the details match the REST ones."""
+    return {
+        "details": {
+            "id": node["databaseId"],
+            "name": node["nameWithOwner"],
+            "description": node["description"],
+            "avatar": None,
+            "url": node["url"],
+            "readme": _get_metadata_readme_url(node),
+            "stars": node["stargazerCount"],
+            "forks": node["forkCount"],
+            "branch_count": node["refs"]["totalCount"],
+            "member_count": node["assignableUsers"]["totalCount"],
+            # REST counts open pull requests as issues too
+            "issue_count": node["issues"]["totalCount"]
+            + node["pullRequests"]["totalCount"],
+            "last_activity_at": arrow.get(node["updatedAt"]).datetime,
+        },
+        "languages": {
+            edge["node"]["name"]: edge["size"] for edge in node["languages"]["edges"]
+        },
+        "zoo_file": (node["zooFile"] or {}).get("text"),
+    }
+
+
+def get_repositories_metadata(full_names):
+    """Fetch details, languages and zoo file of many repositories at once.
+
+    Up to ``GRAPHQL_BATCH_SIZE`` repositories are fetched with one GraphQL query.
+    Returns a dict keyed by the ``owner/name`` full names, the value is ``None``
+    for repositories that don't exist or aren't accessible. Results of up to
+    ``GRAPHQL_CACHE_SIZE`` repositories are kept for ``GRAPHQL_CACHE_TTL``
+    seconds, see also :func:`cached_metadata`.
+    """
+    now = time.monotonic()
+    results = {}
+    missing = []
+
+    with _metadata_lock:
+        for full_name in dict.fromkeys(full_names):
+            cached = _metadata_cache.get(full_name)
+            if cached is not None and (cached[0] is None or now < cached[0]):
+                results[full_name] = cached[1]
+            else:
+                missing.append(full_name)
+
+    zoo_file = f"{settings.ZOO_YAML_DEFAULT_REF}:{settings.ZOO_YAML_FILE}"
+    for start in range(0, len(missing), GRAPHQL_BATCH_SIZE):
+        batch = missing[start : start + GRAPHQL_BATCH_SIZE]
+        data = graphql(_build_metadata_query(batch), {"zooFile": zoo_file})
+        log.info("github.graphql.metadata", repos=len(batch))
+
+        batch_results = {}
+        for index, full_name in enumerate(batch):
+            node = data.get(f"r{index}")
+            batch_results[full_name] = _parse_metadata(node) if node else None
+        _cache_metadata(batch_results, now, now + GRAPHQL_CACHE_TTL)
+        results.update(batch_results)
+
+    return results
+
+
+def _cache_metadata(metadata, now, expires_at):
+    """Keep the metadata, drop the entries expired or beyond ``GRAPHQL_CACHE_SIZE``."""
+    with _metadata_lock:
+        for full_name, repository_metadata in metadata.items():
+            _metadata_cache[full_name] = (expires_at, repository_metadata)
+            _metadata_cache.move_to_end(full_name)
+
+        while len(_metadata_cache) > 1:
+            oldest, (oldest_expires_at, _) = next(iter(_metadata_cache.items()))
+            if len(_metadata_cache) <= GRAPHQL_CACHE_SIZE and (
+                oldest_expires_at is None or now < oldest_expires_at
+            ):
+                break
+            del _metadata_cache[oldest]
+
+
+@contextmanager
+def cached_metadata(metadata):
+    """Serve the metadata fetched beforehand, as long as the block runs.
+
+    ``metadata`` is a part of what :func:`get_repositories_metadata` returned,
+    it doesn't expire until the block exits, whatever the block's duration.
+    """
+    _cache_metadata(metadata, time.monotonic(), None)
+    try:
+        yield
+    finally:
+        with _metadata_lock:
+            for full_name in metadata:
+                _metadata_cache.pop(full_name, None)
+
+
 def get_file_content(github_id, path, ref="master"):
     try:
         proj = get_project(github_id)
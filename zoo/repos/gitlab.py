@@ -1,6 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import arrow
 import structlog
 from django.conf import settings
-from gitlab import Gitlab, GitlabGetError, GitlabListError
+from gitlab import Gitlab, GitlabGetError, GitlabHttpError, GitlabListError
 from requests.exceptions import MissingSchema
 
 from ..base.http import session
@@ -29,6 +32,19 @@ def get_project(remote_id):
     return project
 
 
+def get_head_sha(remote_id):
+    project = get_project(remote_id)
+    if project.default_branch is None:
+        return None
+    try:
+        return project.branches.get(project.default_branch).commit["id"]
+    except GitlabGetError as err:
+        # other errors like rate limits must not look like an unknown head
+        if err.response_code == 404:
+            return None
+        raise
+
+
 def download_archive(project, archive, sha=None):
     archive.seek(0)  # needed if retry
     try:
@@ -38,9 +54,42 @@ def download_archive(project, archive, sha=None):
     return archive
 
 
-def get_repositories():
+def stream_archive(project, sha=None):
     try:
-        for project in gitlab.projects.list(as_list=False):
+        response = gitlab.http_request(
+            "get",
+            f"/projects/{project.id}/repository/archive",
+            query_data={"sha": sha} if sha else {},
+            streamed=True,
+        )
+    except GitlabHttpError as e:
+        if e.response_code == 404:
+            raise MissingFilesError
+        raise
+    response.raw.decode_content = True
+    return response.raw
+
+
+def get_clone_url(project):
+    return project.http_url_to_repo
+
+
+def get_clone_credentials():
+    if not settings.GITLAB_TOKEN:
+        return None
+    return ("oauth2", settings.GITLAB_TOKEN)
+
+
+def get_repositories(since=None):
+    """Yield the projects, only those with activity after ``since`` if given.
+
+    Returns whether the listing completed.
+    """
+    filters = {"last_activity_after": since.isoformat()} if since else {}
+    try:
+        for project in gitlab.projects.list(
+            as_list=False, pagination="keyset", order_by="id", sort="asc", **filters
+        ):
             yield {
                 "id": project.id,
                 "provider": "gitlab",
@@ -49,13 +98,16 @@ def get_repositories():
                 "url": project.web_url,
                 "is_fork": hasattr(project, "forked_from_project"),
                 "is_personal": project.namespace["kind"] == "user",
+                "updated_at": arrow.get(project.last_activity_at).datetime,
+                "last_activity_at": arrow.get(project.last_activity_at).datetime,
             }
     except MissingSchema:
         log.info("gitlab.get_repositories.skip")
-    except GitlabGetError:
+    except (GitlabGetError, GitlabListError):
         log.exception("gitlab.get_repositories.error")
+        return False
 
-    return []
+    return True
 
 
 def get_namespaces():
@@ -74,6 +126,15 @@ def get_namespaces():
 
 def get_project_details(remote_id):
     project = get_project(remote_id)
+    # the counts are separate requests, don't wait for them one by one
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        branch_count = executor.submit(
+            lambda: project.branches.list(as_list=False).total
+        )
+        member_count = executor.submit(
+            lambda: project.members.list(as_list=False).total
+        )
+        issue_count = executor.submit(lambda: project.issues.list(as_list=False).total)
     return {
         "id": project.id,
         "name": project.name_with_namespace,
@@ -83,9 +144,9 @@ def get_project_details(remote_id):
         "readme": project.readme_url,
         "stars": project.star_count,
         "forks": project.forks_count,
-        "branch_count": project.branches.list(as_list=False).total,
-        "member_count": project.members.list(as_list=False).total,
-        "issue_count": project.issues.list(as_list=False).total,
+        "branch_count": branch_count.result(),
+        "member_count": member_count.result(),
+        "issue_count": issue_count.result(),
         "last_activity_at": project.last_activity_at,
     }
 
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repos", "0008_repositoryenvironment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="pulled_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="repository",
+            name="pulled_sha",
+            field=models.CharField(
+                blank=True,
+                help_text="Default branch head commit of the last successful pull",
+                max_length=64,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="repository",
+            name="pulled_version",
+            field=models.CharField(
+                blank=True,
+                help_text="Fingerprint of the analyzers and checks of the last successful pull",
+                max_length=64,
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repos", "0009_repository_pulled_sha"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DiscoveryState",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("task", models.CharField(max_length=100)),
+                (
+                    "provider",
+                    models.CharField(
+                        choices=[("gitlab", "gitlab"), ("github", "github")],
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "high_water",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Latest update of a project seen by the task, the next listing starts from here",
+                        null=True,
+                    ),
+                ),
+                ("full_sync_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "unique_together": {("task", "provider")},
+            },
+        ),
+    ]
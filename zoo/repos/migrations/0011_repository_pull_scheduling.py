@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repos", "0010_discoverystate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="last_activity_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Last push or update reported by the provider",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="repository",
+            name="pull_scheduled_at",
+            field=models.DateTimeField(
+                blank=True, help_text="When the last scheduled pull was due", null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repos", "0011_repository_pull_scheduling"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="zoo_file_sha",
+            field=models.CharField(
+                blank=True,
+                help_text="Blob SHA of the last zoo file applied to the services",
+                max_length=40,
+                null=True,
+            ),
+        ),
+    ]
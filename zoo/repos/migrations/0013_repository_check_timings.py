@@ -0,0 +1,26 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:10
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("repos", "0012_repository_zoo_file_sha"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="check_timings",
+            field=django.contrib.postgres.fields.jsonb.JSONField(
+                blank=True,
+                default=dict,
+                help_text=(
+                    "Wall time in seconds of the checks run by the last pull, "
+                    "by check"
+                ),
+            ),
+        ),
+    ]
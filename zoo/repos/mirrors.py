@@ -0,0 +1,242 @@
+import base64
+import fcntl
+import os
+import shutil
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+
+import structlog
+from django.conf import settings
+
+from .exceptions import MissingFilesError
+
+log = structlog.get_logger()
+
+# ref the remote default branch is fetched into, mirrors don't track branches
+HEAD_REF = "refs/zoo/head"
+
+
+def _auth_env(credentials):
+    """Pass credentials as an HTTP header through the environment.
+
+    Keeps the token out of the process list and out of the mirror's config.
+    """
+    if not credentials:
+        return {}
+
+    token = base64.b64encode(":".join(credentials).encode()).decode()
+    return {
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": "http.extraHeader",
+        "GIT_CONFIG_VALUE_0": f"Authorization: Basic {token}",
+    }
+
+
+def _dir_size(path):
+    return sum(
+        (Path(root) / name).stat().st_size
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+class GitMirrorCache:
+    """Bare mirrors of repositories kept on disk between pulls.
+
+    Every repository gets a bare mirror in ``root``. The first fetch is shallow,
+    later ones only transfer the objects that are missing. Once the mirrors take
+    more than ``max_size`` bytes, the least recently used ones are removed.
+
+    The size of a mirror is measured once it's fetched and stored next to it, so
+    the eviction doesn't walk the mirrors on every pull.
+
+    The first fetch is shallow rather than a ``--filter=blob:none`` partial
+    clone: ``git archive`` needs every blob of the commit, and a partial clone
+    would fetch them one by one.
+
+    Git commands run while the mirror is locked, each is killed after
+    ``timeout`` seconds so a stuck remote doesn't hold the lock forever.
+    """
+
+    def __init__(self, root=None, max_size=None, timeout=None):
+        self.root = Path(root or settings.GIT_MIRROR_ROOT)
+        self.max_size = (
+            max_size if max_size is not None else settings.GIT_MIRROR_MAX_SIZE
+        )
+        self.timeout = timeout if timeout is not None else settings.GIT_MIRROR_TIMEOUT
+
+    def mirror_path(self, repository):
+        return self.root / repository.provider / f"{repository.remote_id}.git"
+
+    @contextmanager
+    def lock(self, repository):
+        """Hold an exclusive lock on the mirror of ``repository``."""
+        lock_path = self.mirror_path(repository).with_suffix(".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _git(self, mirror, *args, env=None):
+        return subprocess.run(
+            ["git", "--git-dir", str(mirror), *args],
+            check=True,
+            capture_output=True,
+            text=True,
+            timeout=self.timeout,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0", **(env or {})},
+        ).stdout.strip()
+
+    def _store_size(self, mirror):
+        size = _dir_size(mirror)
+        mirror.with_suffix(".size").write_text(str(size))
+        return size
+
+    @contextmanager
+    def _try_lock(self, mirror):
+        """Lock ``mirror`` unless another pull holds it, yield whether it's locked."""
+        with open(mirror.with_suffix(".lock"), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _has_commit(self, mirror, sha):
+        try:
+            self._git(mirror, "cat-file", "-e", f"{sha}^{{commit}}")
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            return False
+        return True
+
+    def fetch(self, repository, url, sha=None, credentials=None):
+        """Bring the mirror up to date and return the SHA to check out.
+
+        Without ``sha`` the head of the remote default branch is used. Nothing is
+        fetched when the requested commit is already in the mirror.
+        """
+        mirror = self.mirror_path(repository)
+        env = _auth_env(credentials)
+
+        if sha is not None and mirror.exists() and self._has_commit(mirror, sha):
+            os.utime(mirror)  # mtime of the mirror marks its last use
+            log.info("repos.mirrors.fetch.cached", repo=repository, sha=sha)
+            return sha
+
+        first_fetch = not mirror.exists()
+        # shallow history is enough to check out the head, later fetches
+        # negotiate against what is already here and only get new objects
+        depth = ["--depth=1"] if first_fetch else []
+        try:
+            if first_fetch:
+                mirror.parent.mkdir(parents=True, exist_ok=True)
+                subprocess.run(
+                    ["git", "init", "--quiet", "--bare", str(mirror)],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                    timeout=self.timeout,
+                )
+            self._git(
+                mirror, "fetch", "--quiet", *depth, url, f"+HEAD:{HEAD_REF}", env=env
+            )
+            if sha is not None and not self._has_commit(mirror, sha):
+                self._git(mirror, "fetch", "--quiet", "--depth=1", url, sha, env=env)
+            sha = sha or self._git(mirror, "rev-parse", HEAD_REF)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            log.info(
+                "repos.mirrors.fetch.error",
+                repo=repository,
+                # the output of a killed command isn't decoded
+                error=(
+                    e.stderr.strip()
+                    if isinstance(e, subprocess.CalledProcessError)
+                    else str(e)
+                ),
+            )
+            if first_fetch:
+                shutil.rmtree(mirror, ignore_errors=True)
+            raise MissingFilesError(f"{repository} couldn't be fetched.") from e
+
+        os.utime(mirror)
+        size = self._store_size(mirror)
+        log.info(
+            "repos.mirrors.fetch.done",
+            repo=repository,
+            sha=sha,
+            shallow=first_fetch,
+            size=size,
+        )
+        return sha
+
+    def archive(self, repository, sha, prefix):
+        """Start ``git archive`` of ``sha``, its stdout is a tar stream.
+
+        The caller reads the stream and waits for the process, killing it once
+        it runs longer than ``timeout``.
+        """
+        return subprocess.Popen(
+            [
+                "git",
+                "--git-dir",
+                str(self.mirror_path(repository)),
+                "archive",
+                "--format=tar",
+                f"--prefix={prefix}/",
+                sha,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def evict(self, keep=None):
+        """Remove least recently used mirrors until the cache fits ``max_size``.
+
+        Only mirrors with a stored size are considered, each is read and removed
+        while it's locked. The mirror of ``keep`` and mirrors locked by other
+        pulls are left alone, but their sizes count. Mirrors that can't be read
+        or removed are skipped.
+        """
+        kept = self.mirror_path(keep) if keep is not None else None
+        candidates = []
+        total = 0
+
+        for size_path in self.root.glob("*/*.size"):
+            mirror = size_path.with_suffix(".git")
+            try:
+                if mirror == kept:
+                    total += int(size_path.read_text())
+                    continue
+                with self._try_lock(mirror) as locked:
+                    size = int(size_path.read_text())
+                    if locked:
+                        candidates.append((mirror.stat().st_mtime, mirror, size))
+                    total += size
+            except (OSError, ValueError) as err:
+                log.info("repos.mirrors.evict.skipped", mirror=str(mirror), error=err)
+
+        for _, mirror, size in sorted(candidates, key=lambda candidate: candidate[0]):
+            if total <= self.max_size:
+                break
+            try:
+                with self._try_lock(mirror) as locked:
+                    if not locked or not mirror.with_suffix(".size").exists():
+                        continue
+                    mirror.with_suffix(".size").unlink()
+                    shutil.rmtree(mirror, ignore_errors=True)
+                    # the lock file stays, pulls waiting for it must lock the same file
+            except OSError as err:
+                log.info("repos.mirrors.evict.skipped", mirror=str(mirror), error=err)
+                continue
+
+            total -= size
+            log.info("repos.mirrors.evicted", mirror=str(mirror), size=size)
@@ -1,5 +1,6 @@
 from enum import Enum
 
+from django.contrib.postgres import fields as pg_fields
 from django.db import models
 
 from ..analytics.models import Dependency
@@ -29,6 +30,36 @@ class Repository(models.Model):
         default="",
         help_text="Comma separated paths to exclude from checks",
     )
+    pulled_sha = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text="Default branch head commit of the last successful pull",
+    )
+    pulled_version = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text="Fingerprint of the analyzers and checks of the last successful pull",
+    )
+    pulled_at = models.DateTimeField(null=True, blank=True)
+    last_activity_at = models.DateTimeField(
+        null=True, blank=True, help_text="Last push or update reported by the provider"
+    )
+    pull_scheduled_at = models.DateTimeField(
+        null=True, blank=True, help_text="When the last scheduled pull was due"
+    )
+    zoo_file_sha = models.CharField(
+        max_length=40,
+        null=True,
+        blank=True,
+        help_text="Blob SHA of the last zoo file applied to the services",
+    )
+    check_timings = pg_fields.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Wall time in seconds of the checks run by the last pull, by check",
+    )
 
     def __str__(self):
         return f"{self.owner}/{self.name}"
@@ -102,3 +133,22 @@ class RepositoryEnvironment(models.Model):
 
     name = models.CharField(max_length=200)
     external_url = models.CharField(max_length=300, null=True)
+
+
+class DiscoveryState(models.Model):
+    """Progress of a task listing the projects of a provider."""
+
+    class Meta:
+        unique_together = ("task", "provider")
+
+    task = models.CharField(max_length=100)
+    provider = models.CharField(
+        choices=((item.value, item.value) for item in Provider), max_length=100
+    )
+    high_water = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Latest update of a project seen by the task, the next listing "
+        "starts from here",
+    )
+    full_sync_at = models.DateTimeField(null=True, blank=True)
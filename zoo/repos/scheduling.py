@@ -0,0 +1,156 @@
+import hashlib
+from collections import defaultdict
+from datetime import timedelta
+
+import structlog
+from django.conf import settings
+from django.utils import timezone
+
+from ..auditing.check_discovery import KINDS, Severity
+from ..auditing.models import Issue
+from .models import Repository
+
+log = structlog.get_logger()
+
+# schedule_pulls runs this often and plans the pulls due until its next run
+SCHEDULE_PERIOD = timedelta(minutes=15)
+
+# a push scores ACTIVITY_WEIGHT, halving with every ACTIVITY_HALF_LIFE since
+ACTIVITY_WEIGHT = 8
+ACTIVITY_HALF_LIFE = timedelta(days=2)
+SEVERITY_WEIGHTS = {
+    Severity.CRITICAL: 2,
+    Severity.WARNING: 0.5,
+    Severity.ADVICE: 0.1,
+}
+ISSUES_SCORE_LIMIT = 4
+# a point for every day without a pull
+STALENESS_SCORE_LIMIT = 4
+
+# (minimum score, pull interval), hottest first
+PULL_TIERS = [
+    (6, timedelta(minutes=15)),
+    (3, timedelta(hours=1)),
+    (1, timedelta(hours=6)),
+    (0, timedelta(days=1)),
+]
+
+
+def get_issues_scores():
+    """Sum the severities of the open issues, by repository ID."""
+    scores = defaultdict(float)
+    open_issues = Issue.objects.filter(
+        deleted=False,
+        status__in=[Issue.Status.NEW.value, Issue.Status.REOPENED.value],
+    ).values_list("repository_id", "kind_key")
+
+    for repository_id, kind_key in open_issues.iterator():
+        kind = KINDS.get(kind_key)
+        if kind is not None:
+            scores[repository_id] += SEVERITY_WEIGHTS.get(kind.severity, 0)
+
+    return scores
+
+
+def get_last_pull(repository):
+    """When the repository was last pulled or planned to be, ``None`` if never.
+
+    Pulls of unchanged repositories end early and leave ``pulled_at`` as it is,
+    the planned time of the pull tells they were checked.
+    """
+    return max(
+        filter(None, [repository.pulled_at, repository.pull_scheduled_at]),
+        default=None,
+    )
+
+
+def get_score(repository, issues_score, now):
+    """How much fresh data of the repository is worth, higher pulls more often."""
+    score = min(issues_score, ISSUES_SCORE_LIMIT)
+
+    if repository.last_activity_at is not None:
+        idle = max(now - repository.last_activity_at, timedelta(0))
+        score += ACTIVITY_WEIGHT * 0.5 ** (idle / ACTIVITY_HALF_LIFE)
+
+    last_pull = get_last_pull(repository)
+    if last_pull is None:
+        score += STALENESS_SCORE_LIMIT
+    else:
+        stale = max(now - last_pull, timedelta(0))
+        score += min(stale / timedelta(days=1), STALENESS_SCORE_LIMIT)
+
+    return score
+
+
+def get_interval(score):
+    for minimum_score, interval in PULL_TIERS:
+        if score >= minimum_score:
+            return interval
+    return PULL_TIERS[-1][1]
+
+
+def _spread(repository):
+    """Stable offset within the period, so overdue pulls don't start at once."""
+    pk_hash = hashlib.sha256(str(repository.pk).encode())
+    return timedelta(
+        seconds=int(pk_hash.hexdigest(), 16) % int(SCHEDULE_PERIOD.total_seconds())
+    )
+
+
+class PullSchedule:
+    """Plan the pulls of the next :data:`SCHEDULE_PERIOD`.
+
+    Every repository is scored by its recent activity, the severity of its open
+    issues and the time since its last pull, and the score picks its
+    interval from :data:`PULL_TIERS`. When the intervals ask for more pulls than
+    ``budget`` per hour, all of them are stretched to fit, and the repositories
+    due in the period are planned by score within the budget.
+    """
+
+    def __init__(self, budget=None, now=None):
+        self.budget = settings.PULL_BUDGET_PER_HOUR if budget is None else budget
+        self.now = now or timezone.now()
+
+    def plan(self):
+        """Return ``(repository, due)`` pairs, the best scoring first."""
+        issues_scores = get_issues_scores()
+        repositories = Repository.objects.only(
+            "remote_id",
+            "provider",
+            "last_activity_at",
+            "pulled_at",
+            "pull_scheduled_at",
+        )
+
+        scored = []
+        demand = 0
+        for repository in repositories.iterator():
+            score = get_score(repository, issues_scores[repository.pk], self.now)
+            interval = get_interval(score)
+            demand += timedelta(hours=1) / interval
+            scored.append((score, interval, repository))
+
+        stretch = max(demand / self.budget, 1) if self.budget else 1
+        period_end = self.now + SCHEDULE_PERIOD
+
+        due = []
+        for score, interval, repository in scored:
+            last = get_last_pull(repository)
+            due_at = self.now if last is None else last + interval * stretch
+            if due_at < period_end:
+                due.append(
+                    (score, max(due_at, self.now + _spread(repository)), repository)
+                )
+
+        due.sort(key=lambda item: item[0], reverse=True)
+        if self.budget:
+            due = due[: int(self.budget * (SCHEDULE_PERIOD / timedelta(hours=1)))]
+
+        log.info(
+            "repos.scheduling.plan",
+            repositories=len(scored),
+            demand=round(demand),
+            stretch=round(stretch, 2),
+            due=len(due),
+        )
+        return [(repository, due_at) for _, due_at, repository in due]
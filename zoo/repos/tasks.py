@@ -1,26 +1,46 @@
 import hashlib
+import inspect
 import itertools
 import tempfile
 from collections import namedtuple
-from typing import Dict
+from enum import Enum
+from typing import Dict, List, Union
 
 import structlog
 from celery import shared_task
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from requests import RequestException
 
 from ..analytics.tasks import repo_analyzers
 from ..auditing import runner
+from ..auditing.check_discovery import CHECK_FILES
 from ..auditing.check_discovery import CHECKS as AUDITING_CHECKS
+from ..base import http, redis
 from ..repos.models import Endpoint
 from ..services.constants import EnviromentType
 from ..services.models import Environment, Service
+from ..utils import _get_app_version
+from . import github
+from .details import DetailsCache
+from .discovery import ProjectDiscovery
 from .exceptions import MissingFilesError, RepositoryNotFoundError
-from .github import get_repositories as get_github_repositories
+from .file_index import FileIndex
 from .gitlab import get_project_enviroments
-from .gitlab import get_repositories as get_gitlab_repositories
-from .models import Repository, RepositoryEnvironment
-from .utils import download_repository, get_scm_module, openapi_definition
-from .zoo_yml import parse, validate
+from .models import Provider, Repository, RepositoryEnvironment
+from .scheduling import PullSchedule
+from .utils import (
+    EXTRACT_ALL,
+    OPENAPI_EXTENSIONS,
+    OPENAPI_MAX_FILE_SIZE,
+    ExtractRule,
+    download_repository,
+    get_scm_module,
+    scan_openapi,
+)
+from .zoo_yml import get_blob_sha, parse, validate
 
 log = structlog.get_logger()
 
@@ -38,89 +58,319 @@ HTTP_METHODS = (
     "patch",
 )
 
+ENDPOINTS_BATCH_SIZE = 500
+SYNC_REPOS_BATCH_SIZE = 500
+
+
+class PullOutcome(Enum):
+    PULLED = "pulled"
+    UNCHANGED = "unchanged"
+    FAILED = "failed"
+
 
 @shared_task
-def sync_repos():
+def sync_repos(full=None):
+    """Create and update repositories from the projects listed by the providers.
+
+    Only the projects changed since the last sync are listed, unless it's time
+    for a full listing, see :class:`zoo.repos.discovery.ProjectDiscovery`.
+    Known repositories are loaded at once and only the changed ones are written,
+    in batches. Returns how many were created, updated, unchanged or invalid and
+    how many known repositories weren't listed anymore by a full listing.
+    """
+    repositories = list(
+        Repository.objects.only(
+            "remote_id", "provider", "owner", "name", "url", "last_activity_at"
+        )
+    )
+    by_remote_id = {(repo.provider, repo.remote_id): repo for repo in repositories}
+    by_name = {(repo.provider, repo.owner, repo.name): repo for repo in repositories}
 
+    to_create, to_update = {}, {}
+    seen = set()
+    invalid = 0
     i = 0
-    for project in itertools.chain(
-        get_github_repositories(), get_gitlab_repositories()
-    ):
+
+    discovery = ProjectDiscovery("sync_repos", full)
+    for project in discovery:
         if settings.SYNC_REPOS_SKIP_FORKS and project["is_fork"]:
             continue
         if settings.SYNC_REPOS_SKIP_PERSONAL and project["is_personal"]:
             continue
         i += 1
-        log.info("sync_repos.fetch", repo_number=i, project=project)
-        try:
-            repo = Repository.objects.get(
-                remote_id=project["id"], provider=project["provider"]
-            )
-        except Repository.DoesNotExist:
-            try:
-                repo = Repository.objects.get(
-                    owner=project["owner"],
-                    name=project["name"],
-                    provider=project["provider"],
-                )
-                repo.remote_id = project["id"]
-            except Repository.DoesNotExist:
-                repo = Repository(remote_id=project["id"], provider=project["provider"])
+        log.debug("sync_repos.fetch", repo_number=i, project=project)
+
+        key = (project["provider"], project["id"])
+        if key in seen:
+            continue
+        seen.add(key)
+
+        repo = by_remote_id.get(key) or by_name.get(
+            (project["provider"], project["owner"], project["name"])
+        )
+        if repo is None:
+            repo = Repository(remote_id=project["id"], provider=project["provider"])
+
+        changed = (
+            repo.remote_id,
+            repo.owner,
+            repo.name,
+            repo.url,
+            repo.last_activity_at,
+        ) != (
+            project["id"],
+            project["owner"],
+            project["name"],
+            project["url"],
+            project["last_activity_at"],
+        )
+        if not changed:
+            continue
 
+        repo.remote_id = project["id"]
         repo.owner = project["owner"]
         repo.name = project["name"]
         repo.url = project["url"]
-        repo.full_clean()
-        repo.save()
+        repo.last_activity_at = project["last_activity_at"]
+        try:
+            repo.full_clean(validate_unique=False)
+        except ValidationError as err:
+            log.info("sync_repos.invalid", project=project, error=err)
+            invalid += 1
+            continue
 
-        if project["provider"] == "gitlab":
-            log.info("sync_repos.calling.sync_enviroments_from_gitlab")
-            sync_enviroments_from_gitlab(repo)
+        if repo.pk is None:
+            to_create[key] = repo
+        else:
+            to_update[repo.pk] = repo
 
-    log.info("sync_repos.total", repo_number=i)
+    with transaction.atomic():
+        Repository.objects.bulk_create(
+            to_create.values(), batch_size=SYNC_REPOS_BATCH_SIZE, ignore_conflicts=True
+        )
+        Repository.objects.bulk_update(
+            to_update.values(),
+            ["remote_id", "owner", "name", "url", "last_activity_at"],
+            batch_size=SYNC_REPOS_BATCH_SIZE,
+        )
+        discovery.commit()
+
+    gitlab_ids = [
+        remote_id for provider, remote_id in seen if provider == Provider.GITLAB.value
+    ]
+    for repo in Repository.objects.filter(
+        provider=Provider.GITLAB.value, remote_id__in=gitlab_ids
+    ):
+        log.info("sync_repos.calling.sync_enviroments_from_gitlab")
+        sync_enviroments_from_gitlab(repo)
+
+    counts = {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "unchanged": len(seen) - len(to_create) - len(to_update) - invalid,
+        "disappeared": len(
+            {
+                key
+                for key in by_remote_id.keys() - seen
+                if key[0] in discovery.full_providers
+            }
+        ),
+        "invalid": invalid,
+    }
+    log.info("sync_repos.total", repo_number=i, **counts)
+    log.info("sync_repos.http_cache", hosts=http.get_cache_stats())
+    return counts
 
 
 @shared_task
 def schedule_pulls():
-    """Create one pull task per repo."""
-    for repo in Repository.objects.all():
-        # distribute pulls by delaying evenly across an hour
-        pk_hash = hashlib.sha256(str(repo.pk).encode())
-        delay_s = int(pk_hash.hexdigest(), 16) % (60 * 60)
+    """Create pull tasks for the repos due until the next run.
+
+    Hot repos are pulled more often than cold ones, see :class:`PullSchedule`.
+    """
+    now = timezone.now()
+    planned = PullSchedule(now=now).plan()
 
+    for repo, due_at in planned:
+        delay_s = int((due_at - now).total_seconds())
         pull.apply_async(
             args=(repo.remote_id, repo.provider),
             countdown=delay_s,
             expires=delay_s + (60 * 60),
         )
+        repo.pull_scheduled_at = due_at
+
+    Repository.objects.bulk_update(
+        [repo for repo, _ in planned],
+        ["pull_scheduled_at"],
+        batch_size=SYNC_REPOS_BATCH_SIZE,
+    )
+
+
+def request_pull(repository):
+    """Pull the repo once pushes to it quiet down.
+
+    The first request starts a debounce window of ``PULL_DEBOUNCE_SECONDS`` and
+    queues a pull at its end, later requests in the window are dropped. The
+    pull reads the head when it runs, so a burst of pushes ends in one pull of
+    the final commit. Returns whether a pull was queued.
+    """
+    window = settings.PULL_DEBOUNCE_SECONDS
+    key = f"zoo:pull-debounce:{repository.provider}:{repository.remote_id}"
+    if not redis.get_connection().set(key, 1, nx=True, ex=window):
+        log.info("repos.pull.debounced", repo=repository)
+        return False
+
+    pull.apply_async(
+        args=(repository.remote_id, repository.provider),
+        countdown=window,
+        expires=window + (60 * 60),
+    )
+    return True
 
 
 @shared_task
-def pull(reference, provider):
-    """Run all repo tasks on one repo."""
+def refresh_repo_details(provider, remote_id):
+    """Refresh the cached details shown on the service page."""
+    try:
+        DetailsCache().refresh(provider, remote_id)
+    except RepositoryNotFoundError:
+        log.info("repos.details.not_found", provider=provider, remote_id=remote_id)
+    except RequestException as err:
+        # the stale details are served until a refresh succeeds
+        log.warning(
+            "repos.details.refresh_error",
+            provider=provider,
+            remote_id=remote_id,
+            error=repr(err),
+        )
+
+
+def get_pull_version(checks):
+    """Fingerprint the analyzers and auditing checks run by :func:`pull`.
+
+    Any change to their code invalidates the results of previous pulls, even when
+    the repository itself did not change.
+    """
+    version = hashlib.sha256(str(_get_app_version()).encode())
+
+    for component in itertools.chain(repo_analyzers.ANALYZERS, checks):
+        if inspect.ismodule(component):
+            name = component.__name__
+        else:
+            name = f"{component.__module__}.{component.__qualname__}"
+        version.update(name.encode())
+        try:
+            version.update(inspect.getsource(component).encode())
+        except (OSError, TypeError):
+            pass
+
+    return version.hexdigest()
+
+
+def get_extraction_manifest(checks):
+    """Collect the files read by the OpenAPI scan, the analyzers and the checks.
+
+    Analyzers and checks that don't declare their files get the whole repository.
+    """
+    manifest = {
+        ExtractRule(f"*.{ext}", OPENAPI_MAX_FILE_SIZE) for ext in OPENAPI_EXTENSIONS
+    }
+    file_lists = [getattr(module, "FILES", None) for module in repo_analyzers.ANALYZERS]
+    file_lists += [CHECK_FILES.get(check.__module__) for check in checks]
+
+    for files in file_lists:
+        if files is None:
+            return [EXTRACT_ALL]
+        manifest.update(ExtractRule(pattern) for pattern in files)
+
+    return sorted(manifest)
+
+
+@shared_task
+def pull(reference, provider, force=False):
+    """Run all repo tasks on one repo, return the value of its :class:`PullOutcome`.
+
+    The pull is skipped when neither the head of the default branch nor the
+    analyzers and checks changed since the last successful pull, unless forced.
+    """
     try:
         repository = Repository.objects.get(remote_id=int(reference), provider=provider)
     except ValueError:
         owner, name = reference.rsplit("/", 1)
         repository = Repository.objects.get(owner=owner, name=name, provider=provider)
 
-    log.info("repos.pull", repo=repository)
+    log.info("repos.pull", repo=repository, force=force)
+
+    try:
+        head_sha = repository.scm_module.get_head_sha(repository.remote_id)
+    except RepositoryNotFoundError as err:
+        log.info("repos.pull.git_error", repo=repository, error=err)
+        return PullOutcome.FAILED.value
+
+    version = get_pull_version(AUDITING_CHECKS)
+
+    if (
+        not force
+        and head_sha is not None
+        and head_sha == repository.pulled_sha
+        and version == repository.pulled_version
+    ):
+        log.info("repos.pull.unchanged", repo=repository, sha=head_sha)
+        return PullOutcome.UNCHANGED.value
 
     with tempfile.TemporaryDirectory() as repo_dir:
+        oversized = []
         try:
-            repo_path = download_repository(repository, repo_dir)
+            repo_path = download_repository(
+                repository,
+                repo_dir,
+                sha=head_sha,
+                manifest=get_extraction_manifest(AUDITING_CHECKS),
+                oversized=oversized,
+            )
         except (MissingFilesError, RepositoryNotFoundError) as err:
             log.info("repos.pull.git_error", repo=repository, error=err)
-            return
+            return PullOutcome.FAILED.value
 
-        index_api(repository, repo_path)
-        repo_analyzers.run_all(repository, repo_path)
-        runner.run_checks_and_save_results(AUDITING_CHECKS, repository, repo_path)
+        files = FileIndex.for_repository(repository, repo_path)
+        index_api(repository, repo_path, files, oversized)
+        repo_analyzers.run_all(repository, repo_path, files)
+        runner.run_checks_and_save_results(
+            AUDITING_CHECKS, repository, repo_path, files
+        )
 
+    repository.pulled_sha = head_sha
+    repository.pulled_version = version
+    repository.pulled_at = timezone.now()
+    repository.save(update_fields=["pulled_sha", "pulled_version", "pulled_at"])
+    return PullOutcome.PULLED.value
 
-def index_api(repository, repo_path):
-    specifications = openapi_definition(repository, repo_path=repo_path)
-    endpoints = []
+
+@shared_task
+def pull_fleet(provider=None, owner=None, ids=None, force=False, checkpoint=None):
+    """Pull many repositories at once with bounded, per-provider concurrency."""
+    # pylint: disable=import-outside-toplevel
+    from .fleet import FleetPull, select_repositories
+
+    # Celery's prefork workers are daemonic and can't have child processes
+    return FleetPull(
+        select_repositories(provider, owner, ids),
+        force=force,
+        checkpoint=checkpoint,
+        use_threads=True,
+    ).run()
+
+
+def index_api(repository, repo_path, files=None, oversized=()):
+    """Reconcile the endpoints of the repository with its OpenAPI definitions.
+
+    Endpoints missing from the definitions are deleted only when the scan is
+    complete, see :func:`scan_openapi`. Returns how many endpoints were created,
+    updated, deleted and left unchanged.
+    """
+    specifications, is_complete = scan_openapi(repository, repo_path, files, oversized)
+    endpoints = {}
 
     EpData = namedtuple("EpData", ["path", "method", "summary", "operation"])
 
@@ -133,48 +383,122 @@ def index_api(repository, repo_path):
                     continue
 
                 log.debug("repos.index_api", repo=repository, path=path, method=method)
-                endpoints.append(
-                    EpData(
-                        path=path,
-                        method=method,
-                        summary=paths[path][method].get("summary"),
-                        operation=paths[path][method].get("operationId"),
-                    )
+                # the same operation in several specs, the last one wins
+                endpoints[path, method] = EpData(
+                    path=path,
+                    method=method,
+                    summary=paths[path][method].get("summary"),
+                    operation=paths[path][method].get("operationId"),
                 )
 
-    for endpoint in endpoints:
-        Endpoint.objects.update_or_create(
-            defaults={
-                "summary": endpoint.summary,
-                "operation": endpoint.operation,
-            },
-            path=endpoint.path,
-            method=endpoint.method,
-            repository=repository,
+    to_create, to_update = [], []
+
+    with transaction.atomic():
+        existing = {
+            (endpoint.path, endpoint.method): endpoint
+            for endpoint in repository.endpoints.select_for_update()
+        }
+
+        for key, data in endpoints.items():
+            endpoint = existing.pop(key, None)
+            if endpoint is None:
+                to_create.append(Endpoint(repository=repository, **data._asdict()))
+            elif (endpoint.summary, endpoint.operation) != (
+                data.summary,
+                data.operation,
+            ):
+                endpoint.summary = data.summary
+                endpoint.operation = data.operation
+                to_update.append(endpoint)
+
+        Endpoint.objects.bulk_create(to_create, batch_size=ENDPOINTS_BATCH_SIZE)
+        Endpoint.objects.bulk_update(
+            to_update, ["summary", "operation"], batch_size=ENDPOINTS_BATCH_SIZE
         )
-    log.info("repos.index_api.done", repo=repository, endpoints=len(endpoints))
+        if not is_complete:
+            # the endpoints of the specs left out may still exist
+            existing = {}
+        if existing:
+            Endpoint.objects.filter(
+                pk__in=[endpoint.pk for endpoint in existing.values()]
+            ).delete()
+
+    counts = {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "deleted": len(existing),
+        "unchanged": len(endpoints) - len(to_create) - len(to_update),
+    }
+    log.info("repos.index_api.done", repo=repository, **counts)
+    return counts
 
 
 @shared_task
-def sync_zoo_file():
-    for project in itertools.chain(
-        get_github_repositories(), get_gitlab_repositories()
-    ):
+def sync_zoo_file(full=None):
+    github_projects = []
+
+    discovery = ProjectDiscovery("sync_zoo_file", full)
+    for project in discovery:
         if settings.SYNC_REPOS_SKIP_FORKS and project["is_fork"]:
             continue
-        update_project_from_zoo_file.apply_async(args=project)
+        if project["provider"] == Provider.GITHUB.value:
+            github_projects.append(project)
+            if len(github_projects) == github.GRAPHQL_BATCH_SIZE:
+                _sync_github_zoo_files(github_projects)
+                github_projects = []
+        else:
+            update_project_from_zoo_file.apply_async(args=(project,))
 
+    _sync_github_zoo_files(github_projects)
+    discovery.commit()
+
+
+def _sync_github_zoo_files(projects):
+    """Read the zoo files of GitHub projects in one query and update them."""
+    if not projects:
+        return
 
-@shared_task
-def update_project_from_zoo_file(proj: Dict) -> None:
     try:
-        content = get_zoo_file_content(proj)
-    except FileNotFoundError as err:
-        log.info("repos.sync_zoo_yml.file_not_found", error=err)
-    else:
-        if not validate(content):
+        metadata = github.get_repositories_metadata(
+            f"{project['owner']}/{project['name']}" for project in projects
+        )
+    except RequestException as err:
+        log.info("repos.sync_zoo_yml.graphql_error", error=err)
+        metadata = {}
+
+    for project in projects:
+        project_metadata = metadata.get(f"{project['owner']}/{project['name']}")
+        if project_metadata is None:
+            # let the task fetch the file on its own
+            update_project_from_zoo_file.apply_async(args=(project,))
+        elif project_metadata["zoo_file"] is not None:
+            update_project_from_zoo_file.apply_async(
+                args=(project,), kwargs={"content": project_metadata["zoo_file"]}
+            )
+
+
+@shared_task
+def update_project_from_zoo_file(proj: Dict, content: Union[str, bytes] = None) -> None:
+    if content is None:
+        try:
+            content = get_zoo_file_content(proj)
+        except FileNotFoundError as err:
+            log.info("repos.sync_zoo_yml.file_not_found", error=err)
             return
-        update_or_create_service(parse(content), proj)
+
+    sha = get_blob_sha(content)
+    repositories = Repository.objects.filter(
+        remote_id=int(proj["id"]), provider=proj["provider"]
+    )
+    if repositories.filter(zoo_file_sha=sha, services__isnull=False).exists():
+        log.info("repos.sync_zoo_yml.unchanged", project=proj["id"], sha=sha)
+        return
+
+    data = parse(content)
+    if not validate(data):
+        return
+    update_or_create_service(data, proj)
+    repositories.update(zoo_file_sha=sha)
 
 
 def update_or_create_service(data: Dict, proj: Dict) -> None:
@@ -198,23 +522,51 @@ def update_or_create_service(data: Dict, proj: Dict) -> None:
         "tags": data["tags"],
     }
 
-    service, _ = Service.objects.update_or_create(
-        owner=data["owner"], name=data["name"], defaults=service_defaults
+    with transaction.atomic():
+        service, _ = Service.objects.update_or_create(
+            owner=data["owner"], name=data["name"], defaults=service_defaults
+        )
+        reconcile_environments(service, data["environments"])
+
+
+def reconcile_environments(service: Service, environments: List[Dict]) -> None:
+    """Make the environments of the service match the zoo file.
+
+    The yaml file has precedence, environments missing from it are deleted.
+    Only the rows that differ are written.
+    """
+    wanted = {env["name"]: env for env in environments}
+    existing = {}
+    to_delete = []
+    for env in Environment.objects.filter(service=service):
+        if env.name in wanted and env.name not in existing:
+            existing[env.name] = env
+        else:
+            to_delete.append(env.pk)
+
+    to_create, to_update = [], []
+    for name, env_data in wanted.items():
+        fields = {
+            "dashboard_url": env_data["dashboard_url"],
+            "service_urls": env_data["service_urls"],
+            "health_check_url": env_data["health_check_url"],
+        }
+        env = existing.get(name)
+        if env is None:
+            to_create.append(Environment(service=service, name=name, **fields))
+        elif any(getattr(env, field) != value for field, value in fields.items()):
+            for field, value in fields.items():
+                setattr(env, field, value)
+            to_update.append(env)
+
+    Environment.objects.filter(pk__in=to_delete).delete()
+    Environment.objects.bulk_update(
+        to_update, ["dashboard_url", "service_urls", "health_check_url"]
     )
-
-    # Delete all environments as yaml file has precedence
-    Environment.objects.filter(service=service).delete()
-
-    # Add all environments
-    for env in data["environments"]:
-        e = Environment(service=service, name=env["name"])
-        e.dashboard_url = env["dashboard_url"]
-        e.service_urls = env["service_urls"]
-        e.health_check_url = env["health_check_url"]
-        e.save()
+    Environment.objects.bulk_create(to_create)
 
 
-def get_zoo_file_content(proj: Dict) -> str:
+def get_zoo_file_content(proj: Dict) -> bytes:
     provider = get_scm_module(proj["provider"])
     return provider.get_file_content(
         proj["id"], settings.ZOO_YAML_FILE, settings.ZOO_YAML_DEFAULT_REF
@@ -7,4 +7,6 @@ urlpatterns = [
     path("", views.RepoList.as_view(), name="repo_list"),
     path("<provider>/<int:repo_id>/", views.repo_details, name="repo_details"),
     path("api/get-gitlab-envs/", views.get_gitlab_envs, name="get_gitlab_envs"),
+    path("webhooks/github/", views.github_webhook, name="github_webhook"),
+    path("webhooks/gitlab/", views.gitlab_webhook, name="gitlab_webhook"),
 ]
@@ -1,12 +1,16 @@
-import hashlib
 import importlib
 import json
+import re
 import shutil
+import signal
 import tarfile
 import tempfile
-from pathlib import Path
+import threading
+from collections import namedtuple
+from pathlib import Path, PurePosixPath
 
 import structlog
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
 from prance import ResolvingParser, ValidationError
 from prance.util.formats import ParseError
@@ -15,11 +19,31 @@ from yaml.composer import ComposerError
 from yaml.scanner import ScannerError
 
 from ..base import redis
+from ..base.processes import ProcessLostError, TimeLimitExceeded, run_in_processes
 from .exceptions import MissingFilesError, RepositoryNotFoundError
+from .file_index import FileIndex
+from .mirrors import GitMirrorCache
 
 OPENAPI_SCAN_EXCLUDE = ["k8s", "test", ".gitlab", ".github"]
+# FileIndex.exclude patterns, any path containing one of the names is skipped
+OPENAPI_SCAN_EXCLUDE_PATTERNS = [f"*{name}*" for name in OPENAPI_SCAN_EXCLUDE]
 OPENAPI_INVALID_MARKER = "invalid"
 OPENAPI_FINGERPRINT_MAX_AGE = 360 * 24 * 60 * 60  # ~1 year
+OPENAPI_EXTENSIONS = ("json", "yml", "yaml")
+OPENAPI_MAX_FILE_SIZE = 10 * 1024 * 1024
+# only files with an openapi or swagger key in their first few KB get parsed,
+# see _sniff_openapi for JSON
+OPENAPI_SNIFF_SIZE = 4 * 1024
+OPENAPI_SNIFF_PATTERNS = [
+    re.compile(rb'"(?:openapi|swagger)"\s*:'),  # JSON, at any depth
+    re.compile(rb"^[\"']?(?:openapi|swagger)[\"']?[ \t]*:", re.MULTILINE),  # YAML
+]
+# JSON with sorted keys has the version key after these, the whole file is sniffed
+OPENAPI_SNIFF_JSON_KEYS = re.compile(rb'"(?:components|definitions|paths)"\s*:')
+
+ExtractRule = namedtuple("ExtractRule", ["pattern", "max_size"], defaults=(None,))
+# extracts every file, used when a consumer doesn't declare what it reads
+EXTRACT_ALL = ExtractRule("*")
 
 log = structlog.get_logger()
 
@@ -33,7 +57,17 @@ def get_scm_module(provider):
     return importlib.import_module(f".{provider}", current_module)
 
 
-def download_repository(repository, fake_dir, sha=None):
+def download_repository(repository, fake_dir, sha=None, manifest=None, oversized=None):
+    """Download and extract the repository archive into ``fake_dir``.
+
+    When a ``manifest`` (list of :obj:`ExtractRule`) is given, the archive is
+    streamed straight from the provider and only the files matching one of its
+    rules are extracted. The paths of the files matching a rule but too big for
+    it are appended to ``oversized``, if given.
+
+    With the ``git`` fetch backend the repository is fetched into a local mirror
+    instead, see :class:`zoo.repos.mirrors.GitMirrorCache`.
+    """
     scm_module = get_scm_module(repository.provider)
 
     try:
@@ -43,6 +77,16 @@ def download_repository(repository, fake_dir, sha=None):
             f"{repository} is private or doesn't exist."
         ) from e
 
+    if settings.FETCH_BACKEND == "git":
+        return _fetch_repository(
+            repository, scm_module, project, fake_dir, sha, manifest, oversized
+        )
+
+    if manifest is not None:
+        return _stream_repository(
+            repository, scm_module, project, fake_dir, sha, manifest, oversized
+        )
+
     with tempfile.SpooledTemporaryFile(max_size=(10 * 1024 * 1024)) as archive:
         try:
             archive = scm_module.download_archive(project, archive, sha)
@@ -60,6 +104,112 @@ def download_repository(repository, fake_dir, sha=None):
     return Path(fake_dir) / inner_folder
 
 
+def is_extracted(manifest, path, size):
+    """Check whether the file at the relative ``path`` is wanted by the manifest."""
+    path = PurePosixPath(path)
+    return any(
+        path.match(rule.pattern) and (rule.max_size is None or size <= rule.max_size)
+        for rule in manifest
+    )
+
+
+def _stream_repository(
+    repository, scm_module, project, fake_dir, sha, manifest, oversized=None
+):
+    try:
+        stream = scm_module.stream_archive(project, sha)
+    except MissingFilesError as e:
+        raise MissingFilesError(f"{repository} doesn't have any files.") from e
+
+    return _extract_stream(repository, stream, fake_dir, manifest, oversized)
+
+
+def _fetch_repository(
+    repository, scm_module, project, fake_dir, sha, manifest, oversized=None
+):
+    cache = GitMirrorCache()
+
+    with cache.lock(repository):
+        sha = cache.fetch(
+            repository,
+            scm_module.get_clone_url(project),
+            sha,
+            credentials=scm_module.get_clone_credentials(),
+        )
+        process = cache.archive(repository, sha, prefix=f"{repository.name}-{sha}")
+        # a stuck archive would block reading its stream with the lock held
+        watchdog = threading.Timer(cache.timeout, process.kill)
+        watchdog.start()
+        try:
+            repo_path = _extract_stream(
+                repository,
+                process.stdout,
+                fake_dir,
+                manifest or [EXTRACT_ALL],
+                oversized,
+            )
+        finally:
+            watchdog.cancel()
+            process.stdout.close()
+            process.wait()
+
+        if process.returncode == -signal.SIGKILL:
+            log.info("repos.utils.download.archive_timeout", repo=repository)
+            raise MissingFilesError(f"{repository} couldn't be archived in time.")
+
+    try:
+        cache.evict(keep=repository)
+    except Exception:  # pylint: disable=broad-except
+        # the pull succeeded, the cache is trimmed on a later one
+        log.exception("repos.mirrors.evict.error", repo=repository)
+    return repo_path
+
+
+def _extract_stream(repository, stream, fake_dir, manifest, oversized=None):
+    stats = {"extracted": 0, "extracted_bytes": 0, "skipped": 0, "skipped_bytes": 0}
+    inner_folder = None
+
+    try:
+        with stream, tarfile.open(fileobj=stream, mode="r|*") as tar:
+            for member in tar:
+                if inner_folder is None:
+                    # same as tar.next().name, archives have a single root folder
+                    inner_folder = member.name
+                    if not member.isdir():
+                        inner_folder = member.name.split("/", 1)[0]
+
+                if member.isdir():
+                    continue
+
+                relative_path = member.name[len(inner_folder) + 1 :]
+
+                if (member.isfile() or member.issym()) and is_extracted(
+                    manifest, relative_path, member.size
+                ):
+                    tar.extract(member, fake_dir)
+                    stats["extracted"] += 1
+                    stats["extracted_bytes"] += member.size
+                else:
+                    stats["skipped"] += 1
+                    stats["skipped_bytes"] += member.size
+                    if oversized is not None and any(
+                        PurePosixPath(relative_path).match(rule.pattern)
+                        for rule in manifest
+                    ):
+                        oversized.append(relative_path)
+    except tarfile.ReadError as e:
+        raise MissingFilesError(f"{repository} doesn't have any files.") from e
+
+    if inner_folder is None:
+        raise MissingFilesError(f"{repository} doesn't have any files.")
+
+    log.info("repos.utils.download.extracted", repo=repository, **stats)
+
+    repo_path = Path(fake_dir) / inner_folder
+    repo_path.mkdir(parents=True, exist_ok=True)
+    return repo_path
+
+
 def _parse_file(path, base=None):
     try:
         parser = ResolvingParser(str(path), strict=False)
@@ -81,10 +231,58 @@ def _parse_file(path, base=None):
         )
 
 
-def openapi_definition(repository, request=None, repo_path=None):
-    redis_conn = redis.get_connection(decode_responses=True)
+def _sniff_openapi(file):
+    """Check whether the beginning of the file declares an OpenAPI definition.
+
+    A JSON file with ``components``, ``definitions`` or ``paths`` but no version
+    key at its beginning is read whole, its keys may be sorted.
+    """
+    try:
+        with open(file.full_path, "rb") as f:
+            head = f.read(OPENAPI_SNIFF_SIZE)
+            if any(pattern.search(head) for pattern in OPENAPI_SNIFF_PATTERNS):
+                return True
+            if file.extension != "json" or not OPENAPI_SNIFF_JSON_KEYS.search(head):
+                return False
+            head += f.read()
+    except OSError:
+        return False
+    return any(pattern.search(head) for pattern in OPENAPI_SNIFF_PATTERNS)
+
+
+def _parse_files(paths, base):
+    """Parse the files in processes, return ``(timed_out, specification)`` pairs.
+
+    A parser running for longer than ``OPENAPI_PARSE_TIMEOUT`` seconds on a file
+    is killed, so stuck parsers don't linger, see
+    :func:`~zoo.base.processes.run_in_processes`.
+    """
+    results = []
+    outcomes = run_in_processes(
+        _parse_file,
+        [(path, base) for path in paths],
+        processes=settings.OPENAPI_PARSE_WORKERS,
+        timeout=settings.OPENAPI_PARSE_TIMEOUT,
+    )
+    try:
+        for path, (error, specification) in zip(paths, outcomes):
+            if isinstance(error, (TimeLimitExceeded, ProcessLostError)):
+                log.info(
+                    "repos.utils.openapi.timeout", path=str(path.relative_to(base))
+                )
+                results.append((True, None))
+            elif error is not None:
+                raise error
+            else:
+                results.append((False, specification))
+    finally:
+        outcomes.close()
+
+    return results
+
+
+def openapi_definition(repository, request=None, repo_path=None, files=None):
     tmp_dir = None
-    specs = []
 
     if repo_path is None:
         try:
@@ -105,55 +303,90 @@ def openapi_definition(repository, request=None, repo_path=None):
             log.info("repos.utils.openapi.download_error", repo=repository, error=err)
             return []
 
+    specs, _ = scan_openapi(repository, repo_path, files)
+
+    if tmp_dir is not None:
+        shutil.rmtree(tmp_dir)
+
+    return specs
+
+
+def _is_openapi_candidate(path):
+    path = PurePosixPath(path)
+    return path.suffix[1:] in OPENAPI_EXTENSIONS and not any(
+        name in str(path) for name in OPENAPI_SCAN_EXCLUDE
+    )
+
+
+def scan_openapi(repository, repo_path, files=None, oversized=()):
+    """Find and parse the OpenAPI definitions of an extracted repository.
+
+    Returns the specifications and whether the scan is complete. It isn't when
+    a file timed out, or a file that could be a definition is in ``oversized``,
+    left out of the extraction for its size, see :func:`download_repository`.
+    """
+    redis_conn = redis.get_connection(decode_responses=True)
+    specs = []
+
     log.info("repos.utils.openapi.storage", repo_path=repo_path)
 
-    for ext in ("json", "yml", "yaml"):
-        for path in repo_path.glob(f"**/*.{ext}"):
-            if any(directory in str(path) for directory in OPENAPI_SCAN_EXCLUDE):
-                log.debug(
-                    "repos.utils.openapi.exclude", repo=repository, file=path.name
-                )
-                continue
+    if files is None:
+        files = FileIndex.for_repository(repository, repo_path)
+    files = files.exclude(OPENAPI_SCAN_EXCLUDE_PATTERNS)
 
-            fingerprint = f"{ext}-{hashlib.md5(path.read_text().encode()).hexdigest()}"
-            log.debug("repos.utils.openapi.scan", repo=repository, file=path.name)
+    candidates = [
+        file
+        for ext in OPENAPI_EXTENSIONS
+        for file in files.with_extension(ext)
+        if _sniff_openapi(file)
+    ]
+    fingerprints = [f"{file.extension}-{file.content_hash}" for file in candidates]
+    log.debug("repos.utils.openapi.scan", repo=repository, candidates=len(candidates))
 
-            if specification := redis_conn.get(fingerprint):
-                log.debug(
-                    "repos.utils.openapi.cache_hit",
-                    repo=repository,
-                    file=path.name,
-                    fingerprint=fingerprint,
-                )
-                # We store all file fingerprints in redis, valid or invalid, to avoid
-                # attempting to parse the same file over and over if it hasn't
-                # changed at all
-                if specification != OPENAPI_INVALID_MARKER:
-                    log.debug(
-                        "repos.utils.openapi.cache_invalid",
-                        repo=repository,
-                        fingerprint=fingerprint,
-                    )
-                    specs.append(json.loads(specification))
+    # We store all file fingerprints in redis, valid or invalid, to avoid
+    # attempting to parse the same file over and over if it hasn't changed at all
+    cached = redis_conn.mget(fingerprints) if fingerprints else []
+    misses = [
+        (fingerprint, file.full_path)
+        for file, fingerprint, specification in zip(candidates, fingerprints, cached)
+        if specification is None
+    ]
+    parsed_results = _parse_files([path for _, path in misses], files.root)
 
-            else:
-                parsed = _parse_file(path, repo_path)
-                specs.append(parsed)
-                redis_conn.set(
-                    fingerprint,
-                    json.dumps(parsed, cls=DjangoJSONEncoder)
-                    if parsed
-                    else OPENAPI_INVALID_MARKER,
-                    ex=OPENAPI_FINGERPRINT_MAX_AGE,
-                )
-                log.debug(
-                    "repos.utils.openapi.cache_store",
-                    repo=repository,
-                    fingerprint=fingerprint,
-                )
+    pipeline = redis_conn.pipeline(transaction=False)
+    for (fingerprint, _), (timed_out, specification) in zip(misses, parsed_results):
+        if timed_out:
+            continue
+        pipeline.set(
+            fingerprint,
+            json.dumps(specification, cls=DjangoJSONEncoder)
+            if specification
+            else OPENAPI_INVALID_MARKER,
+            ex=OPENAPI_FINGERPRINT_MAX_AGE,
+        )
+    pipeline.execute()
 
-    if tmp_dir is not None:
-        shutil.rmtree(tmp_dir)
+    parsed = iter(parsed_results)
+    for specification in cached:
+        if specification is None:
+            specs.append(next(parsed)[1])
+        elif specification != OPENAPI_INVALID_MARKER:
+            specs.append(json.loads(specification))
+
+    log.info(
+        "repos.utils.openapi.cache",
+        repo=repository,
+        hits=len(candidates) - len(misses),
+        misses=len(misses),
+    )
 
-    log.info("repos.utils.openapi.done", repo=repository, specs=len(specs))
-    return list(filter(None, specs))
+    timeouts = sum(timed_out for timed_out, _ in parsed_results)
+    skipped = sum(_is_openapi_candidate(path) for path in oversized)
+    log.info(
+        "repos.utils.openapi.done",
+        repo=repository,
+        specs=len(specs),
+        timeouts=timeouts,
+        skipped=skipped,
+    )
+    return list(filter(None, specs)), not timeouts and not skipped
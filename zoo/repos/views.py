@@ -1,12 +1,20 @@
+import hashlib
+import hmac
+import json
+
 import structlog
+from django.conf import settings
 from django.http import Http404, JsonResponse
-from django.views.decorators.http import require_GET
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import ListView
 
 from . import models
+from .details import DetailsCache
 from .exceptions import RepositoryNotFoundError
 from .models import Provider, Repository
-from .utils import get_scm_module
+from .tasks import refresh_repo_details, request_pull
 
 log = structlog.get_logger()
 
@@ -16,12 +24,17 @@ class RepoList(ListView):
 
 
 def repo_details(request, provider, repo_id):
-    scm_module = get_scm_module(provider)
+    """Serve cached details, stale ones are refreshed in the background."""
+    cache = DetailsCache()
+    details, is_stale = cache.get(provider, repo_id)
 
-    try:
-        details = scm_module.get_project_details(repo_id)
-    except RepositoryNotFoundError:
-        raise Http404(f"Project {repo_id} not found")
+    if details is None:
+        try:
+            details = cache.refresh(provider, repo_id)
+        except RepositoryNotFoundError:
+            raise Http404(f"Project {repo_id} not found")
+    elif is_stale and cache.claim_refresh(provider, repo_id):
+        refresh_repo_details.delay(provider, repo_id)
 
     return JsonResponse(details)
 
@@ -49,3 +62,109 @@ def get_gitlab_envs(request):
         ],
         safe=False,
     )
+
+
+def _is_github_signature_valid(request):
+    if not settings.GITHUB_WEBHOOK_SECRET:
+        return False
+    expected = hmac.new(
+        settings.GITHUB_WEBHOOK_SECRET.encode(), request.body, hashlib.sha256
+    ).hexdigest()
+    signature = request.headers.get("X-Hub-Signature-256", "")
+    return hmac.compare_digest(f"sha256={expected}", signature)
+
+
+def _is_gitlab_token_valid(request):
+    if not settings.GITLAB_WEBHOOK_SECRET:
+        return False
+    token = request.headers.get("X-Gitlab-Token", "")
+    return hmac.compare_digest(settings.GITLAB_WEBHOOK_SECRET, token)
+
+
+def _is_github_default_branch_change(event, payload):
+    if event == "push":
+        branch = payload["repository"]["default_branch"]
+        return payload["ref"] == f"refs/heads/{branch}"
+    if event == "pull_request":
+        pull_request = payload["pull_request"]
+        # merges into other branches don't change what's pulled
+        return (
+            payload["action"] == "closed"
+            and pull_request["merged"]
+            and pull_request["base"]["ref"] == payload["repository"]["default_branch"]
+        )
+    return False
+
+
+def _is_gitlab_default_branch_change(event, payload):
+    if event == "Push Hook":
+        branch = payload["project"]["default_branch"]
+        return payload["ref"] == f"refs/heads/{branch}"
+    if event == "Merge Request Hook":
+        merge_request = payload["object_attributes"]
+        return (
+            merge_request["action"] == "merge"
+            and merge_request["target_branch"] == payload["project"]["default_branch"]
+        )
+    return False
+
+
+def _request_pull(provider, remote_id):
+    repository = Repository.objects.filter(
+        provider=provider.value, remote_id=remote_id
+    ).first()
+    if repository is None:
+        return JsonResponse({"status": "unknown repository"}, status=404)
+
+    Repository.objects.filter(pk=repository.pk).update(last_activity_at=timezone.now())
+    if request_pull(repository):
+        return JsonResponse({"status": "queued"}, status=202)
+    return JsonResponse({"status": "debounced"}, status=202)
+
+
+@csrf_exempt
+@require_POST
+def github_webhook(request):
+    """Pull repositories when their default branch changes on GitHub."""
+    if not _is_github_signature_valid(request):
+        return JsonResponse({"status": "invalid signature"}, status=403)
+
+    event = request.headers.get("X-GitHub-Event")
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"status": "invalid payload"}, status=400)
+    log.info("repos.webhook.github", webhook_event=event)
+
+    try:
+        if not _is_github_default_branch_change(event, payload):
+            return JsonResponse({"status": "ignored"})
+        remote_id = payload["repository"]["id"]
+    except (KeyError, TypeError):
+        log.info("repos.webhook.github.invalid_payload", webhook_event=event)
+        return JsonResponse({"status": "invalid payload"}, status=400)
+    return _request_pull(Provider.GITHUB, remote_id)
+
+
+@csrf_exempt
+@require_POST
+def gitlab_webhook(request):
+    """Pull repositories when their default branch changes on GitLab."""
+    if not _is_gitlab_token_valid(request):
+        return JsonResponse({"status": "invalid token"}, status=403)
+
+    event = request.headers.get("X-Gitlab-Event")
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"status": "invalid payload"}, status=400)
+    log.info("repos.webhook.gitlab", webhook_event=event)
+
+    try:
+        if not _is_gitlab_default_branch_change(event, payload):
+            return JsonResponse({"status": "ignored"})
+        remote_id = payload["project"]["id"]
+    except (KeyError, TypeError):
+        log.info("repos.webhook.gitlab.invalid_payload", webhook_event=event)
+        return JsonResponse({"status": "invalid payload"}, status=400)
+    return _request_pull(Provider.GITLAB, remote_id)
@@ -1,10 +1,17 @@
+import functools
+import hashlib
 from typing import Dict, Union
 
 import structlog
 from jsonschema import ValidationError
-from jsonschema import validate as schema_validate
+from jsonschema.validators import validator_for
 from yaml import FullLoader, dump, load
 
+try:
+    from yaml import CFullLoader as Loader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import FullLoader as Loader
+
 from zoo.services.models import Service
 
 log = structlog.get_logger()
@@ -72,9 +79,19 @@ ZOO_JSON_SCHEMA = """
     """
 
 
-def validate(yml: str) -> bool:
+@functools.lru_cache(maxsize=None)
+def get_validator():
+    """Compile the schema once per process."""
+    schema = load(ZOO_JSON_SCHEMA, Loader=FullLoader)
+    validator_class = validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def validate(data: Union[Dict, None]) -> bool:
+    """Validate a document returned by :func:`parse`."""
     try:
-        schema_validate(load(yml, Loader=FullLoader), load(ZOO_JSON_SCHEMA, FullLoader))
+        get_validator().validate(data)
     except ValidationError as err:
         log.info("repos.sync_zoo_yml.validation_error", error=err)
         return False
@@ -82,8 +99,14 @@ def validate(yml: str) -> bool:
         return True
 
 
-def parse(yaml: str) -> Union[Dict, None]:
-    return load(yaml, Loader=FullLoader)
+def parse(yaml: Union[str, bytes]) -> Union[Dict, None]:
+    return load(yaml, Loader=Loader)
+
+
+def get_blob_sha(yaml: Union[str, bytes]) -> str:
+    """SHA of the file as a git blob, the same as the providers report."""
+    content = yaml.encode() if isinstance(yaml, str) else yaml
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
 
 
 def generate(service: Service) -> str:
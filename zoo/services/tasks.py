@@ -37,7 +37,9 @@ def fetch_sentry_project_issues(project_slug: str) -> dict:
 
 
 def fetch_from_sonarqube(path, params=None):
-    session = http.requests_retry_session()
+    session = http.requests_retry_session(
+        cache=http.get_cache_storage(), limiter=http.limiter
+    )
     session.auth = settings.SONARQUBE_TOKEN, ""
 
     url = urljoin(settings.SONARQUBE_URL, path)
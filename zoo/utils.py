@@ -2,12 +2,22 @@ import json
 import os
 
 from django.core import serializers
+from django.utils import timezone
 
 
 def _get_app_version():
     return os.getenv("PACKAGE_VERSION")
 
 
+def get_snapshot_timestamp(now=None):
+    """Start of the day ``now`` falls in.
+
+    Daily snapshots share it, so taking them again the same day replaces them.
+    """
+    now = now or timezone.now()
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
 def model_instance_to_json_object(model_instance):
     serialized_string = serializers.serialize(
         "json",